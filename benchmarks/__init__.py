@@ -0,0 +1,2 @@
+# benchmarks/ — scripts de medición (no forman parte de la app Django).
+# Ejecutar desde la raíz del repo:  python -m benchmarks.<nombre>
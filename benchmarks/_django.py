@@ -0,0 +1,26 @@
+# benchmarks/_django.py
+import tempfile
+
+
+def setup_django(**overrides):
+    """
+    Configura un Django mínimo (solo la app catalog, SQLite en memoria,
+    MEDIA_ROOT temporal) para poder importar catalog.views sin settings reales.
+    """
+    import django
+    from django.conf import settings
+
+    if not settings.configured:
+        conf = dict(
+            SECRET_KEY="bench",
+            INSTALLED_APPS=["django.contrib.contenttypes", "catalog"],
+            DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+            MEDIA_ROOT=tempfile.mkdtemp(prefix="phomagic-bench-"),
+            MEDIA_URL="/media/",
+            USE_TZ=True,
+            DEFAULT_AUTO_FIELD="django.db.models.BigAutoField",
+            PHOMAGIC_RESULT_CACHE={"BACKEND": "none"},
+        )
+        conf.update(overrides)
+        settings.configure(**conf)
+        django.setup()
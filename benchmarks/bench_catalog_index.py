@@ -0,0 +1,124 @@
+# benchmarks/bench_catalog_index.py
+"""
+Índice de MEDIA_ROOT/lineas (products.catalog_index) frente al recorrido
+directo de antes (iterdir/glob en cada página), sobre un árbol sintético.
+
+    python -m benchmarks.bench_catalog_index
+    python -m benchmarks.bench_catalog_index --categories 10 --subcategories 50 --views 20 --clicks 2000
+
+Por defecto: 10 × 50 × 20 = 10 000 vistas. --ttl 0 comprueba el mtime en
+cada consulta (el peor caso del índice).
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from products.catalog_index import CatalogIndex
+
+
+def build_tree(root: Path, categories: int, subcategories: int, views: int):
+    for c in range(categories):
+        for s in range(subcategories):
+            d = root / f"cat_{c:03d}" / f"sub_{s:03d}"
+            d.mkdir(parents=True)
+            for v in range(views):
+                (d / f"vista_{v:03d}.png").touch()
+                (d / f"vista_{v:03d}.docx").touch()
+    # Fuera de la ventana de mtime "reciente" del índice
+    old = time.time() - 60
+    for dirpath, dirnames, _ in os.walk(root):
+        os.utime(dirpath, (old, old))
+
+
+# Recorrido directo, como products/views.py antes del índice
+def naive_categories(root: Path):
+    return sorted(d.name for d in root.iterdir() if d.is_dir()) if root.exists() else []
+
+
+def naive_subcategories(root: Path, category):
+    p = root / category
+    return sorted(d.name for d in p.iterdir() if d.is_dir()) if p.exists() else []
+
+
+def naive_views(root: Path, category, subcategory):
+    p = root / category / subcategory
+    if not p.exists():
+        return []
+    views = [{"name": f.stem, "image": f"/media/lineas/{category}/{subcategory}/{f.name}"} for f in p.glob("*.png")]
+    return sorted(views, key=lambda x: x["name"])
+
+
+def clicks(root: Path, n: int, seed: int = 0):
+    """Navegación: portada → categoría → subcategoría, con categorías/subcategorías al azar."""
+    rng = random.Random(seed)
+    cats = naive_categories(root)
+    subs = {c: naive_subcategories(root, c) for c in cats}
+    out = []
+    for _ in range(n):
+        c = rng.choice(cats)
+        out.append((c, rng.choice(subs[c])))
+    return out
+
+
+def run(label, nav, fn_cats, fn_subs, fn_views):
+    t0 = time.perf_counter()
+    for c, s in nav:
+        fn_cats()
+        fn_subs(c)
+        fn_views(c, s)
+    dt = time.perf_counter() - t0
+    print(f"{label:<26}{dt * 1000:>10.1f} ms  {dt / len(nav) * 1e6:>9.1f} µs/click")
+    return dt
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--categories", type=int, default=10)
+    ap.add_argument("--subcategories", type=int, default=50)
+    ap.add_argument("--views", type=int, default=20)
+    ap.add_argument("--clicks", type=int, default=2000)
+    ap.add_argument("--ttl", type=float, default=2.0)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="phomagic-lineas-"))
+    root = tmp / "lineas"
+    try:
+        build_tree(root, args.categories, args.subcategories, args.views)
+        total = args.categories * args.subcategories * args.views
+        nav = clicks(root, args.clicks)
+        print(f"árbol: {args.categories} categorías × {args.subcategories} subcategorías × "
+              f"{args.views} vistas = {total} vistas; {args.clicks} clicks\n")
+
+        base = run("recorrido directo", nav, lambda: naive_categories(root),
+                   lambda c: naive_subcategories(root, c), lambda c, s: naive_views(root, c, s))
+
+        idx = CatalogIndex(root, ttl=args.ttl)
+        t0 = time.perf_counter()
+        counts = idx.warm()
+        print(f"{'índice: warm()':<26}{(time.perf_counter() - t0) * 1000:>10.1f} ms  "
+              f"({counts['views']} vistas, {idx.scans} listados)")
+        scans = idx.scans
+        dt = run(f"índice (ttl={args.ttl:g})", nav, idx.categories, idx.subcategories, idx.views)
+        print(f"{'':<26}listados extra: {idx.scans - scans}, x{base / dt:.1f} más rápido")
+
+        # Cambio en una subcategoría: solo se vuelve a listar ese directorio
+        c, s = nav[0]
+        (root / c / s / "nueva_vista.png").touch()
+        old = time.time() - 60
+        os.utime(root / c / s, (old + 1, old + 1))
+        idx.ttl = 0
+        scans = idx.scans
+        t0 = time.perf_counter()
+        found = any(v["name"] == "nueva_vista" for v in idx.views(c, s))
+        print(f"{'índice: tras un cambio':<26}{(time.perf_counter() - t0) * 1e6:>10.1f} µs  "
+              f"(vista nueva visible: {found}, listados: {idx.scans - scans})")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_color_transfer.py
+"""
+Igualado de color: ruta "gain" original (ImageStat + LUTs Python + split/merge)
+vs catalog.color_transfer, más tiempos de los modos reinhard/histogram y
+comprobación de regresión visual contra benchmarks/fixtures/color_transfer/.
+
+    python -m benchmarks.bench_color_transfer               # benchmark + check
+    python -m benchmarks.bench_color_transfer --update-fixtures
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from PIL import Image, ImageStat
+
+from catalog.color_transfer import MODES, match_color
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "color_transfer"
+CROP_SIZES = [(120, 60), (400, 200), (1200, 600), (2400, 1200)]
+
+
+def _old_gain(src_rgb: Image.Image, dst_region_rgb: Image.Image) -> Image.Image:
+    # Copia de la implementación original de _match_color_to_region (referencia)
+    src = src_rgb.convert("RGB")
+    dst = dst_region_rgb.convert("RGB")
+    s_means = ImageStat.Stat(src).mean
+    d_means = ImageStat.Stat(dst).mean
+    adj_bands: List[Image.Image] = []
+    for i, band in enumerate(src.split()):
+        gain = max(1.0, d_means[i]) / max(1.0, s_means[i])
+        lut = [min(255, max(0, int(round(v * gain)))) for v in range(256)]
+        adj_bands.append(band.point(lut))
+    return Image.merge("RGB", tuple(adj_bands))
+
+
+def synthetic_pair(w: int, h: int):
+    """Logo sintético (bandas + degradado) y región destino con otro tono/contraste."""
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    r = 40 + 160 * xx / max(1, w - 1)
+    g = 60 + 120 * yy / max(1, h - 1)
+    b = np.where(((xx // 8 + yy // 8) % 2) == 0, 200.0, 50.0)
+    src = np.stack([r, g, b], axis=-1)
+    dst = src * np.array([0.85, 0.95, 1.10], dtype=np.float32) * 0.8 + 30
+    to_img = lambda a: Image.fromarray(np.clip(np.rint(a), 0, 255).astype(np.uint8), "RGB")
+    return to_img(src), to_img(dst)
+
+
+def _best(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3
+
+
+def bench(repeat: int):
+    print(f"{'recorte':>10} {'gain orig':>10} {'gain':>8} {'speedup':>8} {'reinhard':>9} {'histogram':>10}  (ms)")
+    for w, h in CROP_SIZES:
+        src, dst = synthetic_pair(w, h)
+        old = _old_gain(src, dst)
+        new = match_color(src, dst, "gain")
+        assert old.tobytes() == new.tobytes(), "gain difiere de la implementación original"
+        t_old = _best(lambda: _old_gain(src, dst), repeat)
+        t_gain = _best(lambda: match_color(src, dst, "gain"), repeat)
+        t_rh = _best(lambda: match_color(src, dst, "reinhard"), repeat)
+        t_hist = _best(lambda: match_color(src, dst, "histogram"), repeat)
+        print(f"{w:>4}x{h:<5} {t_old:10.2f} {t_gain:8.2f} {t_old/t_gain:7.1f}x {t_rh:9.2f} {t_hist:10.2f}")
+
+
+def check_fixtures(update: bool) -> bool:
+    src, dst = synthetic_pair(96, 64)
+    ok = True
+    for mode in MODES:
+        out = match_color(src, dst, mode)
+        path = FIXTURES / f"expected_{mode}.png"
+        if update:
+            FIXTURES.mkdir(parents=True, exist_ok=True)
+            out.save(path)
+            print(f"fixture actualizado: {path.name}")
+            continue
+        ref = np.asarray(Image.open(path).convert("RGB"), dtype=np.int16)
+        diff = np.abs(np.asarray(out, dtype=np.int16) - ref).max()
+        status = "OK" if diff <= 1 else "FALLO"
+        ok &= diff <= 1
+        print(f"regresión visual {mode:>9}: máx |Δ| = {diff} → {status}")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--update-fixtures", action="store_true")
+    args = ap.parse_args()
+
+    if args.update_fixtures:
+        check_fixtures(update=True)
+        return
+    bench(args.repeat)
+    if not check_fixtures(update=False):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
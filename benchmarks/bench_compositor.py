@@ -0,0 +1,96 @@
+# benchmarks/bench_compositor.py
+"""
+Compositor de salida del modelo (base64 → fondo HEX → tamaño de catálogo):
+implementación original vs _save_b64_as_png_with_bg_and_resize actual.
+Mide latencia (mejor de N) y pico de RSS (cada medición en un proceso aparte).
+
+    python -m benchmarks.bench_compositor
+    python -m benchmarks.bench_compositor --repeat 5 --mode RGB
+"""
+import argparse
+import base64
+import io
+import multiprocessing as mp
+import resource
+import time
+
+from PIL import Image
+
+from benchmarks._django import setup_django
+
+CATALOG_SIZES = [(1280, 1920), (720, 800), (420, 540)]
+MODEL_SIZE = (1024, 1536)
+
+
+def _old_compositor(b64_str, bg_hex, target_w, target_h, prefix):
+    # Copia de la implementación original (referencia)
+    from catalog.views import _hex_to_rgb
+
+    raw = base64.b64decode(b64_str)
+    img = Image.open(io.BytesIO(raw))
+    bg_rgb = _hex_to_rgb(bg_hex)
+    canvas = Image.new("RGB", (img.width, img.height), bg_rgb)
+    if img.mode in ("RGBA", "LA"):
+        canvas.paste(img.convert("RGBA"), (0, 0), img.convert("RGBA"))
+    else:
+        canvas.paste(img.convert("RGB"), (0, 0))
+    if (canvas.width, canvas.height) != (target_w, target_h):
+        canvas = canvas.resize((target_w, target_h), Image.LANCZOS)
+    return canvas
+
+
+def _model_output_b64(mode: str, size=MODEL_SIZE) -> str:
+    # Prenda opaca sobre fondo transparente, como devuelve el modelo
+    w, h = size
+    img = Image.new(mode, size, (0, 0, 0, 0) if mode == "RGBA" else (255, 255, 255))
+    garment = Image.radial_gradient("L").resize((w // 2, h // 2)).convert("RGB")
+    img.paste(garment, (w // 4, h // 4))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def _measure(variant, size, mode, repeat, q):
+    setup_django()
+    from catalog.views import _save_b64_as_png_with_bg_and_resize
+
+    fn = _old_compositor if variant == "original" else _save_b64_as_png_with_bg_and_resize
+    b64 = _model_output_b64(mode)
+    # Calienta imports/plugins con una imagen diminuta (sin inflar el pico de RSS)
+    fn(_model_output_b64(mode, (16, 24)), "#FFFFFF", 8, 12, "warmup")
+
+    # Pico de memoria de UNA llamada en frío
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out = fn(b64, "#FFFFFF", *size, "bench")
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    del out
+
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(b64, "#FFFFFF", *size, "bench")
+        best = min(best, time.perf_counter() - t0)
+    q.put((best, max(0, rss1 - rss0)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--mode", choices=["RGBA", "RGB"], default="RGBA", help="modo de la salida simulada del modelo")
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"modelo {MODEL_SIZE[0]}x{MODEL_SIZE[1]} {args.mode}")
+    print(f"{'destino':>10} {'variante':>10} {'ms':>8} {'ΔRSS MB':>8}")
+    for size in CATALOG_SIZES:
+        for variant in ("original", "actual"):
+            q = ctx.Queue()
+            p = ctx.Process(target=_measure, args=(variant, size, args.mode, args.repeat, q))
+            p.start()
+            best, drss_kb = q.get()
+            p.join()
+            print(f"{size[0]:>4}x{size[1]:<5} {variant:>10} {best*1e3:8.1f} {drss_kb/1024:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_encoders.py
+"""
+Codificadores de salida (catalog.encoders): tiempo de codificación y bytes
+para cada formato en los tamaños del catálogo.
+
+    python -m benchmarks.bench_encoders
+    python -m benchmarks.bench_encoders --repeat 5 --formats png png_fast webp jpeg
+"""
+import argparse
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from catalog.encoders import OUTPUT_FORMATS, encode
+
+CATALOG_SIZES = [(1280, 1920), (720, 800), (420, 540)]
+
+
+def _catalog_image(size) -> Image.Image:
+    """Prenda con degradado y textura de tejido sobre fondo plano, como las salidas reales."""
+    w, h = size
+    img = Image.new("RGB", size, (255, 255, 255))
+    gw, gh = w * 3 // 5, h * 3 // 4
+    shade = np.asarray(Image.radial_gradient("L").resize((gw, gh)), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    weave = rng.normal(0, 6, (gh, gw)).astype(np.float32)
+    garment = np.stack([60 + shade * 0.5 + weave, 90 + shade * 0.3 + weave, 160 - shade * 0.2 + weave], axis=-1)
+    garment = Image.fromarray(np.clip(garment, 0, 255).astype(np.uint8), "RGB")
+    garment = garment.filter(ImageFilter.GaussianBlur(0.6))
+    mask = Image.new("L", (gw, gh), 0)
+    mask.paste(255, (gw // 10, 0, gw - gw // 10, gh))
+    img.paste(garment, ((w - gw) // 2, (h - gh) // 2), mask)
+    return img
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--formats", nargs="*", default=list(OUTPUT_FORMATS))
+    args = ap.parse_args()
+
+    print(f"{'tamaño':>10} {'formato':>14} {'ms':>9} {'KiB':>9} {'vs png':>8}")
+    for size in CATALOG_SIZES:
+        img = _catalog_image(size)
+        ref = None
+        for fmt in args.formats:
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                data, _ = encode(img, fmt)
+                best = min(best, time.perf_counter() - t0)
+            if fmt == "png":
+                ref = len(data)
+            ratio = f"{len(data) / ref:7.2f}x" if ref else "       -"
+            print(f"{size[0]}x{size[1]:<5} {fmt:>14} {best * 1e3:9.1f} {len(data) / 1024:9.1f} {ratio:>8}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
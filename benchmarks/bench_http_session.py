@@ -0,0 +1,79 @@
+# benchmarks/bench_http_session.py
+"""
+Reutilización de conexiones: requests.get suelto vs sesión compartida de
+catalog.generate_service, contra un servidor HTTP/1.1 local (stub).
+
+    python -m benchmarks.bench_http_session
+    python -m benchmarks.bench_http_session --requests 200 --threads 4 --latency-ms 2
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from catalog.generate_service import get_http_session
+
+PAYLOAD = b"\x89PNG\r\n\x1a\n" + b"\0" * 4096
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # sin esperas de ACK retardado entre cabecera y cuerpo
+    connections = 0
+    latency = 0.0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with _StubHandler._lock:
+            _StubHandler.connections += 1
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+def _run(label, get, url, n, threads):
+    _StubHandler.connections = 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(lambda _: get(url, timeout=10).content, range(n)))
+    dt = time.perf_counter() - t0
+    print(f"{label:>18} {n:6d} {_StubHandler.connections:8d} {dt*1e3:10.1f} {dt/n*1e3:9.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    _StubHandler.latency = args.latency_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/img.png"
+
+    print(f"{'cliente':>18} {'reqs':>6} {'conexión':>8} {'total ms':>10} {'ms/req':>9}")
+    try:
+        _run("requests.get", requests.get, url, args.requests, args.threads)
+        _run("get_http_session", lambda u, **kw: get_http_session().get(u, **kw),
+             url, args.requests, args.threads)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
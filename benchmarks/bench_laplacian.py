@@ -0,0 +1,67 @@
+# benchmarks/bench_laplacian.py
+"""
+Compara la varianza del Laplaciano vectorizada (products.quality_check)
+con la implementación original de doble bucle Python.
+
+    python -m benchmarks.bench_laplacian
+    python -m benchmarks.bench_laplacian --sizes 64x64 256x256 4000x3000 --loop-max 300000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from products.quality_check import _laplacian_var
+
+
+def _laplacian_var_loop(gray: np.ndarray) -> float:
+    # Implementación original (referencia): un recorte 3x3 por píxel.
+    K = np.array([[0,  1, 0],
+                  [1, -4, 1],
+                  [0,  1, 0]], dtype=np.float32)
+    padded = np.pad(gray, 1, mode="reflect")
+    out = np.zeros_like(gray)
+    for i in range(gray.shape[0]):
+        for j in range(gray.shape[1]):
+            region = padded[i:i+3, j:j+3]
+            out[i, j] = (region * K).sum()
+    return float(out.var())
+
+
+def _timeit(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", nargs="+", default=["64x64", "128x128", "256x256", "512x512", "1024x768", "4000x3000"])
+    ap.add_argument("--loop-max", type=int, default=512 * 512,
+                    help="píxeles máximos para ejecutar la versión con bucle (es muy lenta)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'tamaño':>11} {'vector (ms)':>12} {'bucle (ms)':>12} {'speedup':>9} {'|Δ| rel':>9}")
+    for s in args.sizes:
+        w, h = (int(v) for v in s.lower().split("x"))
+        gray = rng.integers(0, 256, size=(h, w)).astype(np.float32)
+
+        t_vec = _timeit(_laplacian_var, gray, args.repeat)
+        v_vec = _laplacian_var(gray)
+
+        if w * h <= args.loop_max:
+            t_loop = _timeit(_laplacian_var_loop, gray, 1)
+            v_loop = _laplacian_var_loop(gray)
+            rel = abs(v_vec - v_loop) / max(1e-9, abs(v_loop))
+            print(f"{s:>11} {t_vec*1e3:12.2f} {t_loop*1e3:12.1f} {t_loop/t_vec:8.0f}x {rel:9.1e}")
+        else:
+            print(f"{s:>11} {t_vec*1e3:12.2f} {'-':>12} {'-':>9} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/bench_ratelimit.py
+"""
+Limitador del proveedor (catalog.ratelimit) contra un stub local que impone su
+propio cupo (token bucket) y responde 429 + Retry-After al pasarse.
+
+    python -m benchmarks.bench_ratelimit
+    python -m benchmarks.bench_ratelimit --calls 300 --threads 16 --server-rps 40
+
+Compara: sin limitador (cada 429 es un fallo), solo AIMD + Retry-After, y AIMD
+con token bucket ajustado al cupo del servidor. Muestra 429 recibidos, fallos,
+tiempo total y retraso de cola (espera antes de poder llamar).
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from catalog import generate_service, ratelimit
+from catalog.generate_service import ProviderError, get_http_session
+
+
+class _ServerBucket:
+    def __init__(self, rps: float, burst: float):
+        self.bucket = ratelimit.TokenBucket(rps, burst)
+
+    def allow(self) -> bool:
+        return self.bucket._take() <= 0
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    quota = None
+    latency = 0.0
+    retry_after = "1"
+    throttled = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.quota.allow():
+            with _StubHandler._lock:
+                _StubHandler.throttled += 1
+            body = b'{"error": "rate limited"}'
+            self.send_response(429)
+            self.send_header("Retry-After", self.retry_after)
+        else:
+            time.sleep(self.latency)
+            body = b'{"data": [{"b64_json": "AAAA"}]}'
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _run(label, call, n, threads, limiter=None):
+    _StubHandler.throttled = 0
+    failures = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal failures
+        try:
+            call()
+        except Exception:
+            with lock:
+                failures += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(one, range(n)))
+    dt = time.perf_counter() - t0
+
+    st = limiter.stats() if limiter else {}
+    print(f"{label:>22} {n:6d} {_StubHandler.throttled:6d} {failures:6d} {dt:9.2f} "
+          f"{st.get('queue_delay_avg', 0)*1e3:9.1f} {st.get('queue_delay_max', 0)*1e3:9.1f} "
+          f"{st.get('concurrency_limit', '-'):>6}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--calls", type=int, default=200)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--server-rps", type=float, default=50.0)
+    ap.add_argument("--server-burst", type=float, default=10.0)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    args = ap.parse_args()
+
+    _StubHandler.latency = args.latency_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/images/generations"
+
+    def raw_call():
+        r = get_http_session().post(url, json={"prompt": "x"}, timeout=10)
+        if r.status_code >= 400:
+            raise ProviderError(f"{r.status_code}", r.status_code)
+
+    def limited_call():
+        generate_service._provider_post("generate", url, 10, json={"prompt": "x"})
+
+    print(f"{'cliente':>22} {'calls':>6} {'429':>6} {'fallos':>6} {'total s':>9} "
+          f"{'cola ms':>9} {'cola max':>9} {'límite':>6}")
+    try:
+        _StubHandler.quota = _ServerBucket(args.server_rps, args.server_burst)
+        _run("sin limitador", raw_call, args.calls, args.threads)
+
+        time.sleep(1)
+        _StubHandler.quota = _ServerBucket(args.server_rps, args.server_burst)
+        ratelimit._limiter = ratelimit.ProviderLimiter(args.threads, rpm=0)
+        _run("AIMD + Retry-After", limited_call, args.calls, args.threads, ratelimit._limiter)
+
+        time.sleep(1)
+        _StubHandler.quota = _ServerBucket(args.server_rps, args.server_burst)
+        ratelimit._limiter = ratelimit.ProviderLimiter(args.threads, rpm=args.server_rps * 60 * 0.95,
+                                                       burst=args.server_burst)
+        _run("AIMD + token bucket", limited_call, args.calls, args.threads, ratelimit._limiter)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
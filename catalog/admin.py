@@ -1,3 +1,17 @@
 from django.contrib import admin
+from .models import GenerationBatch, GenerationJob
 
-# Register your models here.
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "batch", "item_id", "worker", "created_at", "started_at", "finished_at")
+    list_filter = ("status",)
+    search_fields = ("id", "worker")
+    readonly_fields = ("created_at", "started_at", "finished_at")
+
+
+@admin.register(GenerationBatch)
+class GenerationBatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "total", "created_at")
+    search_fields = ("id",)
+    readonly_fields = ("created_at",)
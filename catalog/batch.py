@@ -0,0 +1,194 @@
+# catalog/batch.py
+"""
+Lotes de generación: un manifiesto con opciones comunes y N imágenes.
+
+  {
+    "category": "...", "subcategory": "...", "views": [...], "options": {...},
+    "items": [
+      {"id": "SKU-001", "upload_id": "..."},
+      {"id": "SKU-002", "image_url": "https://...", "options": {"background_hex": "#000000"}},
+      ...
+    ]
+  }
+
+Los items se validan juntos con el validador compilado del catálogo
+(catalog.validation; las claves del item pisan a las comunes, "options" se
+mezcla) y cada uno se guarda como un GenerationJob del lote. A partir
+de ahí son jobs normales de catalog.jobs: el pool de jobs limita cuántos items van
+a la vez y el pool de vistas de generate_service (MAX_CONCURRENCY) cuántas
+llamadas al proveedor; un 429 pausa a todos (catalog.ratelimit). Cada item termina
+por su cuenta (done/failed), así que un fallo no para el lote.
+
+El progreso vive en la BD. finished_since() devuelve, sin esperar, los items
+terminados después de un cursor opaco (el finish_seq del último entregado: lo
+asigna jobs al confirmar cada item, en orden de commit, así que un item que
+termina "antes" pero confirma después no se salta); el
+cliente vuelve a preguntar con el cursor "next" de la respuesta anterior
+(batch_status?since=...), así ninguna petición retiene un worker ni una
+conexión a la BD. resume_batch() re-encola los fallidos (o los que se quedaron
+a medias si el proceso murió).
+"""
+import os
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import jobs
+from .models import GenerationBatch, GenerationJob
+from .validation import get_validator
+
+MAX_BATCH_ITEMS = int(os.environ.get("PHOMAGIC_BATCH_MAX_ITEMS", "1000"))
+# Items como mucho por respuesta de batch_status?since=
+PAGE_SIZE = int(os.environ.get("PHOMAGIC_BATCH_PAGE_SIZE", "200"))
+
+# Claves que puede traer cada item (además de "id", "views" y "options")
+ITEM_KEYS = ("image_url", "upload_id", "logo_box_json", "neck_box_json")
+TERMINAL = (GenerationJob.STATUS_DONE, GenerationJob.STATUS_FAILED)
+
+
+def build_batch_jobs(payload: dict) -> Tuple[bool, Optional[str], Optional[List[Tuple[str, Dict]]]]:
+    """
+    Valida el manifiesto entero. Devuelve (ok, error, [(item_id, job), ...]).
+    Si hay items inválidos no se crea nada y el error los lista todos.
+    """
+    items = payload.get("items")
+    if not isinstance(items, list) or not items:
+        return False, "Falta items (lista de imágenes)", None
+    if len(items) > MAX_BATCH_ITEMS:
+        return False, f"Demasiados items ({len(items)}). Máximo {MAX_BATCH_ITEMS} por lote.", None
+
+    shared = {k: v for k, v in payload.items() if k != "items"}
+    shared_options = shared.get("options") or {}
+
+    errors, seen, pending = [], set(), []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append(f"items[{i}]: debe ser un objeto")
+            continue
+        item_id = str(item.get("id") or i)
+        if item_id in seen:
+            errors.append(f"items[{i}]: id repetido '{item_id}'")
+            continue
+        seen.add(item_id)
+
+        item_payload = dict(shared)
+        item_payload.update({k: item[k] for k in ITEM_KEYS if item.get(k)})
+        if "views" in item:
+            item_payload["views"] = item["views"]
+        # Sin options propias el item comparte el dict común (validate_many lo valida una vez)
+        item_payload["options"] = {**shared_options, **item["options"]} if item.get("options") else shared_options
+        pending.append((i, item_id, item_payload))
+
+    # Un solo snapshot del catálogo para todo el lote
+    results = get_validator().validate_many([p for _, _, p in pending])
+    built = []
+    for (i, item_id, _), (ok, err, job) in zip(pending, results):
+        if not ok:
+            errors.append(f"items[{i}] ({item_id}): {err}")
+            continue
+        built.append((item_id, job))
+
+    if errors:
+        return False, "; ".join(errors), None
+    return True, None, built
+
+
+def submit_batch(payload: dict, built: List[Tuple[str, Dict]]) -> GenerationBatch:
+    """Persiste el lote y sus jobs en una transacción y los lanza (modo "thread")."""
+    manifest = {k: v for k, v in payload.items() if k != "items"}
+    with transaction.atomic():
+        batch = GenerationBatch.objects.create(manifest=manifest, total=len(built))
+        rows = GenerationJob.objects.bulk_create([
+            GenerationJob(job=job, batch=batch, seq=seq, item_id=item_id)
+            for seq, (item_id, job) in enumerate(built)
+        ])
+    jobs.dispatch(row.id for row in rows)
+    return batch
+
+
+def batch_counts(batch: GenerationBatch) -> Dict:
+    counts = {s: 0 for s, _ in GenerationJob.STATUS_CHOICES}
+    rows = (GenerationJob.objects.filter(batch=batch)
+            .values_list("status").annotate(n=Count("id")).order_by())
+    for status, n in rows:
+        counts[status] = n
+    finished = counts[GenerationJob.STATUS_DONE] + counts[GenerationJob.STATUS_FAILED]
+    return {
+        "total": batch.total,
+        "finished": finished,
+        "complete": finished >= batch.total,
+        **counts,
+    }
+
+
+def item_event(row: GenerationJob) -> Dict:
+    """Resultado de un item tal cual se guardó (image_path relativo a MEDIA_ROOT)."""
+    data = {
+        "seq": row.seq,
+        "item_id": row.item_id,
+        "job_id": row.id,
+        "status": row.status,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+    }
+    if row.status == GenerationJob.STATUS_DONE:
+        data["results"] = row.results or []
+    elif row.status == GenerationJob.STATUS_FAILED:
+        data["error"] = row.error
+    return data
+
+
+def make_cursor(row: GenerationJob) -> str:
+    return str(row.finish_seq)
+
+
+def parse_cursor(value: str) -> int:
+    """Inverso de make_cursor; ValueError si no tiene ese formato."""
+    if not value.isdigit():
+        raise ValueError(value)
+    return int(value)
+
+
+def finished_since(batch: GenerationBatch, cursor: Optional[int] = None,
+                   limit: int = PAGE_SIZE) -> List[GenerationJob]:
+    """
+    Items terminados después de `cursor` (exclusivo), en orden de finish_seq,
+    como mucho `limit`. Una sola consulta: no espera a los que faltan.
+    """
+    qs = GenerationJob.objects.filter(batch=batch, status__in=TERMINAL, finish_seq__isnull=False)
+    if cursor is not None:
+        qs = qs.filter(finish_seq__gt=cursor)
+    return list(qs.order_by("finish_seq")[:limit])
+
+
+def resume_batch(batch: GenerationBatch, partial: bool = False,
+                 stale_after: Optional[timedelta] = None) -> Dict:
+    """
+    Re-encola los items fallidos y vuelve a lanzar los pendientes.
+      partial=True     → también los "done" con alguna vista fallida
+      stale_after=...  → también los "running" más antiguos que eso (proceso caído)
+    """
+    items = GenerationJob.objects.filter(batch=batch)
+    requeue = list(items.filter(status=GenerationJob.STATUS_FAILED).values_list("id", flat=True))
+    if partial:
+        for job_id, results in items.filter(status=GenerationJob.STATUS_DONE).values_list("id", "results"):
+            if any(r.get("error") for r in results or []):
+                requeue.append(job_id)
+    if stale_after is not None:
+        limit = timezone.now() - stale_after
+        requeue += list(items.filter(status=GenerationJob.STATUS_RUNNING, started_at__lt=limit)
+                        .values_list("id", flat=True))
+
+    n = 0
+    if requeue:
+        n = GenerationJob.objects.filter(id__in=requeue).update(
+            status=GenerationJob.STATUS_PENDING, results=None, error="",
+            worker="", started_at=None, finished_at=None, finish_seq=None,
+        )
+
+    # En modo "thread" la cola del pool no sobrevive a un reinicio: se relanza todo lo pendiente
+    pending_ids = list(items.filter(status=GenerationJob.STATUS_PENDING).values_list("id", flat=True))
+    jobs.dispatch(pending_ids)
+    return {"requeued": n, "pending": len(pending_ids)}
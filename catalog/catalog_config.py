@@ -18,6 +18,13 @@ CATALOG = {
     }
 }
 
+# Tamaños para subcategorías que solo existen en BD (products.SubCategory), sin entrada aquí
+DEFAULT_SIZES_PX = [
+    {"width": 1280, "height": 1920},
+    {"width":  720, "height":  800},
+    {"width":  420, "height":  540},
+]
+
 SHADOW_PRESET_PHOTOSHOP = {
     "mode": "multiply",   # “Multiplicar”
     "opacity": 0.43,      # 43 %
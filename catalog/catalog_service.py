@@ -0,0 +1,249 @@
+# catalog/catalog_service.py
+"""
+Catálogo único (categorías → subcategorías → vistas y tamaños) para la API
+(get_catalog, _validate_and_build_job) y las páginas de products.
+
+Origen de los datos:
+- "db": CATALOG (catalog_config) fusionado con las tablas products.Category /
+  SubCategory / ViewOption. Las entradas de CATALOG se conservan; la BD añade
+  subcategorías (con DEFAULT_SIZES_PX si no están en CATALOG) y vistas.
+  Una vista de BD solo entra si tiene de dónde sacar el prompt: VIEW_PROMPTS
+  (prompt_builder), ViewOption.prompt o MEDIA_ROOT/lineas/<cat>/<sub>/<vista>.docx.
+- "static": CATALOG tal cual, si products no está instalada, las tablas
+  están vacías o no se pueden leer.
+
+Cada build es un CatalogSnapshot inmutable con sus tablas de consulta ya
+hechas. Se reconstruye cuando cambia la versión:
+- post_save / post_delete de los tres modelos (admin, shell, import) suben
+  CatalogVersion en BD y descartan el snapshot del proceso;
+- los demás procesos comparan su versión con la de BD como mucho cada
+  PHOMAGIC_CATALOG_CHECK_INTERVAL segundos (2 por defecto).
+Las escrituras con .update()/bulk_create no lanzan señales: llamar a bump_version().
+Un .docx nuevo tampoco: la vista aparece con la siguiente versión.
+"""
+import copy
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from .catalog_config import CATALOG, DEFAULTS, DEFAULT_SIZES_PX
+from .prompt_builder import VIEW_PROMPTS
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = float(os.environ.get("PHOMAGIC_CATALOG_CHECK_INTERVAL", "2"))
+VERSION_KEY = "catalog"
+SOURCE_MODELS = ("products.Category", "products.SubCategory", "products.ViewOption")
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    source: str                     # "db" | "static"
+    _catalog: Dict = field(repr=False)
+    _defaults: Dict = field(repr=False)
+    _subcategories: Dict[str, Tuple[str, ...]] = field(repr=False)
+    _view_ids: Dict[Tuple[str, str], FrozenSet[str]] = field(repr=False)
+    _sizes: Dict[Tuple[str, str], Tuple[Tuple[int, int], ...]] = field(repr=False)
+    _prompts: Dict[Tuple[str, str, str], str] = field(repr=False)
+
+    @classmethod
+    def build(cls, version: int, source: str, catalog: Dict, prompts: Optional[Dict] = None) -> "CatalogSnapshot":
+        return cls(
+            version=version,
+            source=source,
+            _catalog=catalog,
+            _defaults=copy.deepcopy(DEFAULTS),
+            _subcategories={c: tuple(subs) for c, subs in catalog.items()},
+            _view_ids={(c, s): frozenset(v["id"] for v in e["views"])
+                       for c, subs in catalog.items() for s, e in subs.items()},
+            _sizes={(c, s): tuple((z["width"], z["height"]) for z in e["sizes_px"])
+                    for c, subs in catalog.items() for s, e in subs.items()},
+            _prompts=dict(prompts or {}),
+        )
+
+    @property
+    def from_db(self) -> bool:
+        return self.source == "db"
+
+    def categories(self) -> Tuple[str, ...]:
+        return tuple(self._subcategories)
+
+    def subcategories(self, category: str) -> Tuple[str, ...]:
+        return self._subcategories.get(category, ())
+
+    def has(self, category: str, subcategory: str) -> bool:
+        return (category, subcategory) in self._view_ids
+
+    def view_ids(self, category: str, subcategory: str) -> FrozenSet[str]:
+        return self._view_ids.get((category, subcategory), frozenset())
+
+    def views(self, category: str, subcategory: str) -> List[Dict]:
+        entry = self._catalog.get(category, {}).get(subcategory)
+        return [dict(v) for v in entry["views"]] if entry else []
+
+    def sizes(self, category: str, subcategory: str) -> Tuple[Tuple[int, int], ...]:
+        return self._sizes.get((category, subcategory), ())
+
+    def sizes_px(self, category: str, subcategory: str) -> List[Dict]:
+        return [{"width": w, "height": h} for w, h in self.sizes(category, subcategory)]
+
+    def prompt(self, category: str, subcategory: str, view_id: str) -> Optional[str]:
+        """ViewOption.prompt guardado (solo con origen "db")."""
+        return self._prompts.get((category, subcategory, view_id))
+
+    def defaults(self) -> Dict:
+        return copy.deepcopy(self._defaults)
+
+    def to_dict(self) -> Dict:
+        """Copia JSON-serializable: {"catalog": ..., "defaults": ...}."""
+        return {"catalog": copy.deepcopy(self._catalog), "defaults": self.defaults()}
+
+
+# ---------- Construcción ----------
+
+def _label(view_id: str) -> str:
+    return view_id.replace("_", " ").capitalize()
+
+
+def _docx_path(category: str, subcategory: str, view_id: str):
+    """MEDIA_ROOT/lineas/<cat>/<sub>/<vista>.docx, o None si products no está instalada."""
+    from django.apps import apps
+    if not apps.is_installed("products"):
+        return None
+    from products.prompt_store import lineas_root
+    return lineas_root() / category / subcategory / f"{view_id}.docx"
+
+
+def _has_prompt_source(category: str, subcategory: str, view_id: str, prompt: str) -> bool:
+    if view_id in VIEW_PROMPTS or prompt:
+        return True
+    path = _docx_path(category, subcategory, view_id)
+    return path is not None and path.is_file()
+
+
+def _from_models() -> Tuple[Optional[Dict], Dict]:
+    """(catalog, prompts) con CATALOG + products; (None, {}) si no hay nada que leer."""
+    from django.apps import apps
+    if not apps.is_installed("products"):
+        return None, {}
+    from products.models import SubCategory, ViewOption
+
+    subs = list(SubCategory.objects.order_by("category__category_name", "name")
+                .values_list("category__category_name", "name"))
+    if not subs:
+        return None, {}
+    rows = list(ViewOption.objects.order_by("name")
+                .values_list("subcategory__category__category_name", "subcategory__name", "name", "prompt"))
+
+    catalog: Dict = copy.deepcopy(CATALOG)
+    for cat, sub in subs:
+        catalog.setdefault(cat, {}).setdefault(sub, {"views": [], "sizes_px": copy.deepcopy(DEFAULT_SIZES_PX)})
+    prompts = {}
+    skipped = []
+    for cat, sub, name, prompt in rows:
+        if not _has_prompt_source(cat, sub, name, prompt):
+            skipped.append(f"{cat}/{sub}/{name}")
+            continue
+        if prompt:
+            prompts[(cat, sub, name)] = prompt
+        entry = catalog.setdefault(cat, {}).setdefault(sub, {"views": [], "sizes_px": copy.deepcopy(DEFAULT_SIZES_PX)})
+        if all(v["id"] != name for v in entry["views"]):
+            entry["views"].append({"id": name, "label": _label(name)})
+    if skipped:
+        logger.warning("Catálogo: vistas sin prompt (ni VIEW_PROMPTS, ni ViewOption.prompt, ni .docx): %s",
+                       ", ".join(skipped))
+    return catalog, prompts
+
+
+def view_prompt(category: str, subcategory: str, view_id: str) -> Optional[str]:
+    """
+    Texto de una vista que no está en VIEW_PROMPTS: ViewOption.prompt del
+    snapshot o, si no tiene, su .docx (products.prompt_store). None si no hay.
+    Un ViewOption.prompt guardado gana aunque el .docx sea más reciente
+    (ver la precedencia en products.prompt_store).
+    """
+    text = get_snapshot().prompt(category, subcategory, view_id)
+    if text:
+        return text
+    path = _docx_path(category, subcategory, view_id)
+    if path is None:
+        return None
+    from products.prompt_store import get_store
+    return get_store().get(path) or None
+
+
+def build_snapshot(version: int) -> CatalogSnapshot:
+    try:
+        catalog, prompts = _from_models()
+    except Exception as e:  # tablas sin migrar, BD caída...
+        logger.warning("Catálogo: no se pudo leer de BD (%s); uso CATALOG", e)
+        catalog, prompts = None, {}
+    if catalog is None:
+        return CatalogSnapshot.build(version, "static", copy.deepcopy(CATALOG))
+    return CatalogSnapshot.build(version, "db", catalog, prompts)
+
+
+# ---------- Versión e invalidación ----------
+
+_lock = threading.Lock()
+_snapshot: Optional[CatalogSnapshot] = None
+_checked = 0.0
+
+
+def _db_version() -> Optional[int]:
+    from .models import CatalogVersion
+    try:
+        return (CatalogVersion.objects.filter(key=VERSION_KEY)
+                .values_list("version", flat=True).first()) or 0
+    except Exception as e:
+        logger.debug("Catálogo: sin versión en BD (%s)", e)
+        return None
+
+
+def get_snapshot() -> CatalogSnapshot:
+    """Snapshot vigente; comprueba la versión en BD como mucho cada CHECK_INTERVAL segundos."""
+    global _snapshot, _checked
+    snap = _snapshot
+    now = time.monotonic()
+    if snap is not None and now - _checked < CHECK_INTERVAL:
+        return snap
+    with _lock:
+        snap = _snapshot
+        if snap is not None and now - _checked < CHECK_INTERVAL:
+            return snap
+        version = _db_version()
+        if snap is None or (version is not None and version != snap.version):
+            snap = build_snapshot(version or 0)
+            _snapshot = snap
+            logger.info("Catálogo v%s (%s): %d categorías", snap.version, snap.source, len(snap.categories()))
+        _checked = now
+        return snap
+
+
+def bump_version(**kwargs):
+    """Nueva versión en BD y snapshot del proceso descartado (receptor de post_save/post_delete)."""
+    global _snapshot
+    from django.db.models import F
+    from .models import CatalogVersion
+    try:
+        if not CatalogVersion.objects.filter(key=VERSION_KEY).update(version=F("version") + 1):
+            CatalogVersion.objects.get_or_create(key=VERSION_KEY, defaults={"version": 1})
+    except Exception as e:
+        logger.warning("Catálogo: no se pudo subir la versión (%s)", e)
+    with _lock:
+        _snapshot = None
+
+
+def connect_signals():
+    """Llamado desde CatalogConfig.ready (solo si products está instalada)."""
+    from django.apps import apps
+    from django.db.models.signals import post_delete, post_save
+    if not apps.is_installed("products"):
+        return
+    for model in SOURCE_MODELS:
+        post_save.connect(bump_version, sender=model, dispatch_uid=f"catalog_version_save_{model}")
+        post_delete.connect(bump_version, sender=model, dispatch_uid=f"catalog_version_delete_{model}")
@@ -0,0 +1,124 @@
+# catalog/color_transfer.py
+"""
+Transferencia de color de una región de origen (recorte del original) a la
+región destino (misma zona en la imagen generada).
+
+Modos:
+  "gain"      → out_c = src_c * mean_dst_c / mean_src_c   (el de siempre)
+  "reinhard"  → iguala media y desviación típica por canal en Lab (Reinhard et al.)
+  "histogram" → iguala el histograma acumulado de cada canal RGB
+
+Las estadísticas RGB salen del histograma de 256 bins que calcula Pillow en C
+(sin recorrer píxeles en Python) y los modos por canal se aplican como una
+única LUT de 768 entradas con Image.point. Reinhard, que no es separable en
+RGB, se hace entero en NumPy (float32, con tablas para la curva sRGB).
+"""
+import numpy as np
+from PIL import Image
+
+MODE_GAIN = "gain"
+MODE_REINHARD = "reinhard"
+MODE_HISTOGRAM = "histogram"
+MODES = (MODE_GAIN, MODE_REINHARD, MODE_HISTOGRAM)
+
+_LEVELS = np.arange(256, dtype=np.float64)
+
+
+def _hist3(img: Image.Image) -> np.ndarray:
+    return np.asarray(img.histogram(), dtype=np.float64).reshape(3, 256)
+
+
+def _means(hist: np.ndarray) -> np.ndarray:
+    return (hist * _LEVELS).sum(axis=1) / np.maximum(1.0, hist.sum(axis=1))
+
+
+def _apply_lut(img: Image.Image, lut: np.ndarray) -> Image.Image:
+    return img.point(lut.astype(np.uint8).ravel().tolist())
+
+
+def gain_lut(src_hist: np.ndarray, dst_hist: np.ndarray) -> np.ndarray:
+    gain = np.maximum(1.0, _means(dst_hist)) / np.maximum(1.0, _means(src_hist))
+    return np.clip(np.rint(_LEVELS[None, :] * gain[:, None]), 0, 255)
+
+
+def histogram_lut(src_hist: np.ndarray, dst_hist: np.ndarray) -> np.ndarray:
+    src_cdf = np.cumsum(src_hist, axis=1)
+    dst_cdf = np.cumsum(dst_hist, axis=1)
+    src_cdf /= np.maximum(1.0, src_cdf[:, -1:])
+    dst_cdf /= np.maximum(1.0, dst_cdf[:, -1:])
+    lut = np.empty((3, 256))
+    for c in range(3):
+        lut[c] = np.interp(src_cdf[c], dst_cdf[c], _LEVELS)
+    return np.clip(np.rint(lut), 0, 255)
+
+
+# ---------- sRGB (D65) <-> CIE Lab ----------
+
+_RGB2XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                     [0.2126729, 0.7151522, 0.0721750],
+                     [0.0193339, 0.1191920, 0.9503041]], dtype=np.float32)
+_XYZ2RGB = np.linalg.inv(_RGB2XYZ).astype(np.float32)
+_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+_EPS = 216 / 24389
+_KAPPA = 24389 / 27
+
+
+# sRGB → lineal por tabla (la entrada es uint8) y lineal → sRGB por tabla de 4096 pasos
+_SRGB = np.arange(256, dtype=np.float32) / 255.0
+_SRGB_TO_LIN = np.where(_SRGB <= 0.04045, _SRGB / 12.92, ((_SRGB + 0.055) / 1.055) ** 2.4).astype(np.float32)
+_LIN_STEPS = 4095
+_LIN = np.arange(_LIN_STEPS + 1, dtype=np.float64) / _LIN_STEPS
+_LIN_TO_SRGB = np.rint(255.0 * np.where(_LIN <= 0.0031308, _LIN * 12.92,
+                                        1.055 * _LIN ** (1 / 2.4) - 0.055)).astype(np.uint8)
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """uint8 (..., 3) sRGB → float32 (..., 3) Lab."""
+    xyz = (_SRGB_TO_LIN[rgb] @ (_RGB2XYZ.T / _WHITE[None, :]))
+    f = np.where(xyz > _EPS, np.cbrt(xyz), (_KAPPA * xyz + 16) / 116)
+    L = 116 * f[..., 1] - 16
+    a = 500 * (f[..., 0] - f[..., 1])
+    b = 200 * (f[..., 1] - f[..., 2])
+    return np.stack([L, a, b], axis=-1)
+
+
+def lab_to_rgb(lab: np.ndarray) -> np.ndarray:
+    """float32 (..., 3) Lab → uint8 (..., 3) sRGB (recortado a gama)."""
+    fy = (lab[..., 0] + 16) / 116
+    fx = fy + lab[..., 1] / 500
+    fz = fy - lab[..., 2] / 200
+    f = np.stack([fx, fy, fz], axis=-1)
+    f3 = f * f * f
+    xyz = np.where(f3 > _EPS, f3, (116 * f - 16) / _KAPPA)
+    lin = np.clip(xyz @ (_XYZ2RGB * _WHITE[None, :]).T, 0.0, 1.0)
+    return _LIN_TO_SRGB[np.rint(lin * _LIN_STEPS).astype(np.intp)]
+
+
+def _reinhard(src: Image.Image, dst: Image.Image) -> Image.Image:
+    src_lab = rgb_to_lab(np.asarray(src))
+    dst_lab = rgb_to_lab(np.asarray(dst))
+    s_mean = src_lab.reshape(-1, 3).mean(axis=0)
+    s_std = src_lab.reshape(-1, 3).std(axis=0)
+    d_mean = dst_lab.reshape(-1, 3).mean(axis=0)
+    d_std = dst_lab.reshape(-1, 3).std(axis=0)
+    scale = d_std / np.maximum(s_std, 1e-3)
+    out = (src_lab - s_mean) * scale + d_mean
+    return Image.fromarray(lab_to_rgb(out), "RGB")
+
+
+def match_color(src_rgb: Image.Image, dst_region_rgb: Image.Image, mode: str = MODE_GAIN) -> Image.Image:
+    """
+    Devuelve `src_rgb` (RGB) con el color ajustado a `dst_region_rgb` según `mode`.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo de color no válido: {mode}. Usa uno de {MODES}")
+
+    src = src_rgb if src_rgb.mode == "RGB" else src_rgb.convert("RGB")
+    dst = dst_region_rgb if dst_region_rgb.mode == "RGB" else dst_region_rgb.convert("RGB")
+
+    if mode == MODE_REINHARD:
+        return _reinhard(src, dst)
+
+    src_hist, dst_hist = _hist3(src), _hist3(dst)
+    lut = gain_lut(src_hist, dst_hist) if mode == MODE_GAIN else histogram_lut(src_hist, dst_hist)
+    return _apply_lut(src, lut)
@@ -0,0 +1,65 @@
+# catalog/encoders.py
+"""
+Codificación de la imagen final (ya compuesta sobre fondo opaco).
+
+Formatos (client_options.output_format; por defecto PHOMAGIC_OUTPUT_FORMAT o "png"):
+  "png"            PNG sin pérdida, zlib nivel PHOMAGIC_PNG_COMPRESS_LEVEL (6, el de Pillow)
+  "png_fast"       PNG sin pérdida, zlib nivel 1: bastante más rápido, algo más pesado
+  "png_small"      PNG sin pérdida, nivel 9 + optimize: el más ligero y el más lento
+  "webp"           WebP con pérdida (quality 90)
+  "webp_lossless"  WebP sin pérdida
+  "jpeg"           JPEG 4:4:4 quality 92 (el fondo es opaco, no se pierde nada de alfa)
+
+output_quality (1-100) sustituye la calidad de webp/jpeg.
+benchmarks/bench_encoders.py compara tiempo y bytes para los tamaños del catálogo.
+"""
+import io
+import os
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+PNG_COMPRESS_LEVEL = int(os.environ.get("PHOMAGIC_PNG_COMPRESS_LEVEL", "6"))
+
+OUTPUT_FORMATS: Dict[str, Dict] = {
+    "png": {"ext": "png", "mime": "image/png", "pil": "PNG",
+            "params": {"compress_level": PNG_COMPRESS_LEVEL}},
+    "png_fast": {"ext": "png", "mime": "image/png", "pil": "PNG",
+                 "params": {"compress_level": 1}},
+    "png_small": {"ext": "png", "mime": "image/png", "pil": "PNG",
+                  "params": {"compress_level": 9, "optimize": True}},
+    "webp": {"ext": "webp", "mime": "image/webp", "pil": "WEBP",
+             "params": {"quality": 90, "method": 4}, "quality_param": "quality"},
+    "webp_lossless": {"ext": "webp", "mime": "image/webp", "pil": "WEBP",
+                      "params": {"lossless": True, "quality": 50, "method": 4}},
+    "jpeg": {"ext": "jpg", "mime": "image/jpeg", "pil": "JPEG",
+             "params": {"quality": 92, "subsampling": 0, "optimize": True}, "quality_param": "quality"},
+}
+
+DEFAULT_OUTPUT_FORMAT = os.environ.get("PHOMAGIC_OUTPUT_FORMAT", "png")
+
+
+def validate_output(fmt, quality) -> Optional[str]:
+    """Mensaje de error o None (mismo estilo que _validate_and_build_job)."""
+    if fmt not in OUTPUT_FORMATS:
+        return f"output_format no válido. Usa uno de: {list(OUTPUT_FORMATS)}"
+    if quality is not None:
+        if not isinstance(quality, int) or isinstance(quality, bool) or not 1 <= quality <= 100:
+            return "output_quality debe ser un entero entre 1 y 100"
+        if "quality_param" not in OUTPUT_FORMATS[fmt]:
+            return f"output_quality no aplica a {fmt}"
+    return None
+
+
+def encode(img: Image.Image, fmt: str = DEFAULT_OUTPUT_FORMAT, quality: Optional[int] = None) -> Tuple[bytes, str]:
+    """Devuelve (bytes, extensión)."""
+    spec = OUTPUT_FORMATS[fmt]
+    params = dict(spec["params"])
+    if quality is not None and "quality_param" in spec:
+        params[spec["quality_param"]] = quality
+    if spec["pil"] == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    buf = io.BytesIO()
+    img.save(buf, format=spec["pil"], **params)
+    return buf.getvalue(), spec["ext"]
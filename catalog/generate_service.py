@@ -1,47 +1,254 @@
 # catalog/generate_service.py
 import io
 import os
+import posixpath
 import time
-from typing import List, Dict
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional
+from urllib.parse import urlsplit, unquote
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http.request import validate_host
+from PIL import Image, ImageOps
 
+from .ingest import FORMATS, load_upload_meta, sniff_format, upload_rel_path
 from .prompt_builder import build_prompts
+from .ratelimit import ProviderLimiter, get_provider_limiter
+from .timing import Timings, span
+from .retry import DOWNLOAD_POLICY, JOB_DEADLINE, PROVIDER_POLICY, Deadline, classify, new_idempotency_key
+from . import metrics
+from .result_cache import get_result_cache, image_digest, make_key
 
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+IMAGE_MODEL = "gpt-image-1"
+
+# Tope global de llamadas simultáneas al proveedor (todas las peticiones del proceso)
+MAX_CONCURRENCY = max(1, int(os.environ.get("PHOMAGIC_MAX_CONCURRENCY", "4")))
+
+logger = logging.getLogger(__name__)
+
+# Pool compartido: su tamaño ES el tope global, las vistas de todos los jobs hacen cola aquí
+_view_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="phomagic-view")
+
+# ---------- Sesión HTTP compartida (keep-alive + pool de conexiones) ----------
+
+# Timeouts (segundos): conexión común + lectura por tipo de llamada
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("PHOMAGIC_HTTP_CONNECT_TIMEOUT", "10"))
+DOWNLOAD_READ_TIMEOUT = float(os.environ.get("PHOMAGIC_DOWNLOAD_TIMEOUT", "30"))
+GENERATE_READ_TIMEOUT = float(os.environ.get("PHOMAGIC_GENERATE_TIMEOUT", "120"))
+EDIT_READ_TIMEOUT = float(os.environ.get("PHOMAGIC_EDIT_TIMEOUT", "180"))
+
+# Conexiones keep-alive por host: el proveedor recibe hasta MAX_CONCURRENCY llamadas
+# a la vez; el resto de hosts (descargas de imágenes) se queda en un pool pequeño.
+HTTP_POOL_MAXSIZE = int(os.environ.get("PHOMAGIC_HTTP_POOL_MAXSIZE", "10"))
+PROVIDER_POOL_MAXSIZE = max(MAX_CONCURRENCY, int(os.environ.get("PHOMAGIC_PROVIDER_POOL_MAXSIZE", "0") or 0))
+
+
+def _timeout(read: float) -> Tuple[float, float]:
+    return (HTTP_CONNECT_TIMEOUT, read)
+
+
+def _make_adapter(pool_maxsize: int) -> HTTPAdapter:
+    # Sin reintentos en urllib3: los decide catalog.retry (si no, se multiplicarían)
+    return HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize,
+                       max_retries=Retry(0, read=False), pool_block=False)
+
+
+_adapters_lock = threading.Lock()
+_adapters = None  # [(prefijo, HTTPAdapter)] compartidos por todas las sesiones
+_local = threading.local()
+
+
+def _shared_adapters():
+    global _adapters
+    if _adapters is None:
+        with _adapters_lock:
+            if _adapters is None:
+                parts = urlsplit(OPENAI_BASE_URL)
+                provider_prefix = f"{parts.scheme}://{parts.netloc}/"
+                _adapters = [
+                    ("https://", _make_adapter(HTTP_POOL_MAXSIZE)),
+                    ("http://", _make_adapter(HTTP_POOL_MAXSIZE)),
+                    # requests elige el prefijo más largo → pool propio para el proveedor
+                    (provider_prefix, _make_adapter(PROVIDER_POOL_MAXSIZE)),
+                ]
+    return _adapters
+
+
+def get_http_session() -> requests.Session:
+    """
+    Sesión requests del hilo actual. Las sesiones son por hilo (requests.Session
+    no es thread-safe: cookies, hooks), pero todas montan los MISMOS adaptadores,
+    así que el pool de conexiones keep-alive (urllib3, thread-safe) es común
+    a todo el proceso.
+    """
+    sess = getattr(_local, "session", None)
+    if sess is None:
+        sess = requests.Session()
+        for prefix, adapter in _shared_adapters():
+            sess.mount(prefix, adapter)
+        _local.session = sess
+    return sess
+
 
 # Tamaños permitidos por gpt-image-1
 def _closest_openai_size(w: int, h: int) -> str:
     return "1024x1536" if h >= w else "1536x1024"
 
 
-def _download_image_bytes(url: str, max_retries: int = 3, backoff_sec: float = 1.5) -> bytes:
+def _download_image_bytes(url: str, deadline: Optional[Deadline] = None) -> bytes:
     headers = {
         "User-Agent": "Mozilla/5.0 (compatible; PhomagicBot/1.0; +https://www.phomagic.com)",
         "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
         "Referer": "https://www.phomagic.com/",
     }
-    last_exc = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            r = requests.get(url, headers=headers, timeout=30)
-            r.raise_for_status()
-            ctype = r.headers.get("Content-Type", "")
-            if not ctype.startswith(("image/", "application/octet-stream")):
-                raise requests.HTTPError(f"Unexpected content-type: {ctype}", response=r)
-            return r.content
-        except Exception as e:
-            last_exc = e
-            if attempt < max_retries:
-                time.sleep(backoff_sec * attempt)
-                continue
-            raise
-    raise last_exc  # por si acaso
-
-
-def _openai_generate(prompt: str, size: str) -> str:
+
+    def fetch() -> bytes:
+        read = deadline.clamp(DOWNLOAD_READ_TIMEOUT) if deadline else DOWNLOAD_READ_TIMEOUT
+        r = get_http_session().get(url, headers=headers, timeout=_timeout(read))
+        r.raise_for_status()
+        ctype = r.headers.get("Content-Type", "")
+        if not ctype.startswith(("image/", "application/octet-stream")):
+            raise requests.HTTPError(f"Unexpected content-type: {ctype}", response=r)
+        return r.content
+
+    return DOWNLOAD_POLICY.call(fetch, idempotent=True, deadline=deadline, what=f"Descarga {url}")
+
+
+
+def _read_storage_file(rel_path: str) -> Optional[bytes]:
+    rel_path = posixpath.normpath(rel_path.lstrip("/"))
+    if rel_path.startswith("..") or not default_storage.exists(rel_path):
+        return None
+    with default_storage.open(rel_path, "rb") as fh:
+        return fh.read()
+
+
+def _local_media_path(url: str) -> Optional[str]:
+    """
+    Si la URL apunta a NUESTRO /media/ (host en ALLOWED_HOSTS), devuelve la ruta
+    relativa en el storage; si no, None.
+    """
+    parts = urlsplit(url)
+    media_url = settings.MEDIA_URL or "/media/"
+    if parts.scheme not in ("http", "https") or not parts.path.startswith(media_url):
+        return None
+    host = (parts.hostname or "").lower()
+    if not validate_host(host, list(settings.ALLOWED_HOSTS) + ["localhost", "127.0.0.1"]):
+        return None
+    return unquote(parts.path[len(media_url):])
+
+
+def _resolve_image_bytes(image: Dict, deadline: Optional[Deadline] = None) -> Optional[bytes]:
+    """
+    Bytes de la imagen de entrada del job:
+    1) upload_id → uploads/<upload_id> directamente del storage (y sus metadatos
+       de ingest en image["meta"], si el job no los trae)
+    2) image_url de nuestro propio /media/ → storage (sin vuelta por HTTP)
+    3) image_url externa → descarga HTTP con reintentos
+    """
+    upload_id = image.get("upload_id")
+    if upload_id:
+        rel_path = upload_rel_path(upload_id)
+        if rel_path is None:
+            raise ValueError("upload_id no válido")
+        data = _read_storage_file(rel_path)
+        if data is None:
+            raise FileNotFoundError(f"No existe la subida {upload_id}")
+        if not image.get("meta"):
+            # Jobs de la API: solo traen upload_id; los metadatos de ingest están junto a la subida
+            meta = load_upload_meta(upload_id)
+            if meta:
+                image["meta"] = meta
+        return data
+
+    url = image.get("image_url")
+    if not url:
+        return None
+    rel = _local_media_path(url)
+    if rel:
+        data = _read_storage_file(rel)
+        if data is not None:
+            return data
+    return _download_image_bytes(url, deadline)
+
+
+# ---------- Errores del proveedor y control de ritmo (catalog.ratelimit) ----------
+
+class ProviderError(RuntimeError):
+    """Respuesta >= 400 del proveedor, con el código y el Retry-After si lo hay."""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.status_code == 429
+
+
+def _retry_after_seconds(r: requests.Response) -> Optional[float]:
+    value = r.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None  # formato fecha HTTP: el limitador aplica la pausa por defecto
+
+
+def _provider_error(kind: str, r: requests.Response) -> ProviderError:
+    return ProviderError(f"OpenAI {kind} error {r.status_code}: {r.text}",
+                         status_code=r.status_code, retry_after=_retry_after_seconds(r))
+
+
+def provider_limiter() -> ProviderLimiter:
+    return get_provider_limiter(MAX_CONCURRENCY)
+
+
+def _provider_post(kind: str, url: str, read_timeout: float, deadline: Optional[Deadline] = None,
+                   **kwargs) -> requests.Response:
+    """
+    POST al proveedor. Cada intento pasa por el limitador (pausa global,
+    concurrencia AIMD y token bucket); los reintentos los decide PROVIDER_POLICY.
+    Todos los intentos llevan la misma Idempotency-Key.
+    """
+    limiter = provider_limiter()
+    key = new_idempotency_key()
+    kwargs["headers"] = {**kwargs.get("headers", {}), "Idempotency-Key": key}
+
+    def attempt() -> requests.Response:
+        read = deadline.clamp(read_timeout) if deadline else read_timeout
+        with limiter.slot(deadline) as slot:
+            t0 = time.perf_counter()
+            try:
+                r = get_http_session().post(url, timeout=_timeout(read), **kwargs)
+            except Exception as e:
+                metrics.PROVIDER_REQUESTS.inc(kind=kind, status=classify(e))
+                raise
+            finally:
+                metrics.PROVIDER_DURATION.observe(time.perf_counter() - t0, kind=kind)
+            metrics.PROVIDER_REQUESTS.inc(kind=kind, status=r.status_code)
+            slot.observe(r.status_code, _retry_after_seconds(r))
+        if r.status_code >= 400:
+            raise _provider_error(kind, r)
+        return r
+
+    return PROVIDER_POLICY.call(attempt, idempotent=False, deadline=deadline,
+                                idempotency_key=key, what=f"OpenAI {kind}")
+
+
+def _openai_generate(prompt: str, size: str, deadline: Optional[Deadline] = None) -> str:
     """
     Llama a /v1/images/generations → devuelve b64_json
     """
@@ -50,18 +257,98 @@ def _openai_generate(prompt: str, size: str) -> str:
         "Authorization": f"Bearer {OPENAI_API_KEY}",
     }
     json_payload = {
-        "model": "gpt-image-1",
+        "model": IMAGE_MODEL,
         "prompt": prompt,
         "size": size,
     }
-    r = requests.post(url, headers=headers, json=json_payload, timeout=120)
-    if r.status_code >= 400:
-        raise RuntimeError(f"OpenAI generate error {r.status_code}: {r.text}")
+    r = _provider_post("generate", url, GENERATE_READ_TIMEOUT, deadline, headers=headers, json=json_payload)
     data = r.json()
     return data["data"][0]["b64_json"]
 
 
-def _openai_edit(image_bytes: bytes, prompt: str, size: str) -> str:
+# ---------- Preparación de la imagen de entrada para el modelo ----------
+
+INPUT_JPEG_QUALITY = 90
+PREPARED_CACHE_SIZE = 16
+_prepared: "OrderedDict[Tuple[str, int], Tuple[bytes, str, str]]" = OrderedDict()
+_prepared_lock = threading.Lock()
+
+# formato → (nombre de fichero, mime) para /images/edits
+_MIME = {fmt: (f"input{ext}", mime) for fmt, (ext, mime) in FORMATS.items()}
+_UNKNOWN_MIME = ("input.bin", "application/octet-stream")
+
+
+def _encode_model_input(in_bytes: bytes, max_side: int) -> Tuple[bytes, str, str]:
+    """
+    Endereza según EXIF, reduce a max_side (el modelo no usa más resolución) y
+    re-codifica: PNG si hay transparencia, JPEG si es opaca. Si la imagen ya
+    vale tal cual (orientación 1, tamaño dentro y formato aceptado), se envían
+    los bytes originales con su MIME real, sin pérdida por re-codificar.
+    """
+    img = Image.open(io.BytesIO(in_bytes))
+    fmt = img.format
+    orientation = img.getexif().get(0x0112, 1)
+    too_big = max(img.size) > max_side
+
+    if not too_big and orientation == 1 and fmt in _MIME:
+        name, mime = _MIME[fmt]
+        return in_bytes, name, mime
+
+    if too_big:
+        scale = max_side / max(img.size)
+        img.draft("RGB", (round(img.width * scale), round(img.height * scale)))  # JPEG: reduce en DCT
+    if orientation != 1:
+        img = ImageOps.exif_transpose(img)
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    buf = io.BytesIO()
+    if has_alpha:
+        img.convert("RGBA").save(buf, format="PNG")
+        name, mime = _MIME["PNG"]
+    else:
+        img.convert("RGB").save(buf, format="JPEG", quality=INPUT_JPEG_QUALITY, optimize=True)
+        name, mime = _MIME["JPEG"]
+
+    # Si por lo que sea la versión preparada pesa más (y no hacía falta rotar/reducir), nos quedamos con la original
+    if not too_big and orientation == 1 and buf.tell() >= len(in_bytes) and fmt in _MIME:
+        name, mime = _MIME[fmt]
+        return in_bytes, name, mime
+    return buf.getvalue(), name, mime
+
+
+def _prepare_model_input(in_bytes: bytes, target_size: str, digest: str) -> Tuple[bytes, str, str]:
+    """
+    (bytes, filename, mime) listos para /images/edits, cacheados por
+    (digest de la subida, lado máximo) para no repetir el trabajo en cada vista/job.
+    """
+    max_side = max(int(v) for v in target_size.split("x"))
+    key = (digest, max_side)
+    with _prepared_lock:
+        hit = _prepared.get(key)
+        if hit is not None:
+            _prepared.move_to_end(key)
+            return hit
+
+    try:
+        prepared = _encode_model_input(in_bytes, max_side)
+    except Exception as e:
+        # Imagen que Pillow no sabe abrir: se envía tal cual, con el tipo que digan sus
+        # "magic bytes", y que decida el proveedor
+        logger.warning("No se pudo preparar la imagen de entrada: %s", e)
+        prepared = (in_bytes, *_MIME.get(sniff_format(in_bytes[:16]), _UNKNOWN_MIME))
+
+    with _prepared_lock:
+        _prepared[key] = prepared
+        while len(_prepared) > PREPARED_CACHE_SIZE:
+            _prepared.popitem(last=False)
+    return prepared
+
+
+def _openai_edit(image_bytes: bytes, prompt: str, size: str,
+                 filename: str = "input.jpg", mime: str = "image/jpeg",
+                 deadline: Optional[Deadline] = None) -> str:
     """
     Llama a /v1/images/edits con multipart/form-data → devuelve b64_json
     """
@@ -71,23 +358,59 @@ def _openai_edit(image_bytes: bytes, prompt: str, size: str) -> str:
     }
     # files y data para multipart:
     files = {
-        "image": ("input.jpg", image_bytes, "image/jpeg"),
+        "image": (filename, image_bytes, mime),
     }
     data = {
-        "model": "gpt-image-1",
+        "model": IMAGE_MODEL,
         "prompt": prompt,
         "size": size,
     }
-    r = requests.post(url, headers=headers, files=files, data=data, timeout=180)
-    if r.status_code >= 400:
-        raise RuntimeError(f"OpenAI edit error {r.status_code}: {r.text}")
+    r = _provider_post("edit", url, EDIT_READ_TIMEOUT, deadline, headers=headers, files=files, data=data)
     j = r.json()
     return j["data"][0]["b64_json"]
 
 
-def generate_views_from_job(job: Dict) -> List[Dict]:
+def _cached_view(task: Dict, target_size: str, b64: str) -> Dict:
+    metrics.VIEWS.inc(outcome="cached")
+    return {"view_id": task["view_id"], "image_b64": b64, "model_size": target_size, "cached": True}
+
+
+def _generate_one_view(task: Dict, model_input, target_size: str, cache=None, key: Optional[str] = None,
+                       budget: float = JOB_DEADLINE, timings: Optional[Timings] = None) -> Dict:
+    """
+    Ejecuta una vista (la caché ya se miró antes de encolarla). Nunca lanza:
+    el error queda en el resultado de esa vista. Con caché y `key`, guarda el b64 generado.
+    El plazo (`budget` segundos) empieza aquí, no al encolar: el tiempo de espera
+    en el pool compartido no se come los reintentos de la vista.
+    """
+    deadline = Deadline(budget)
+    try:
+        with span(timings, "model_call", view_id=task["view_id"]):
+            if model_input:
+                data, filename, mime = model_input
+                b64 = _openai_edit(data, task["prompt"], target_size, filename=filename, mime=mime,
+                                   deadline=deadline)
+            else:
+                b64 = _openai_generate(task["prompt"], target_size, deadline=deadline)
+    except Exception as e:
+        logger.warning("Vista %s falló: %s", task["view_id"], e)
+        metrics.VIEWS.inc(outcome="error")
+        return {"view_id": task["view_id"], "image_b64": None, "model_size": target_size, "error": str(e)}
+
+    metrics.VIEWS.inc(outcome="generated")
+    if cache is not None and key is not None:
+        cache.set(key, b64)
+    return {"view_id": task["view_id"], "image_b64": b64, "model_size": target_size, "cached": False}
+
+
+def generate_views_from_job(job: Dict, timings: Optional[Timings] = None) -> List[Dict]:
     """
-    Devuelve: [{ view_id, image_b64, model_size }]
+    Devuelve: [{ view_id, image_b64, model_size, cached }] en el orden de build_prompts.
+    Las vistas se generan en paralelo (pool global de MAX_CONCURRENCY hilos).
+    Si una vista falla, su entrada lleva "error" e image_b64=None y las demás siguen;
+    si fallan todas, o ninguna vista pedida tiene prompt, se lanza RuntimeError.
+    client_options.cache=False salta la caché de resultados (p. ej. para pedir otra variante).
+    Con `timings` se mide cada etapa (ver catalog.timing).
     """
     if not OPENAI_API_KEY:
         raise RuntimeError("Falta OPENAI_API_KEY en variables de entorno")
@@ -96,25 +419,53 @@ def generate_views_from_job(job: Dict) -> List[Dict]:
     size = opts["size_px"]
     target_size = _closest_openai_size(size["width"], size["height"])
 
-    in_bytes = None
-    if job["image"].get("image_url"):
-        in_bytes = _download_image_bytes(job["image"]["image_url"])
-
-    from .prompt_builder import build_prompts
-    view_tasks = build_prompts(job)
-
-    results = []
-    for task in view_tasks:
-        prompt = task["prompt"]
-        if in_bytes:
-            b64 = _openai_edit(in_bytes, prompt, target_size)
-        else:
-            b64 = _openai_generate(prompt, target_size)
-
-        results.append({
-            "view_id": task["view_id"],
-            "image_b64": b64,
-            "model_size": target_size,
-        })
+    with span(timings, "prompt_build"):
+        view_tasks = build_prompts(job)
+    if not view_tasks:
+        ids = [v["id"] for v in job.get("views_requested", [])]
+        raise RuntimeError(f"Ninguna de las vistas pedidas tiene prompt: {ids}")
+
+    deadline = Deadline(JOB_DEADLINE)  # lo que quede tras la descarga es el plazo de cada vista
+    with span(timings, "download"):
+        in_bytes = _resolve_image_bytes(job["image"], deadline)
+
+    cache = get_result_cache() if opts.get("cache", True) is True else None
+    img_digest = None
+    if in_bytes:
+        meta = job["image"].get("meta") or {}
+        img_digest = meta.get("sha256") or image_digest(in_bytes)
+    elif cache is not None:
+        img_digest = image_digest(None)
+
+    # Caché antes de encolar: un acierto no espera turno detrás de las llamadas al proveedor
+    results: List[Optional[Dict]] = [None] * len(view_tasks)
+    keys: List[Optional[str]] = [None] * len(view_tasks)
+    if cache is not None:
+        for i, task in enumerate(view_tasks):
+            keys[i] = make_key(img_digest, task["prompt"], target_size, IMAGE_MODEL)
+            with span(timings, "cache_lookup", view_id=task["view_id"]):
+                b64 = cache.get(keys[i])
+            if b64 is not None:
+                results[i] = _cached_view(task, target_size, b64)
+    misses = [i for i, r in enumerate(results) if r is None]
+
+    model_input = None
+    if in_bytes and misses:
+        with span(timings, "input_prepare"):
+            model_input = _prepare_model_input(in_bytes, target_size, img_digest)
+
+    with span(timings, "views"):
+        budget = deadline.remaining()
+        futures = {
+            i: _view_executor.submit(_generate_one_view, view_tasks[i], model_input, target_size, cache,
+                                     keys[i], budget, timings)
+            for i in misses
+        }
+        for i, f in futures.items():
+            results[i] = f.result()
+
+    errors = [r for r in results if r.get("error")]
+    if results and len(errors) == len(results):
+        raise RuntimeError(errors[0]["error"])
 
     return results
@@ -0,0 +1,176 @@
+# catalog/ingest.py
+"""
+Entrada de imágenes subidas (multipart).
+
+- Formato real por "magic bytes" (no por extensión): JPEG, PNG o WebP.
+- Dimensiones y orientación EXIF leyendo SOLO la cabecera (Image.open es perezoso).
+- Se rechazan ficheros demasiado grandes o con demasiados píxeles; si solo se
+  pasan de lado máximo, se reducen (JPEG vía draft()) antes de guardarlos.
+- El fichero se vuelca al storage por trozos (File.chunks), sin cargarlo entero.
+
+Devuelve metadatos que el resto del job reutiliza en lugar de reabrir el fichero:
+  { upload_id, rel_path, format, mime, width, height, orientation, bytes, sha256, downscaled }
+y los guarda junto a la subida (uploads/<upload_id>.json) para los jobs que
+llegan después por la API con solo el upload_id (load_upload_meta).
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import posixpath
+import uuid
+from typing import Dict, Optional, Tuple
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(float(os.environ.get("PHOMAGIC_MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+MAX_PIXELS = int(float(os.environ.get("PHOMAGIC_MAX_UPLOAD_MPX", "60")) * 1_000_000)
+MAX_SIDE = int(os.environ.get("PHOMAGIC_MAX_UPLOAD_SIDE", "4096"))
+UPLOAD_DIR = "uploads"
+
+EXIF_ORIENTATION = 0x0112
+
+# formato → (extensión, mime)
+FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+}
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    if head[:3] == b"\xff\xd8\xff":
+        return "JPEG"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "PNG"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def upload_rel_path(upload_id) -> Optional[str]:
+    """uploads/<upload_id> si upload_id es un nombre de fichero simple; None si no lo es."""
+    if (not isinstance(upload_id, str) or upload_id in ("", ".", "..")
+            or "\\" in upload_id or posixpath.basename(upload_id) != upload_id):
+        return None
+    return f"{UPLOAD_DIR}/{upload_id}"
+
+
+def is_upload_path(rel_path) -> bool:
+    """True si rel_path es un fichero directamente dentro de uploads/ (lo único que se relee del cliente)."""
+    if not isinstance(rel_path, str):
+        return False
+    head, _, name = rel_path.partition("/")
+    return head == UPLOAD_DIR and upload_rel_path(name) == rel_path
+
+
+def _meta_path(rel_path: str) -> str:
+    return f"{rel_path}.json"
+
+
+def load_upload_meta(upload_id) -> Optional[Dict]:
+    """Metadatos guardados por ingest_upload para esa subida, o None."""
+    rel_path = upload_rel_path(upload_id)
+    if rel_path is None:
+        return None
+    try:
+        with default_storage.open(_meta_path(rel_path), "rb") as fh:
+            meta = json.loads(fh.read().decode("utf-8"))
+    except Exception:  # subida anterior a los metadatos, storage sin el fichero...
+        return None
+    return meta if isinstance(meta, dict) and meta.get("upload_id") == upload_id else None
+
+
+def _downscaled_copy(img: Image.Image, fmt: str) -> Tuple[bytes, Tuple[int, int]]:
+    """Reduce a lado MAX_SIDE con la orientación EXIF ya aplicada."""
+    w, h = img.size
+    scale = MAX_SIDE / max(w, h)
+    target = (max(1, round(w * scale)), max(1, round(h * scale)))
+    img.draft("RGB", target)  # JPEG: decodifica ya reducido (DCT)
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        img.convert("RGB").save(buf, format="JPEG", quality=92, optimize=True)
+    elif fmt == "WEBP":
+        img.save(buf, format="WEBP", quality=92)
+    else:
+        img.save(buf, format="PNG")
+    return buf.getvalue(), img.size
+
+
+def ingest_upload(f) -> Tuple[bool, Optional[str], Optional[Dict]]:
+    """
+    Valida y guarda un UploadedFile en uploads/. Devuelve (ok, error, meta).
+    """
+    if f.size and f.size > MAX_UPLOAD_BYTES:
+        return False, f"Archivo demasiado grande (máximo {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)", None
+
+    f.seek(0)
+    fmt = sniff_format(f.read(16))
+    f.seek(0)
+    if fmt is None:
+        return False, "Formato no soportado. Sube un JPG, PNG o WebP.", None
+
+    try:
+        img = Image.open(f)  # solo cabecera
+        w, h = img.size
+        orientation = int(img.getexif().get(EXIF_ORIENTATION, 1) or 1)
+    except Image.DecompressionBombError:
+        # Pillow se niega a abrirla (más del doble de Image.MAX_IMAGE_PIXELS)
+        return False, f"Imagen demasiado grande. Máximo {MAX_PIXELS // 1_000_000} MP.", None
+    except Exception:
+        return False, "No se pudo leer la imagen (archivo dañado).", None
+    if img.format != fmt:
+        return False, "El contenido de la imagen no coincide con su formato.", None
+    if w * h > MAX_PIXELS:
+        return False, f"Imagen demasiado grande ({w}×{h}px). Máximo {MAX_PIXELS // 1_000_000} MP.", None
+
+    ext, mime = FORMATS[fmt]
+    upload_id = f"{uuid.uuid4().hex}{ext}"
+    rel_path = f"{UPLOAD_DIR}/{upload_id}"
+    downscaled = max(w, h) > MAX_SIDE
+
+    if downscaled:
+        try:
+            data, (w, h) = _downscaled_copy(img, fmt)
+        except Exception:
+            return False, "No se pudo procesar la imagen.", None
+        orientation = 1
+        digest = hashlib.sha256(data).hexdigest()
+        size_bytes = len(data)
+        saved = default_storage.save(rel_path, ContentFile(data))
+    else:
+        f.seek(0)
+        sha = hashlib.sha256()
+        size_bytes = 0
+        for chunk in f.chunks():
+            sha.update(chunk)
+            size_bytes += len(chunk)
+        digest = sha.hexdigest()
+        f.seek(0)
+        saved = default_storage.save(rel_path, f)  # escritura por trozos
+
+    meta = {
+        "upload_id": os.path.basename(saved),
+        "rel_path": saved,
+        "format": fmt,
+        "mime": mime,
+        "width": w,
+        "height": h,
+        "orientation": orientation,
+        "bytes": size_bytes,
+        "sha256": digest,
+        "downscaled": downscaled,
+    }
+    try:
+        default_storage.save(_meta_path(saved), ContentFile(json.dumps(meta).encode("utf-8")))
+    except Exception as e:  # sin metadatos el job recalcula lo que necesite
+        logger.warning("No se pudieron guardar los metadatos de %s: %s", saved, e)
+    return True, None, meta
@@ -0,0 +1,211 @@
+# catalog/jobs.py
+"""
+Cola de jobs de generación sin broker externo.
+
+El job validado (_validate_and_build_job) se persiste en GenerationJob y la
+petición HTTP responde al momento con su id. Quién lo ejecuta depende de
+PHOMAGIC_JOB_RUNNER (settings o env):
+  "thread" (defecto) → pool de hilos en el propio proceso web
+  "db"               → solo se encola; lo procesa `manage.py run_generation_worker`
+En ambos casos el paso pending → running es un UPDATE condicional, así que
+un mismo job nunca lo ejecutan dos workers.
+
+En modo "thread" la cola del pool vive en memoria: al crear el pool se
+devuelven a "pending" los "running" de más de PHOMAGIC_JOB_STALE_MINUTES
+(30 por defecto; 0 = no) y se relanzan todos los pendientes. Después, cada
+dispatch (y el bucle de run_generation_worker) vuelve a buscar abandonados,
+como mucho una vez cada PHOMAGIC_JOB_RECOVER_INTERVAL s (60 por defecto):
+un worker que muere no deja sus jobs colgados hasta el siguiente reinicio.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GenerationBatch, GenerationJob
+from .timing import Timings
+
+logger = logging.getLogger(__name__)
+
+RUNNER_THREAD = "thread"
+RUNNER_DB = "db"
+
+JOB_WORKERS = max(1, int(os.environ.get("PHOMAGIC_JOB_WORKERS", "2")))
+STALE_MINUTES = int(os.environ.get("PHOMAGIC_JOB_STALE_MINUTES", "30"))
+RECOVER_INTERVAL = float(os.environ.get("PHOMAGIC_JOB_RECOVER_INTERVAL", "60"))
+
+_executor = None
+_executor_lock = threading.Lock()
+_last_recover = float("-inf")
+_recover_lock = threading.Lock()
+
+
+def job_runner() -> str:
+    return getattr(settings, "PHOMAGIC_JOB_RUNNER", None) or os.environ.get("PHOMAGIC_JOB_RUNNER", RUNNER_THREAD)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"[:100]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    created = False
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="phomagic-job")
+                created = True
+    if created:
+        _recover(_executor)
+    return _executor
+
+
+def _recover(executor: ThreadPoolExecutor):
+    """Pool recién creado: recupera lo que dejó a medias un proceso anterior (reinicio, caída)."""
+    try:
+        requeue_stale_due(force=True)
+        pending = list(GenerationJob.objects.filter(status=GenerationJob.STATUS_PENDING)
+                       .order_by("created_at", "seq").values_list("id", flat=True))
+    except Exception as e:  # BD sin migrar o caída: el pool funciona igual para los jobs nuevos
+        logger.warning("No se pudieron recuperar los jobs pendientes: %s", e)
+        return
+    for job_id in pending:
+        executor.submit(_run_in_thread, job_id)
+
+
+def dispatch(job_ids: Iterable[str]):
+    """En modo "thread" lanza los jobs (pending) en el pool; en modo "db" no hace nada."""
+    if job_runner() != RUNNER_THREAD:
+        return
+    executor = _get_executor()
+    for job_id in [*job_ids, *requeue_stale_due()]:
+        executor.submit(_run_in_thread, job_id)  # repetir un id es inocuo: _claim solo gana una vez
+
+
+def submit_job(job: Dict) -> GenerationJob:
+    """Persiste el job y, en modo "thread", lo lanza en segundo plano."""
+    row = GenerationJob.objects.create(job=job)
+    dispatch([row.id])
+    return row
+
+
+def _claim(job_id: str) -> bool:
+    n = GenerationJob.objects.filter(id=job_id, status=GenerationJob.STATUS_PENDING).update(
+        status=GenerationJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+        worker=worker_name(),
+    )
+    return n == 1
+
+
+def claim_next_job() -> Optional[str]:
+    """Reserva el job pendiente más antiguo. Devuelve su id o None si no hay."""
+    while True:
+        job_id = (GenerationJob.objects
+                  .filter(status=GenerationJob.STATUS_PENDING)
+                  .order_by("created_at", "seq")
+                  .values_list("id", flat=True)
+                  .first())
+        if job_id is None:
+            return None
+        if _claim(job_id):
+            return job_id
+        # Otro worker se lo llevó entre el SELECT y el UPDATE: probamos el siguiente
+
+
+def _requeue_stale(older_than: timedelta) -> List[str]:
+    limit = timezone.now() - older_than
+    stale = GenerationJob.objects.filter(status=GenerationJob.STATUS_RUNNING, started_at__lt=limit)
+    ids = list(stale.values_list("id", flat=True))
+    if ids:
+        stale.filter(id__in=ids).update(status=GenerationJob.STATUS_PENDING, worker="")
+    return ids
+
+
+def requeue_stale_jobs(older_than: timedelta) -> int:
+    """Devuelve a "pending" los jobs "running" abandonados (worker caído)."""
+    return len(_requeue_stale(older_than))
+
+
+def requeue_stale_due(older_than: Optional[timedelta] = None, force: bool = False) -> List[str]:
+    """
+    requeue_stale_jobs como mucho una vez cada RECOVER_INTERVAL s por proceso
+    (force=True no espera). Devuelve los ids re-encolados para relanzarlos.
+    """
+    global _last_recover
+    if older_than is None:
+        if STALE_MINUTES <= 0:
+            return []
+        older_than = timedelta(minutes=STALE_MINUTES)
+    now = time.monotonic()
+    with _recover_lock:
+        if not force and now - _last_recover < RECOVER_INTERVAL:
+            return []
+        _last_recover = now
+    try:
+        ids = _requeue_stale(older_than)
+    except Exception as e:  # BD caída: se vuelve a intentar en el siguiente intervalo
+        logger.warning("No se pudieron re-encolar los jobs abandonados: %s", e)
+        return []
+    if ids:
+        logger.warning("%d job(s) abandonados vuelven a la cola", len(ids))
+    return ids
+
+
+def run_claimed_job(job_id: str) -> str:
+    """Ejecuta un job ya reservado (status=running), guarda resultado o error y devuelve el estado final."""
+    from .views import _run_generation  # import tardío: views importa este módulo
+
+    row = GenerationJob.objects.get(id=job_id)
+    timings = Timings("job")
+    try:
+        results = _run_generation(row.job, timings)
+    except Exception as e:
+        logger.exception("Job %s falló", job_id)
+        row.status = GenerationJob.STATUS_FAILED
+        row.error = str(e)
+    else:
+        row.status = GenerationJob.STATUS_DONE
+        row.results = results
+    row.finished_at = timezone.now()
+    _save_finished(row)
+    timings.finish(row.status, job_id=job_id)
+    return row.status
+
+
+def _save_finished(row: GenerationJob):
+    """
+    Guarda el resultado. Si el job es de un lote, en la misma transacción le da
+    el siguiente finish_seq del lote: el UPDATE del contador bloquea la fila del
+    lote hasta el commit, así que el orden de finish_seq es el de los commits
+    (finished_at se toma antes y dos workers pueden confirmar en otro orden).
+    """
+    fields = ["status", "results", "error", "finished_at"]
+    with transaction.atomic():
+        if row.batch_id:
+            batches = GenerationBatch.objects.filter(id=row.batch_id)
+            batches.update(completed=F("completed") + 1)
+            row.finish_seq = batches.values_list("completed", flat=True).get()
+            fields.append("finish_seq")
+        row.save(update_fields=fields)
+
+
+def _run_in_thread(job_id: str):
+    close_old_connections()
+    try:
+        if _claim(job_id):
+            run_claimed_job(job_id)
+    except Exception:
+        logger.exception("Error en el worker de jobs (%s)", job_id)
+    finally:
+        close_old_connections()
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from catalog import jobs
+
+
+class Command(BaseCommand):
+    help = "Procesa los jobs de generación encolados en la base de datos (PHOMAGIC_JOB_RUNNER=db)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Procesa los jobs pendientes y termina")
+        parser.add_argument("--poll-interval", type=float, default=2.0,
+                            help="Segundos de espera cuando la cola está vacía")
+        parser.add_argument("--stale-minutes", type=int, default=30,
+                            help="Re-encola jobs 'running' más antiguos que esto (worker caído). 0 = no")
+
+    def handle(self, *args, **options):
+        once = options["once"]
+        poll = options["poll_interval"]
+        stale = options["stale_minutes"]
+
+        self.stdout.write(self.style.NOTICE(f"Worker {jobs.worker_name()} escuchando la cola..."))
+
+        while True:
+            close_old_connections()
+            if stale:
+                # Al arrancar y luego cada PHOMAGIC_JOB_RECOVER_INTERVAL s (workers caídos mientras tanto)
+                n = len(jobs.requeue_stale_due(timedelta(minutes=stale)))
+                if n:
+                    self.stdout.write(self.style.WARNING(f"↩️  {n} job(s) abandonados vuelven a la cola"))
+            job_id = jobs.claim_next_job()
+            if job_id is None:
+                if once:
+                    break
+                time.sleep(poll)
+                continue
+
+            self.stdout.write(f"▶️  Job {job_id}")
+            status = jobs.run_claimed_job(job_id)
+            if status == "done":
+                self.stdout.write(self.style.SUCCESS(f"✅ Job {job_id} terminado"))
+            else:
+                self.stdout.write(self.style.ERROR(f"❌ Job {job_id} fallido"))
+
+        self.stdout.write(self.style.SUCCESS("Cola vacía."))
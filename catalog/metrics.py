@@ -0,0 +1,411 @@
+# catalog/metrics.py
+"""
+Métricas estilo Prometheus sin dependencias: contadores, gauges e histogramas
+en memoria y una vista que los sirve en formato de texto (exposition 0.0.4).
+
+Multiproceso (gunicorn con varios workers): si existe PHOMAGIC_METRICS_DIR
+(o PROMETHEUS_MULTIPROC_DIR), cada proceso vuelca su estado a
+<dir>/metrics_<pid>.json (escritura atómica, como mucho cada FLUSH_INTERVAL s)
+y quien atiende /metrics suma los ficheros de todos:
+  counter / histogram → suma (también de procesos ya muertos: no retroceden)
+  gauge "livesum"     → suma de los procesos vivos
+  gauge "liveall"     → una serie por proceso vivo (etiqueta pid)
+  gauge "max"         → máximo
+El directorio debe vaciarse al arrancar el servicio (como con prometheus_client).
+
+Además hay "collectors": funciones que se evalúan en cada scrape en el proceso
+que responde (p. ej. jobs por estado, que salen de la BD y no se suman).
+"""
+import atexit
+import hmac
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.http import HttpResponse
+
+FLUSH_INTERVAL = 1.0
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+GAUGE_LIVESUM = "livesum"
+GAUGE_LIVEALL = "liveall"
+GAUGE_MAX = "max"
+
+
+def multiprocess_dir() -> Optional[str]:
+    return os.environ.get("PHOMAGIC_METRICS_DIR") or os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+# ---------- Métricas ----------
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._registry = registry or REGISTRY
+        self._lock = self._registry.lock
+        self._registry.register(self)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: etiquetas {sorted(labels)} != {sorted(self.labelnames)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _reset(self):
+        self._values = {}
+
+    def meta(self) -> Dict:
+        return {"type": self.type, "help": self.documentation, "labelnames": list(self.labelnames)}
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        self._registry.touch()
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), mode: str = GAUGE_LIVESUM, registry=None):
+        self.mode = mode
+        super().__init__(name, documentation, labelnames, registry)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+        self._registry.touch()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        self._registry.touch()
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def meta(self) -> Dict:
+        return {**super().meta(), "mode": self.mode}
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = len(self.buckets)
+        for j, upper in enumerate(self.buckets):
+            if value <= upper:
+                i = j
+                break
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+        self._registry.touch()
+
+    def meta(self) -> Dict:
+        return {**super().meta(), "buckets": list(self.buckets)}
+
+
+# ---------- Registro ----------
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, Dict, Dict]]]] = []
+        self._dirty = False
+        self._flusher = None
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def add_collector(self, fn: Callable[[], Iterable[Tuple[str, Dict, Dict]]]):
+        """fn() → [(nombre, meta, {clave_etiquetas: valor})], evaluado en cada scrape."""
+        self._collectors.append(fn)
+
+    def _reset(self):
+        # Tras un fork: el hijo tiene un solo hilo y el lock pudo quedar cogido en el padre
+        self.lock = threading.Lock()
+        for m in self._metrics.values():
+            m._lock = self.lock
+            m._reset()
+        self._dirty = False
+        self._flusher = None
+
+    # --- multiproceso ---
+
+    def touch(self):
+        self._dirty = True
+        if self._flusher is None and multiprocess_dir():
+            with self.lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="phomagic-metrics",
+                                                     daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            self._dirty = False
+            return {
+                name: {**m.meta(), "values": [[list(k), _copy(v)] for k, v in m._values.items()]}
+                for name, m in self._metrics.items()
+            }
+
+    def flush(self):
+        d = multiprocess_dir()
+        if not d:
+            return
+        try:
+            os.makedirs(d, exist_ok=True)
+            path = os.path.join(d, f"metrics_{os.getpid()}.json")
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, fh)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # las métricas nunca rompen una petición
+
+    # --- lectura ---
+
+    def _gather(self) -> Dict[str, Dict]:
+        """{nombre: meta + {"values": {clave: valor}}} ya agregado."""
+        d = multiprocess_dir()
+        if not d:
+            return {name: {**meta, "values": {tuple(k): v for k, v in meta["values"]}}
+                    for name, meta in self.snapshot().items()}
+
+        self.flush()
+        merged: Dict[str, Dict] = {}
+        for fname in sorted(os.listdir(d)):
+            if not (fname.startswith("metrics_") and fname.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(d, fname), encoding="utf-8") as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            pid = data.get("pid")
+            alive = _pid_alive(pid)
+            for name, meta in data.get("metrics", {}).items():
+                out = merged.setdefault(name, {**{k: v for k, v in meta.items() if k != "values"}, "values": {}})
+                if out["type"] == "gauge" and out.get("mode") == GAUGE_LIVEALL and "pid" not in out["labelnames"]:
+                    out["labelnames"] = out["labelnames"] + ["pid"]
+                for key, value in meta["values"]:
+                    _merge(out, tuple(key), value, pid, alive)
+        return merged
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, m in sorted(self._gather().items()):
+            _render_metric(lines, name, m)
+        for fn in self._collectors:
+            try:
+                for name, meta, values in fn():
+                    _render_metric(lines, name, {**meta, "values": values})
+            except Exception as e:
+                lines.append(f"# collector {getattr(fn, '__name__', fn)} falló: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def _copy(value):
+    if isinstance(value, list):  # histograma: [cuentas, suma, n]
+        return [list(value[0]), value[1], value[2]]
+    return value
+
+
+def _pid_alive(pid) -> bool:
+    if not isinstance(pid, int):
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(out: Dict, key: Tuple[str, ...], value, pid, alive: bool):
+    values = out["values"]
+    kind = out["type"]
+    if kind == "counter":
+        values[key] = values.get(key, 0.0) + value
+    elif kind == "histogram":
+        cur = values.get(key)
+        if cur is None:
+            values[key] = [list(value[0]), value[1], value[2]]
+        else:
+            cur[0] = [a + b for a, b in zip(cur[0], value[0])]
+            cur[1] += value[1]
+            cur[2] += value[2]
+    else:
+        mode = out.get("mode", GAUGE_LIVESUM)
+        if mode == GAUGE_MAX:
+            values[key] = max(values.get(key, -math.inf), value)
+        elif not alive:
+            return
+        elif mode == GAUGE_LIVEALL:
+            values[key + (str(pid),)] = value
+        else:
+            values[key] = values.get(key, 0.0) + value
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], key: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return f"{v:.1f}"
+    return repr(float(v))
+
+
+def _render_metric(lines: List[str], name: str, m: Dict):
+    lines.append(f"# HELP {name} {m['help']}")
+    lines.append(f"# TYPE {name} {m['type']}")
+    names = m["labelnames"]
+    for key, value in sorted(m["values"].items()):
+        if m["type"] == "histogram":
+            counts, total, count = value
+            acc = 0
+            for upper, c in zip(list(m["buckets"]) + [math.inf], counts):
+                acc += c
+                le = 'le="%s"' % _fmt(upper)
+                lines.append(f"{name}_bucket{_labels(names, key, le)} {_fmt(acc)}")
+            lines.append(f"{name}_sum{_labels(names, key)} {_fmt(total)}")
+            lines.append(f"{name}_count{_labels(names, key)} {_fmt(count)}")
+        else:
+            lines.append(f"{name}{_labels(names, key)} {_fmt(value)}")
+
+
+REGISTRY = Registry()
+
+if hasattr(os, "register_at_fork"):
+    # gunicorn --preload: cada worker empieza de cero y escribe su propio fichero
+    os.register_at_fork(after_in_child=REGISTRY._reset)
+atexit.register(REGISTRY.flush)
+
+
+# ---------- Métricas de Phomagic ----------
+
+HTTP_REQUESTS = Counter("phomagic_http_requests_total", "Peticiones HTTP atendidas",
+                        ["view", "method", "status"])
+HTTP_DURATION = Histogram("phomagic_http_request_duration_seconds", "Duración de las peticiones HTTP", ["view"])
+
+JOB_DURATION = Histogram("phomagic_job_duration_seconds", "Duración total de un job de generación",
+                         ["source", "outcome"])
+STAGE_DURATION = Histogram("phomagic_stage_duration_seconds", "Duración por etapa del pipeline (catalog.timing)",
+                           ["stage"])
+VIEWS = Counter("phomagic_views_total", "Vistas procesadas por resultado", ["outcome"])
+
+PROVIDER_REQUESTS = Counter("phomagic_provider_requests_total", "Llamadas al proveedor por tipo y código",
+                            ["kind", "status"])
+PROVIDER_DURATION = Histogram("phomagic_provider_request_duration_seconds", "Duración de cada llamada al proveedor",
+                              ["kind"])
+PROVIDER_QUEUE_DELAY = Histogram("phomagic_provider_queue_delay_seconds",
+                                 "Espera en el limitador antes de llamar al proveedor", [])
+PROVIDER_CONCURRENCY = Gauge("phomagic_provider_concurrency_limit", "Límite AIMD de llamadas en vuelo",
+                             [], mode=GAUGE_LIVEALL)
+PROVIDER_INFLIGHT = Gauge("phomagic_provider_inflight", "Llamadas al proveedor en vuelo", [])
+RETRIES = Counter("phomagic_retries_total", "Reintentos por política y clase de error", ["policy", "error_class"])
+RETRY_GIVEUPS = Counter("phomagic_retry_giveups_total", "Llamadas que agotaron intentos o plazo",
+                        ["policy", "error_class"])
+
+CACHE_REQUESTS = Counter("phomagic_result_cache_requests_total", "Consultas a la caché de vistas", ["result"])
+CACHE_EVICTIONS = Counter("phomagic_result_cache_evictions_total", "Entradas expulsadas de la caché de disco", [])
+
+
+def _jobs_collector():
+    from django.db.models import Count
+    from .models import GenerationJob
+
+    rows = GenerationJob.objects.values_list("status").annotate(n=Count("id")).order_by()
+    values = {(s,): 0.0 for s, _ in GenerationJob.STATUS_CHOICES}
+    for status, n in rows:
+        values[(status,)] = float(n)
+    yield ("phomagic_jobs", {"type": "gauge", "help": "Jobs de generación por estado (BD)",
+                             "labelnames": ["status"]}, values)
+
+
+REGISTRY.add_collector(_jobs_collector)
+
+
+# ---------- HTTP ----------
+
+class MetricsMiddleware:
+    """Cuenta y cronometra cada petición, etiquetada por el nombre de la URL."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        t0 = time.perf_counter()
+        # Django ya convierte las excepciones de la vista en respuestas (500 incluido)
+        # antes de llegar aquí (convert_exception_to_response): basta con status_code
+        response = self.get_response(request)
+        self._record(request, response.status_code, t0)
+        return response
+
+    @staticmethod
+    def _record(request, status: int, t0: float):
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=status)
+        HTTP_DURATION.observe(time.perf_counter() - t0, view=view)
+
+
+def metrics_view(request):
+    """
+    Texto para Prometheus, con "Authorization: Bearer <PHOMAGIC_METRICS_TOKEN>".
+    Sin PHOMAGIC_METRICS_TOKEN definido la ruta no existe (404).
+    """
+    token = os.environ.get("PHOMAGIC_METRICS_TOKEN")
+    if not token:
+        return HttpResponse("Not Found", status=404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse("Unauthorized", status=401)
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,26 @@
+# Generated by Django 5.0 on 2026-10-18 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_generationbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderRateLimit',
+            fields=[
+                ('key', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField(default=0.0)),
+                ('updated_at', models.FloatField(default=0.0)),
+                ('pause_until', models.FloatField(default=0.0)),
+            ],
+            options={
+                'verbose_name': 'Cupo del proveedor',
+                'verbose_name_plural': 'Cupos del proveedor',
+            },
+        ),
+    ]
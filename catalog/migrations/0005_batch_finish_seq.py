@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+def number_finished_items(apps, schema_editor):
+    """Lotes existentes: numera los items ya terminados en su orden (finished_at, seq)."""
+    GenerationBatch = apps.get_model("catalog", "GenerationBatch")
+    GenerationJob = apps.get_model("catalog", "GenerationJob")
+    for batch in GenerationBatch.objects.all():
+        finished = (GenerationJob.objects.filter(batch=batch, status__in=("done", "failed"))
+                    .order_by("finished_at", "seq"))
+        n = 0
+        for row in finished:
+            n += 1
+            row.finish_seq = n
+            row.save(update_fields=["finish_seq"])
+        batch.completed = n
+        batch.save(update_fields=["completed"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationbatch',
+            name='completed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='finish_seq',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(number_finished_items, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,91 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+def _new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+# Lote de generación (manifiesto de imágenes con opciones comunes)
+class GenerationBatch(models.Model):
+    id = models.CharField(primary_key=True, max_length=32, default=_new_job_id, editable=False)
+    manifest = models.JSONField()                     # payload original (sin la lista de items)
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)  # items terminados hasta ahora (da GenerationJob.finish_seq)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Lote de generación"
+        verbose_name_plural = "Lotes de generación"
+
+    def __str__(self):
+        return f"{self.id} ({self.total} items)"
+
+
+# Job de generación en segundo plano (cola en BD, sin broker externo)
+class GenerationJob(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pendiente"),
+        (STATUS_RUNNING, "En curso"),
+        (STATUS_DONE, "Terminado"),
+        (STATUS_FAILED, "Fallido"),
+    ]
+
+    id = models.CharField(primary_key=True, max_length=32, default=_new_job_id, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    job = models.JSONField()                          # dict de _validate_and_build_job
+    results = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default="")
+    worker = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    # Solo para jobs que forman parte de un lote
+    batch = models.ForeignKey(GenerationBatch, on_delete=models.CASCADE, related_name="items",
+                              blank=True, null=True)
+    seq = models.PositiveIntegerField(default=0)      # posición en el manifiesto
+    finish_seq = models.PositiveIntegerField(blank=True, null=True)  # orden de finalización en el lote (cursor)
+    item_id = models.CharField(max_length=200, blank=True, default="")
+
+    class Meta:
+        ordering = ["created_at"]
+        verbose_name = "Job de generación"
+        verbose_name_plural = "Jobs de generación"
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+
+# Cupo compartido de llamadas al proveedor (PHOMAGIC_PROVIDER_LIMITER=db)
+class ProviderRateLimit(models.Model):
+    key = models.CharField(primary_key=True, max_length=50)
+    tokens = models.FloatField(default=0.0)
+    updated_at = models.FloatField(default=0.0)   # epoch (time.time())
+    pause_until = models.FloatField(default=0.0)  # epoch; 429 con Retry-After
+
+    class Meta:
+        verbose_name = "Cupo del proveedor"
+        verbose_name_plural = "Cupos del proveedor"
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.2f} tokens"
+
+
+class CatalogVersion(models.Model):
+    """Contador compartido entre procesos: sube al guardar/borrar Category, SubCategory o ViewOption."""
+    key = models.CharField(primary_key=True, max_length=50)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Versión del catálogo"
+        verbose_name_plural = "Versiones del catálogo"
+
+    def __str__(self):
+        return f"{self.key}: v{self.version}"
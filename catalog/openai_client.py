@@ -1,11 +1,40 @@
 # catalog/openai_client.py
 import os
+import threading
+
+import httpx
 from openai import OpenAI
 
-def get_client() -> OpenAI:
+from .generate_service import HTTP_CONNECT_TIMEOUT, EDIT_READ_TIMEOUT, PROVIDER_POOL_MAXSIZE
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str = None) -> OpenAI:
     """
     Crea el cliente usando la variable de entorno OPENAI_API_KEY.
     En Render: Config Vars → OPENAI_API_KEY=tu_clave
+
+    El cliente se reutiliza (uno por API key y proceso) para mantener vivo su
+    pool de conexiones httpx en lugar de repetir TCP+TLS en cada subida.
+    Mismos timeouts y tamaño de pool que la sesión de generate_service.
+    Los reintentos del SDK van desactivados: los hace catalog.retry (PROVIDER_POLICY).
     """
     # La lib usa por defecto OPENAI_API_KEY del entorno.
-    return OpenAI()
+    key = api_key or os.environ.get("OPENAI_API_KEY", "")
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                http_client = httpx.Client(
+                    timeout=httpx.Timeout(EDIT_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                    limits=httpx.Limits(
+                        max_connections=PROVIDER_POOL_MAXSIZE,
+                        max_keepalive_connections=PROVIDER_POOL_MAXSIZE,
+                    ),
+                )
+                client = OpenAI(api_key=key or None, http_client=http_client, max_retries=0)
+                _clients[key] = client
+    return client
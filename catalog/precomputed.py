@@ -0,0 +1,98 @@
+# catalog/precomputed.py
+"""
+Respuestas GET precalculadas (p. ej. /api/catalog/, una por versión del catálogo).
+
+PrecomputedResponse guarda el cuerpo ya serializado y sus variantes
+comprimidas (gzip siempre; brotli si el paquete "brotli" está instalado), y
+responde sin serializar ni comprimir nada por petición:
+
+- ETag fuerte = sha256 del cuerpo; cada codificación lleva el suyo
+  ("<hash>", "<hash>-gzip", "<hash>-br"), igual en todos los procesos.
+- If-None-Match con cualquiera de ellos (o "*") → 304 sin cuerpo.
+- Accept-Encoding elige br > gzip > identidad (respetando q=0); Vary: Accept-Encoding.
+- Cache-Control: public, max-age=<max_age>, must-revalidate.
+"""
+import gzip
+import hashlib
+from typing import Dict, Optional, Tuple
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+# Por debajo de esto comprimir no compensa (cabeceras incluidas)
+MIN_COMPRESS_BYTES = 512
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    out = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.strip() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        out[token] = q
+    return out
+
+
+def _etags(header: str):
+    return {t.strip().removeprefix("W/") for t in header.split(",") if t.strip()}
+
+
+class PrecomputedResponse:
+    def __init__(self, body: bytes, content_type: str, max_age: int = 0):
+        self.content_type = content_type
+        self.cache_control = f"public, max-age={max_age}, must-revalidate"
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        # codificación → (cuerpo, etag)
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (body, f'"{digest}"')}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.etag = self.variants["identity"][1]
+        self._all_etags = {etag for _, etag in self.variants.values()}
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        accepted = _accepted_encodings(accept_encoding or "")
+        wildcard = accepted.get("*")
+        for enc in ("br", "gzip"):
+            q = accepted.get(enc, wildcard)
+            if enc in self.variants and q is not None and q > 0:
+                return enc
+        return "identity"
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = _etags(if_none_match)
+        return "*" in tags or bool(tags & self._all_etags)
+
+    def respond(self, request) -> HttpResponse:
+        encoding = self.choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        body, etag = self.variants[encoding]
+
+        if self.not_modified(request.META.get("HTTP_IF_NONE_MATCH")):
+            resp = HttpResponse(status=304)
+        else:
+            resp = HttpResponse(body if request.method != "HEAD" else b"", content_type=self.content_type)
+            if encoding != "identity":
+                resp["Content-Encoding"] = encoding
+            resp["Content-Length"] = str(len(body))
+        resp["ETag"] = etag
+        resp["Cache-Control"] = self.cache_control
+        if len(self.variants) > 1:
+            patch_vary_headers(resp, ("Accept-Encoding",))
+        return resp
@@ -59,10 +59,15 @@ VIEW_PROMPTS = {
     "maniqui_invisible": _view_maniqui_invisible,
 }
 
+def _catalog_view(size, bg_hex, shadow, text):
+    return _common_header(size, bg_hex, shadow) + "\n\n" + text.strip()
+
 def build_prompts(job: dict):
     """
     Devuelve una lista de tareas por vista con el prompt generado.
     Estructura: [{ "view_id": ..., "prompt": ... }, ...]
+    Vistas fuera de VIEW_PROMPTS: texto de ViewOption.prompt o del .docx
+    (catalog_service.view_prompt); sin ninguno, la vista se omite.
     """
     opts = job["client_options"]
     size = opts["size_px"]
@@ -72,7 +77,11 @@ def build_prompts(job: dict):
     for v in job["views_requested"]:
         vid = v["id"]
         fn = VIEW_PROMPTS.get(vid)
-        if not fn:
+        if fn:
+            tasks.append({"view_id": vid, "prompt": fn(size, bg_hex, shadow)})
             continue
-        tasks.append({"view_id": vid, "prompt": fn(size, bg_hex, shadow)})
+        from .catalog_service import view_prompt  # import tardío: catalog_service importa este módulo
+        text = view_prompt(job.get("category"), job.get("subcategory"), vid)
+        if text:
+            tasks.append({"view_id": vid, "prompt": _catalog_view(size, bg_hex, shadow, text)})
     return tasks
@@ -0,0 +1,351 @@
+# catalog/ratelimit.py
+"""
+Control de ritmo de las llamadas al proveedor de imágenes.
+
+Tres piezas, en este orden, alrededor de cada llamada (ProviderLimiter.slot):
+  1. Pausa global: tras un 429 nadie llama hasta que pasa el Retry-After.
+  2. Concurrencia adaptativa (AIMD): el límite de llamadas en vuelo sube +1
+     por "ventana" de éxitos y se multiplica por BETA ante 429/5xx/timeouts
+     (como mucho una bajada por ventana, para que una ráfaga de 429 no lo hunda).
+  3. Token bucket (peticiones/minuto con ráfaga), del proceso o compartido
+     entre workers a través de la BD (tabla ProviderRateLimit).
+
+Todas las esperas respetan el Deadline de la llamada: si no queda plazo se
+lanza DeadlineExceeded en vez de seguir esperando turno.
+
+Configuración (env):
+  PHOMAGIC_PROVIDER_RPM        peticiones/minuto (0 = sin bucket; defecto 60)
+  PHOMAGIC_PROVIDER_BURST      ráfaga máxima del bucket (defecto MAX_CONCURRENCY)
+  PHOMAGIC_PROVIDER_LIMITER    "process" (defecto) | "db" (bucket y pausa compartidos)
+  PHOMAGIC_PROVIDER_MIN_CONCURRENCY  suelo del AIMD (defecto 1)
+  PHOMAGIC_PROVIDER_PAUSE_TTL  modo "db": segundos que se reutiliza la pausa leída de BD (defecto 1)
+
+El modo "db" necesita una BD con SELECT ... FOR UPDATE (PostgreSQL, MySQL).
+En SQLite select_for_update() no bloquea nada y dos workers gastarían el mismo
+token: get_provider_limiter avisa y usa el modo "process".
+
+stats() da los contadores y el retraso de cola (tiempo que una llamada espera
+un hueco antes de salir), que es lo que hay que mirar para dimensionar.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from . import metrics
+from .retry import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+LIMITER_PROCESS = "process"
+LIMITER_DB = "db"
+
+DEFAULT_RPM = float(os.environ.get("PHOMAGIC_PROVIDER_RPM", "60"))
+DEFAULT_BURST = os.environ.get("PHOMAGIC_PROVIDER_BURST", "")
+MIN_CONCURRENCY = max(1, int(os.environ.get("PHOMAGIC_PROVIDER_MIN_CONCURRENCY", "1")))
+DEFAULT_PAUSE = float(os.environ.get("PHOMAGIC_RATE_LIMIT_PAUSE", "10"))
+PAUSE_TTL = float(os.environ.get("PHOMAGIC_PROVIDER_PAUSE_TTL", "1"))
+MAX_PAUSE = 120.0
+BETA = 0.5  # factor de bajada multiplicativa
+
+
+def _sleep_within(wait: float, deadline: Optional[Deadline], what: str):
+    """Duerme `wait` segundos, o lanza DeadlineExceeded si no caben en el plazo."""
+    if deadline is not None and wait >= deadline.remaining():
+        raise DeadlineExceeded(f"Proveedor: sin plazo para esperar {what}")
+    time.sleep(wait)
+
+
+def is_overload(status_code: Optional[int]) -> bool:
+    """429 y 5xx cuentan como "el proveedor va cargado"; el resto de 4xx son errores nuestros."""
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+# ---------- Token bucket ----------
+
+class TokenBucket:
+    """Bucket en memoria: `rate` tokens/s, hasta `burst` acumulados."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Intenta coger un token. Devuelve 0 si lo consigue o los segundos a esperar."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self, deadline: Optional[Deadline] = None):
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            _sleep_within(wait, deadline, "token")
+
+
+class DBTokenBucket:
+    """
+    El mismo bucket guardado en una fila de ProviderRateLimit, actualizada con
+    SELECT ... FOR UPDATE: todos los workers (procesos o máquinas) que comparten
+    BD reparten el mismo cupo. La espera se hace fuera de la transacción.
+    La pausa compartida (pause_until) se relee como mucho cada `pause_ttl` segundos.
+    """
+
+    def __init__(self, rate: float, burst: float, key: str = "provider", pause_ttl: float = PAUSE_TTL):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.key = key
+        self.pause_ttl = pause_ttl
+        self._pause_lock = threading.Lock()
+        self._pause_until = 0.0   # epoch, última lectura
+        self._pause_read = None   # time.monotonic() de esa lectura
+
+    def _row(self):
+        from .models import ProviderRateLimit
+        row, _ = (ProviderRateLimit.objects.select_for_update()
+                  .get_or_create(key=self.key, defaults={"tokens": self.burst, "updated_at": time.time()}))
+        return row
+
+    def _take(self) -> float:
+        from django.db import transaction
+        with transaction.atomic():
+            row = self._row()
+            now = time.time()
+            tokens = min(self.burst, row.tokens + max(0.0, now - row.updated_at) * self.rate)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / self.rate
+            row.tokens, row.updated_at = tokens, now
+            row.save(update_fields=["tokens", "updated_at"])
+            return wait
+
+    def acquire(self, deadline: Optional[Deadline] = None):
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            _sleep_within(wait, deadline, "token")
+
+    def pause(self, seconds: float):
+        """Comparte la pausa de un 429 con el resto de workers."""
+        from django.db import transaction
+        with transaction.atomic():
+            row = self._row()
+            row.pause_until = max(row.pause_until, time.time() + seconds)
+            row.save(update_fields=["pause_until"])
+        with self._pause_lock:
+            self._pause_until = max(self._pause_until, row.pause_until)
+
+    def paused_for(self) -> float:
+        now = time.monotonic()
+        with self._pause_lock:
+            if self._pause_read is not None and now - self._pause_read < self.pause_ttl:
+                return self._pause_until - time.time()
+        from .models import ProviderRateLimit
+        until = (ProviderRateLimit.objects.filter(key=self.key)
+                 .values_list("pause_until", flat=True).first()) or 0.0
+        with self._pause_lock:
+            self._pause_until, self._pause_read = until, now
+        return until - time.time()
+
+
+# ---------- Concurrencia adaptativa (AIMD) ----------
+
+class AdaptiveConcurrency:
+    """
+    Semáforo con límite variable entre `minimum` y `maximum`.
+    Éxito → +1/limit (≈ +1 por ventana completa); sobrecarga → ×BETA,
+    como mucho una vez por ventana (las llamadas que ya estaban en vuelo
+    cuando se bajó no vuelven a bajar).
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(self.maximum)
+        self.inflight = 0
+        self._epoch = 0  # sube en cada bajada
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: Optional[Deadline] = None) -> int:
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded("Proveedor: sin plazo para esperar hueco de concurrencia")
+                self._cond.wait(deadline.remaining() if deadline is not None else None)
+            self.inflight += 1
+            metrics.PROVIDER_INFLIGHT.set(self.inflight)
+            return self._epoch
+
+    def release(self, epoch: int, overloaded: bool):
+        with self._cond:
+            self.inflight -= 1
+            metrics.PROVIDER_INFLIGHT.set(self.inflight)
+            if overloaded:
+                if epoch == self._epoch:
+                    self.limit = max(float(self.minimum), self.limit * BETA)
+                    self._epoch += 1
+                    logger.info("Proveedor saturado: concurrencia → %d", int(self.limit))
+            elif self.limit < self.maximum:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            metrics.PROVIDER_CONCURRENCY.set(int(self.limit))
+            self._cond.notify_all()
+
+
+# ---------- Limitador del proveedor ----------
+
+class _Slot:
+    def __init__(self):
+        self.status_code = None
+        self.retry_after = None
+
+    def observe(self, status_code: int, retry_after: Optional[float] = None):
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ProviderLimiter:
+    def __init__(self, max_concurrency: int, rpm: float = DEFAULT_RPM, burst: Optional[float] = None,
+                 mode: str = LIMITER_PROCESS, min_concurrency: int = MIN_CONCURRENCY):
+        burst = burst if burst is not None else max_concurrency
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency)
+        self.bucket = None
+        if rpm and rpm > 0:
+            cls = DBTokenBucket if mode == LIMITER_DB else TokenBucket
+            self.bucket = cls(rpm / 60.0, burst)
+        self.mode = mode
+
+        self._lock = threading.Lock()
+        self._pause_until = 0.0  # time.monotonic()
+        self.calls = 0
+        self.throttled = 0        # respuestas 429
+        self.server_errors = 0    # 5xx y fallos de red/timeout
+        self.pauses = 0
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+
+    # --- pausa global por Retry-After ---
+
+    def pause(self, seconds: float):
+        seconds = min(max(0.0, seconds), MAX_PAUSE)
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+            self.pauses += 1
+        if isinstance(self.bucket, DBTokenBucket):
+            try:
+                self.bucket.pause(seconds)
+            except Exception as e:
+                logger.warning("No se pudo compartir la pausa del proveedor: %s", e)
+
+    def _wait_pause(self, deadline: Optional[Deadline] = None):
+        while True:
+            with self._lock:
+                remaining = self._pause_until - time.monotonic()
+            if isinstance(self.bucket, DBTokenBucket):
+                try:
+                    remaining = max(remaining, self.bucket.paused_for())
+                except Exception:
+                    pass
+            if remaining <= 0:
+                return
+            _sleep_within(min(remaining, MAX_PAUSE), deadline, "el fin de la pausa")
+
+    # --- uso ---
+
+    @contextmanager
+    def slot(self, deadline: Optional[Deadline] = None):
+        """
+        with limiter.slot(deadline) as s:
+            r = session.post(...)
+            s.observe(r.status_code, retry_after)
+        Una excepción dentro cuenta como sobrecarga (timeout, conexión caída...).
+        Si el plazo se agota esperando turno, DeadlineExceeded (sin llegar a llamar).
+        """
+        t0 = time.monotonic()
+        self._wait_pause(deadline)
+        epoch = self.concurrency.acquire(deadline)
+        try:
+            if self.bucket is not None:
+                self.bucket.acquire(deadline)
+        except Exception:
+            self.concurrency.release(epoch, overloaded=False)
+            raise
+        self._record_queue_delay(time.monotonic() - t0)
+
+        s = _Slot()
+        try:
+            yield s
+        except Exception:
+            self._finish(epoch, None, None, failed=True)
+            raise
+        self._finish(epoch, s.status_code, s.retry_after, failed=False)
+
+    def _record_queue_delay(self, delay: float):
+        with self._lock:
+            self.calls += 1
+            self.queue_delay_total += delay
+            self.queue_delay_max = max(self.queue_delay_max, delay)
+        metrics.PROVIDER_QUEUE_DELAY.observe(delay)
+
+    def _finish(self, epoch: int, status_code: Optional[int], retry_after: Optional[float], failed: bool):
+        overloaded = failed or is_overload(status_code)
+        with self._lock:
+            if status_code == 429:
+                self.throttled += 1
+            elif overloaded:
+                self.server_errors += 1
+        self.concurrency.release(epoch, overloaded)
+        if status_code == 429:
+            self.pause(retry_after if retry_after is not None else DEFAULT_PAUSE)
+        elif retry_after:
+            self.pause(retry_after)  # 503 con Retry-After
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "server_errors": self.server_errors,
+                "pauses": self.pauses,
+                "concurrency_limit": int(self.concurrency.limit),
+                "inflight": self.concurrency.inflight,
+                "queue_delay_avg": (self.queue_delay_total / self.calls) if self.calls else 0.0,
+                "queue_delay_max": self.queue_delay_max,
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_provider_limiter(max_concurrency: int) -> ProviderLimiter:
+    """Limitador del proceso (se crea la primera vez con la configuración del entorno)."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                from django.conf import settings
+                from django.db import connection
+                mode = (getattr(settings, "PHOMAGIC_PROVIDER_LIMITER", None)
+                        or os.environ.get("PHOMAGIC_PROVIDER_LIMITER", LIMITER_PROCESS))
+                if mode == LIMITER_DB and not connection.features.has_select_for_update:
+                    logger.warning("PHOMAGIC_PROVIDER_LIMITER=db necesita SELECT ... FOR UPDATE "
+                                   "(PostgreSQL/MySQL); con %s se usa el modo \"process\"", connection.vendor)
+                    mode = LIMITER_PROCESS
+                burst = float(DEFAULT_BURST) if DEFAULT_BURST else None
+                _limiter = ProviderLimiter(max_concurrency, rpm=DEFAULT_RPM, burst=burst, mode=mode)
+    return _limiter
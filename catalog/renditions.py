@@ -0,0 +1,58 @@
+# catalog/renditions.py
+"""
+Varios tamaños de salida (renditions) a partir de UNA salida del modelo.
+
+La salida del modelo (1024x1536 / 1536x1024) se compone una sola vez sobre el
+fondo y de ese lienzo sale cada tamaño pedido con su regla de encaje:
+  "stretch" → se escala a WxH sin respetar proporción (el comportamiento de siempre)
+  "fill"    → se escala para cubrir WxH y se recorta el sobrante centrado
+  "fit"     → se escala para caber en WxH y se rellena con el color de fondo (letterbox)
+"""
+from typing import Dict, List, Tuple
+
+from PIL import Image
+
+FIT_STRETCH = "stretch"
+FIT_FILL = "fill"
+FIT_FIT = "fit"
+FIT_MODES = (FIT_STRETCH, FIT_FILL, FIT_FIT)
+
+# Al reducir mucho, Pillow reduce primero por bloques (rápido) y termina con LANCZOS
+REDUCING_GAP = 3.0
+
+
+def fill_box(src: Tuple[int, int], target: Tuple[int, int]) -> Tuple[float, float, float, float]:
+    """Zona del origen (centrada) con la proporción del destino."""
+    sw, sh = src
+    tw, th = target
+    scale = max(tw / sw, th / sh)
+    cw, ch = tw / scale, th / scale
+    x0, y0 = (sw - cw) / 2, (sh - ch) / 2
+    return (x0, y0, x0 + cw, y0 + ch)
+
+
+def fit_size(src: Tuple[int, int], target: Tuple[int, int]) -> Tuple[int, int]:
+    sw, sh = src
+    tw, th = target
+    scale = min(tw / sw, th / sh)
+    return max(1, min(tw, round(sw * scale))), max(1, min(th, round(sh * scale)))
+
+
+def render(canvas: Image.Image, target: Tuple[int, int], fit: str, bg_rgb: Tuple[int, int, int]) -> Image.Image:
+    """Una rendition de `canvas` (RGB ya compuesto) al tamaño `target`."""
+    if canvas.size == target:
+        return canvas
+    if fit == FIT_FILL:
+        return canvas.resize(target, Image.LANCZOS, box=fill_box(canvas.size, target), reducing_gap=REDUCING_GAP)
+    if fit == FIT_FIT:
+        inner = fit_size(canvas.size, target)
+        out = Image.new("RGB", target, bg_rgb)
+        resized = canvas.resize(inner, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+        out.paste(resized, ((target[0] - inner[0]) // 2, (target[1] - inner[1]) // 2))
+        return out
+    return canvas.resize(target, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+
+
+def render_all(canvas: Image.Image, renditions: List[Dict], bg_rgb: Tuple[int, int, int]) -> List[Image.Image]:
+    """Todas las renditions ({width, height, fit}) en el orden pedido."""
+    return [render(canvas, (r["width"], r["height"]), r.get("fit", FIT_STRETCH), bg_rgb) for r in renditions]
@@ -0,0 +1,217 @@
+# catalog/result_cache.py
+"""
+Caché direccionada por contenido de vistas generadas.
+
+Clave = sha256(bytes de la imagen de entrada) + prompt renderizado + tamaño y
+modelo. Mismo input + mismas opciones → mismo b64 sin llamar al proveedor.
+
+Backends (settings.PHOMAGIC_RESULT_CACHE o env PHOMAGIC_RESULT_CACHE):
+  {"BACKEND": "disk", "MAX_BYTES": 512 * 1024 * 1024}   # LRU por tamaño en disco (ver ROOT)
+  {"BACKEND": "django", "ALIAS": "default", "TIMEOUT": 7 * 24 * 3600}  # framework de caché de Django
+  {"BACKEND": "none"}
+
+El directorio del backend "disk" es "ROOT", o env PHOMAGIC_RESULT_CACHE_DIR, o
+BASE_DIR/var/result_cache. Nunca debe colgar de MEDIA_ROOT: /media/ se sirve
+tal cual y cualquiera podría descargar resultados de otros usuarios.
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TIMEOUT = 7 * 24 * 3600
+
+
+def image_digest(image_bytes: Optional[bytes]) -> str:
+    return hashlib.sha256(image_bytes or b"").hexdigest()
+
+
+def make_key(img_digest: str, prompt: str, model_size: str, model: str) -> str:
+    h = hashlib.sha256()
+    for part in (img_digest, model, model_size, prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class DiskBackend:
+    """
+    Un fichero por clave bajo root/<2 primeros>/<clave>.b64.
+    El mtime hace de marca LRU (se toca en cada acierto); al superar max_bytes
+    se borran los más antiguos hasta quedar en el 90 %.
+    """
+
+    def __init__(self, root, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._total = None  # bytes en disco (se calcula perezosamente)
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.b64"
+
+    def get(self, key: str) -> Optional[str]:
+        p = self._path(key)
+        try:
+            data = p.read_text(encoding="ascii")
+        except (FileNotFoundError, OSError):
+            return None
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key: str, value: str):
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f".{p.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(value, encoding="ascii")
+        os.replace(tmp, p)  # atómico: un lector nunca ve un fichero a medias
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            else:
+                self._total += len(value)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for sub in self.root.iterdir():
+            if not sub.is_dir():
+                continue
+            for f in sub.glob("*.b64"):
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, f
+
+    def _scan_total(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        limit = int(self.max_bytes * 0.9)
+        for _, size, f in entries:
+            if total <= limit:
+                break
+            try:
+                f.unlink()
+                total -= size
+                self.evictions += 1
+                metrics.CACHE_EVICTIONS.inc()
+            except OSError:
+                pass
+        self._total = total
+
+
+class DjangoCacheBackend:
+    """
+    Usa caches[alias]. La expulsión la hace el propio backend de caché
+    (LocMem es LRU con MAX_ENTRIES; DB/fichero purgan con CULL_FREQUENCY).
+    """
+
+    def __init__(self, alias: str = "default", timeout: int = DEFAULT_TIMEOUT):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(f"phomagic:view:{key}")
+
+    def set(self, key: str, value: str):
+        self.cache.set(f"phomagic:view:{key}", value, self.timeout)
+
+
+class ResultCache:
+    """Envoltorio con contadores de aciertos/fallos. Los errores del backend nunca rompen un job."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Caché de vistas: fallo al leer %s: %s", key, e)
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.CACHE_REQUESTS.inc(result="miss" if value is None else "hit")
+        return value
+
+    def set(self, key: str, value: str):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.warning("Caché de vistas: fallo al guardar %s: %s", key, e)
+            return
+        with self._lock:
+            self.sets += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "sets": self.sets,
+                "evictions": getattr(self.backend, "evictions", 0),
+                "hit_ratio": (self.hits / total) if total else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _build_from_settings() -> Optional[ResultCache]:
+    from django.conf import settings
+
+    conf = dict(getattr(settings, "PHOMAGIC_RESULT_CACHE", None) or {})
+    backend = (conf.get("BACKEND") or os.environ.get("PHOMAGIC_RESULT_CACHE", "disk")).lower()
+
+    if backend == "none":
+        return None
+    if backend == "django":
+        return ResultCache(DjangoCacheBackend(
+            alias=conf.get("ALIAS", "default"),
+            timeout=conf.get("TIMEOUT", DEFAULT_TIMEOUT),
+        ))
+    if backend == "disk":
+        root = Path(conf.get("ROOT") or os.environ.get("PHOMAGIC_RESULT_CACHE_DIR")
+                    or Path(settings.BASE_DIR) / "var" / "result_cache")
+        if root.resolve().is_relative_to(Path(settings.MEDIA_ROOT).resolve()):
+            logger.warning("La caché de resultados (%s) está dentro de MEDIA_ROOT: se sirve públicamente", root)
+        return ResultCache(DiskBackend(root, max_bytes=conf.get("MAX_BYTES", DEFAULT_MAX_BYTES)))
+    raise ValueError(f"PHOMAGIC_RESULT_CACHE: backend desconocido '{backend}'")
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Caché del proceso según settings (None si está desactivada)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _build_from_settings() or False
+    return _cache or None
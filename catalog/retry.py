@@ -0,0 +1,207 @@
+# catalog/retry.py
+"""
+Política única de reintentos para todas las llamadas salientes
+(descarga de imágenes, API de imágenes vía requests y vía SDK de OpenAI).
+
+- Backoff exponencial con "full jitter": espera = uniforme(0, min(cap, base·2^n)).
+  Con varios workers a la vez, los reintentos no salen sincronizados.
+- Reglas por clase de error (classify):
+    connect     no llegó a enviarse                → siempre se reintenta
+    throttled   429                                 → siempre (espera ≥ Retry-After)
+    unavailable 503                                 → siempre (el servidor la rechazó sin procesarla)
+    server      500, 502, 504 y otros 5xx           → solo si es idempotente (un 502/504 de la
+                                                      pasarela no dice si el proveedor terminó y cobró)
+    timeout / reset  sin respuesta tras enviarla   → solo si es idempotente (POST podría cobrarse dos veces)
+    client      resto de 4xx, datos inválidos       → nunca
+- Deadline: presupuesto de tiempo de una operación (la descarga del job, o una
+  vista desde que sale de la cola del pool); ningún reintento (ni su espera)
+  se sale de él, y los timeouts de lectura se recortan a lo que queda.
+- Idempotencia: las llamadas no idempotentes llevan una Idempotency-Key fija
+  para todos sus intentos; queda en el log de cada reintento. No basta para
+  reintentar un 500: el proveedor pudo procesar (y cobrar) la petición y no
+  garantiza deduplicar por esa clave.
+"""
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Optional, TypeVar
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CONNECT = "connect"
+THROTTLED = "throttled"
+UNAVAILABLE = "unavailable"
+SERVER = "server"
+TIMEOUT = "timeout"
+RESET = "reset"
+CLIENT = "client"
+
+ALWAYS_SAFE = {CONNECT, THROTTLED, UNAVAILABLE}
+SAFE_WITH_KEY = set()  # clases que una Idempotency-Key haría seguras (ninguna con este proveedor)
+SAFE_IF_IDEMPOTENT = {SERVER, TIMEOUT, RESET}
+
+JOB_DEADLINE = float(os.environ.get("PHOMAGIC_JOB_DEADLINE", "600"))
+
+_stats_lock = threading.Lock()
+_retries = Counter()     # clase → reintentos hechos
+_gave_up = Counter()     # clase → veces que se agotaron intentos o plazo
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """Presupuesto de tiempo (time.monotonic) compartido por todas las llamadas de un job."""
+
+    def __init__(self, seconds: float):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def clamp(self, seconds: float) -> float:
+        """Recorta un timeout a lo que queda de plazo (con un mínimo para no pedir 0)."""
+        return max(1.0, min(seconds, self.remaining()))
+
+
+def new_idempotency_key() -> str:
+    return uuid.uuid4().hex
+
+
+# ---------- Clasificación ----------
+
+def classify_status(status: int) -> str:
+    if status == 429:
+        return THROTTLED
+    if status == 503:
+        return UNAVAILABLE
+    if status >= 500:
+        return SERVER
+    return CLIENT
+
+
+def _chain(exc: BaseException):
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def classify(exc: BaseException) -> str:
+    """Clase de error de una excepción de requests, httpx/openai o ProviderError."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return classify_status(status)
+
+    names = set()
+    for e in _chain(exc):
+        names.add(type(e).__name__)
+        reason = getattr(e, "reason", None)  # urllib3 MaxRetryError
+        if isinstance(reason, BaseException):
+            names.add(type(reason).__name__)
+    # Sin conexión establecida: requests/urllib3 y httpx
+    if names & {"ConnectTimeout", "NewConnectionError", "NameResolutionError", "ConnectError",
+                "ConnectionRefusedError", "gaierror"}:
+        return CONNECT
+    if names & {"ReadTimeout", "ReadTimeoutError", "APITimeoutError", "TimeoutException", "WriteTimeout",
+                "PoolTimeout", "Timeout", "timeout", "TimeoutError"}:
+        return TIMEOUT
+    if names & {"ConnectionError", "ConnectionResetError", "RemoteDisconnected", "ProtocolError",
+                "RemoteProtocolError", "ReadError", "APIConnectionError", "ChunkedEncodingError"}:
+        return RESET
+    return CLIENT
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    value = getattr(exc, "retry_after", None)
+    if value is not None:
+        return float(value)
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("Retry-After") or headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------- Política ----------
+
+class RetryPolicy:
+    def __init__(self, name: str, max_attempts: int = 4, base: float = 0.5, cap: float = 20.0):
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base = base
+        self.cap = cap
+
+    def backoff(self, attempt: int) -> float:
+        """Espera antes del intento `attempt + 1` (attempt empieza en 0)."""
+        return random.uniform(0.0, min(self.cap, self.base * (2 ** attempt)))
+
+    @staticmethod
+    def retryable(err_class: str, idempotent: bool, keyed: bool) -> bool:
+        if err_class in ALWAYS_SAFE:
+            return True
+        if keyed and err_class in SAFE_WITH_KEY:
+            return True
+        return idempotent and err_class in SAFE_IF_IDEMPOTENT
+
+    def call(self, fn: Callable[[], T], *, idempotent: bool, deadline: Optional[Deadline] = None,
+             idempotency_key: Optional[str] = None, what: str = "") -> T:
+        """
+        Ejecuta fn() con reintentos. Relanza la última excepción cuando no se
+        puede reintentar, se acaban los intentos o la espera no cabe en el plazo.
+        """
+        what = what or self.name
+        attempt = 0
+        while True:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded(f"{what}: plazo del job agotado")
+            try:
+                return fn()
+            except Exception as e:
+                err_class = classify(e)
+                if not self.retryable(err_class, idempotent, idempotency_key is not None):
+                    raise
+                delay = self.backoff(attempt)
+                if err_class == THROTTLED:
+                    delay = max(delay, retry_after_of(e) or 0.0)
+                attempt += 1
+                out_of_time = deadline is not None and delay >= deadline.remaining()
+                if attempt >= self.max_attempts or out_of_time:
+                    with _stats_lock:
+                        _gave_up[err_class] += 1
+                    metrics.RETRY_GIVEUPS.inc(policy=self.name, error_class=err_class)
+                    raise
+                with _stats_lock:
+                    _retries[err_class] += 1
+                metrics.RETRIES.inc(policy=self.name, error_class=err_class)
+                logger.info("%s: %s (%s), reintento %d/%d en %.2fs%s", what, err_class, e, attempt,
+                            self.max_attempts - 1, delay,
+                            f" [Idempotency-Key {idempotency_key}]" if idempotency_key else "")
+                time.sleep(delay)
+
+
+DOWNLOAD_POLICY = RetryPolicy("download", max_attempts=int(os.environ.get("PHOMAGIC_DOWNLOAD_ATTEMPTS", "4")),
+                              base=0.5, cap=8.0)
+PROVIDER_POLICY = RetryPolicy("provider", max_attempts=int(os.environ.get("PHOMAGIC_PROVIDER_ATTEMPTS", "4")),
+                              base=1.0, cap=30.0)
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return {"retries": dict(_retries), "gave_up": dict(_gave_up)}
@@ -1,3 +1,728 @@
-from django.test import TestCase
+import gzip
+import io
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.exception import convert_exception_to_response
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import include, path, reverse
+from django.utils import timezone
+import numpy as np
+from PIL import Image
+
+from . import generate_service, jobs, metrics, ratelimit, renditions, result_cache, retry
+from .batch import build_batch_jobs
+from .color_transfer import MODES as COLOR_MODES, match_color
+from .ingest import ingest_upload
+from .models import GenerationBatch, GenerationJob
+from .precomputed import PrecomputedResponse
+from .validation import get_validator
+from .views import _feather_mask, _get_original_regions, _paste_with_feather
+
+# catalog.urls no cuelga del proyecto: los tests que hacen peticiones usan este urlconf
+urlpatterns = [path("api/", include("catalog.urls"))]
+
+
+def _payload(**extra):
+    payload = {
+        "category": "Moda",
+        "subcategory": "Camisetas y Polos",
+        "views": ["estirada"],
+        "options": {"size": {"width": 1280, "height": 1920}},
+    }
+    payload.update(extra)
+    return payload
+
+
+class OriginalPathTests(TestCase):
+    """El original que se relee (logo/etiqueta) sale de upload_id, nunca del JSON del cliente."""
+
+    def test_orig_rel_path_from_upload_id(self):
+        ok, err, job = get_validator().validate(_payload(upload_id="abc.png", orig_rel_path="../settings.py"))
+        self.assertTrue(ok, err)
+        self.assertEqual(job["orig_rel_path"], "uploads/abc.png")
+
+    def test_image_url_has_no_original(self):
+        ok, err, job = get_validator().validate(_payload(image_url="https://example.com/a.jpg",
+                                                         orig_rel_path="lineas/x.png"))
+        self.assertTrue(ok, err)
+        self.assertNotIn("orig_rel_path", job)
+
+    def test_upload_id_with_path_rejected(self):
+        for upload_id in ("../x.png", "a/b.png", "..", "a\\b.png"):
+            ok, err, _ = get_validator().validate(_payload(upload_id=upload_id))
+            self.assertFalse(ok)
+            self.assertIn("upload_id no válido", err)
+
+    def test_batch_item_cannot_set_original(self):
+        ok, err, built = build_batch_jobs(_payload(items=[
+            {"id": "a", "image_url": "https://example.com/a.jpg", "orig_rel_path": "lineas/x.png"},
+        ]))
+        self.assertTrue(ok, err)
+        self.assertNotIn("orig_rel_path", built[0][1])
+
+    def test_regions_only_from_uploads(self):
+        box = {"x": 0, "y": 0, "w": 1, "h": 1, "img_w": 0, "img_h": 0}
+        for rel in ("lineas/x.png", "uploads/../x.png", "uploads/a/b.png", "/etc/passwd"):
+            with self.assertRaises(ValueError):
+                _get_original_regions(rel, [box])
+
+
+class _FakeExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args[0])
+
+
+class JobRecoveryTests(TestCase):
+    def test_pool_start_requeues_stale_and_relaunches_pending(self):
+        old = timezone.now() - timedelta(minutes=jobs.STALE_MINUTES + 5)
+        stale = GenerationJob.objects.create(job={}, status=GenerationJob.STATUS_RUNNING, started_at=old)
+        fresh = GenerationJob.objects.create(job={}, status=GenerationJob.STATUS_RUNNING,
+                                             started_at=timezone.now())
+        pending = GenerationJob.objects.create(job={})
+
+        executor = _FakeExecutor()
+        jobs._recover(executor)
+
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.status, GenerationJob.STATUS_PENDING)
+        self.assertEqual(fresh.status, GenerationJob.STATUS_RUNNING)
+        self.assertCountEqual(executor.submitted, [stale.id, pending.id])
+
+    @override_settings(PHOMAGIC_JOB_RUNNER=jobs.RUNNER_THREAD)
+    def test_dispatch_recovers_periodically(self):
+        old = timezone.now() - timedelta(minutes=jobs.STALE_MINUTES + 5)
+        executor = _FakeExecutor()
+        with mock.patch.object(jobs, "_get_executor", return_value=executor), \
+                mock.patch.object(jobs, "_last_recover", time.monotonic() - jobs.RECOVER_INTERVAL - 1):
+            # Un worker murió con el pool ya en marcha
+            orphan = GenerationJob.objects.create(job={}, status=GenerationJob.STATUS_RUNNING, started_at=old)
+            jobs.dispatch(["nuevo-1"])
+            self.assertEqual(executor.submitted, ["nuevo-1", orphan.id])
+            orphan.refresh_from_db()
+            self.assertEqual(orphan.status, GenerationJob.STATUS_PENDING)
+
+            # Dentro del intervalo no se vuelve a mirar la BD
+            GenerationJob.objects.create(job={}, status=GenerationJob.STATUS_RUNNING, started_at=old)
+            with mock.patch.object(jobs, "_requeue_stale") as requeue:
+                jobs.dispatch(["nuevo-2"])
+            requeue.assert_not_called()
+            self.assertEqual(executor.submitted[-1], "nuevo-2")
+
+
+@override_settings(ROOT_URLCONF="catalog.tests", PHOMAGIC_JOB_RUNNER=jobs.RUNNER_DB)
+class UiGenerateTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+
+    def test_submits_job_and_polls_status(self):
+        upload = _png_upload()
+        box = '{"x": 1, "y": 1, "w": 10, "h": 10, "img_w": 64, "img_h": 48}'
+        with self.settings(MEDIA_ROOT=self.media):
+            resp = self.client.post("/api/ui/generate/", {
+                "image": upload, "views": ["estirada"], "size": "720x800",
+                "logo": "on", "logo_box_json": box,
+            }, secure=True)
+        self.assertEqual(resp.status_code, 200)
+
+        row = GenerationJob.objects.get()
+        self.assertEqual(row.status, GenerationJob.STATUS_PENDING)
+        self.assertEqual(row.job["orig_rel_path"], f"uploads/{row.job['image']['upload_id']}")
+        self.assertEqual(row.job["image"]["meta"]["width"], 64)
+        self.assertContains(resp, f"data-status-url='/api/job/status/{row.id}/'")
+
+        status = self.client.get(f"/api/job/status/{row.id}/", secure=True).json()
+        self.assertEqual(status["status"], GenerationJob.STATUS_PENDING)
+
+
+class GenerateViewsTests(TestCase):
+    def test_no_view_with_prompt_is_an_error(self):
+        ok, err, job = get_validator().validate(_payload(image_url="https://example.com/a.jpg"))
+        self.assertTrue(ok, err)
+        job["views_requested"] = [{"id": "no_existe"}]
+        with mock.patch.object(generate_service, "OPENAI_API_KEY", "x"), \
+                mock.patch.object(generate_service, "_resolve_image_bytes") as resolve:
+            with self.assertRaisesMessage(RuntimeError, "Ninguna de las vistas pedidas tiene prompt"):
+                generate_service.generate_views_from_job(job)
+        resolve.assert_not_called()
+
+    VIEWS = ("estirada", "plegada", "maniqui_invisible")
+
+    def _run(self, edit):
+        ok, err, job = get_validator().validate(_payload(image_url="https://example.com/a.jpg",
+                                                         views=list(self.VIEWS)))
+        self.assertTrue(ok, err)
+        tasks = [{"view_id": v, "prompt": f"prompt-{v}"} for v in self.VIEWS]
+        with mock.patch.object(generate_service, "OPENAI_API_KEY", "x"), \
+                mock.patch.object(generate_service, "build_prompts", return_value=tasks), \
+                mock.patch.object(generate_service, "_resolve_image_bytes", return_value=b"imagen"), \
+                mock.patch.object(generate_service, "_prepare_model_input",
+                                  return_value=(b"imagen", "input.png", "image/png")), \
+                mock.patch.object(generate_service, "get_result_cache", return_value=None), \
+                mock.patch.object(generate_service, "_openai_edit", side_effect=edit):
+            return generate_service.generate_views_from_job(job)
+
+    @skipIf(generate_service.MAX_CONCURRENCY < 3, "hace falta MAX_CONCURRENCY >= 3")
+    def test_views_run_concurrently_and_keep_request_order(self):
+        # Las tres a la vez en el pool; terminan en orden inverso al pedido
+        in_flight = threading.Barrier(len(self.VIEWS), timeout=5)
+        finished = []
+        delays = {"prompt-estirada": 0.2, "prompt-plegada": 0.1, "prompt-maniqui_invisible": 0.0}
+
+        def edit(image_bytes, prompt, size, **kwargs):
+            in_flight.wait()
+            time.sleep(delays[prompt])
+            finished.append(prompt)
+            return f"b64-{prompt}"
+
+        results = self._run(edit)
+        self.assertEqual(finished, ["prompt-maniqui_invisible", "prompt-plegada", "prompt-estirada"])
+        self.assertEqual([r["view_id"] for r in results], list(self.VIEWS))
+        self.assertEqual([r["image_b64"] for r in results], [f"b64-prompt-{v}" for v in self.VIEWS])
+
+    def test_failed_view_does_not_drop_siblings(self):
+        def edit(image_bytes, prompt, size, **kwargs):
+            if prompt == "prompt-plegada":
+                raise ValueError("proveedor caído")
+            return f"b64-{prompt}"
+
+        results = self._run(edit)
+        self.assertEqual([r["view_id"] for r in results], list(self.VIEWS))
+        self.assertEqual(results[0]["image_b64"], "b64-prompt-estirada")
+        self.assertEqual(results[2]["image_b64"], "b64-prompt-maniqui_invisible")
+        self.assertIsNone(results[1]["image_b64"])
+        self.assertEqual(results[1]["error"], "proveedor caído")
+        self.assertNotIn("error", results[0])
+
+    def test_all_views_failing_is_an_error(self):
+        def edit(image_bytes, prompt, size, **kwargs):
+            raise ValueError(f"falla {prompt}")
+
+        with self.assertRaisesMessage(RuntimeError, "falla prompt-estirada"):
+            self._run(edit)
+
+
+@override_settings(ROOT_URLCONF="catalog.tests", PHOMAGIC_JOB_RUNNER=jobs.RUNNER_DB)
+class BatchStatusTests(TestCase):
+    def _submit(self, n):
+        items = [{"id": f"sku-{i}", "image_url": f"https://example.com/{i}.jpg"} for i in range(n)]
+        resp = self.client.post("/api/batch/submit/", _payload(items=items),
+                                content_type="application/json", secure=True)
+        self.assertEqual(resp.status_code, 202)
+        return f"/api/batch/{resp.json()['batch_id']}/", list(GenerationJob.objects.order_by("seq"))
+
+    def _finish(self, row, at):
+        # Lo que hace run_claimed_job al terminar, con finished_at fijado por el test
+        row.refresh_from_db()
+        row.status, row.finished_at, row.results = GenerationJob.STATUS_DONE, at, []
+        jobs._save_finished(row)
+
+    def _since(self, url, cursor):
+        return self.client.get(url, {"since": cursor}, secure=True).json()
+
+    def test_since_cursor_pages_finished_items(self):
+        url, rows = self._submit(3)
+        first = self._since(url, "")
+        self.assertEqual(first["items"], [])
+        self.assertFalse(first["progress"]["complete"])
+
+        at = timezone.now()
+        self._finish(rows[1], at)
+        self._finish(rows[0], at)
+        page = self._since(url, first["next"])
+        self.assertEqual([i["item_id"] for i in page["items"]], ["sku-1", "sku-0"])
+
+        self._finish(rows[2], at + timedelta(seconds=1))
+        last = self._since(url, page["next"])
+        self.assertEqual([i["item_id"] for i in last["items"]], ["sku-2"])
+        self.assertTrue(last["progress"]["complete"])
+        self.assertFalse(last["more"])
+
+        again = self._since(url, last["next"])
+        self.assertEqual(again["items"], [])
+        self.assertEqual(again["next"], last["next"])
+
+    def test_late_commit_with_earlier_finished_at_not_skipped(self):
+        # A termina antes (t1) pero confirma después de B (t2), cuando el cliente ya avanzó el cursor
+        url, (row_a, row_b) = self._submit(2)
+        t1 = timezone.now()
+        self._finish(row_b, t1 + timedelta(seconds=5))
+        page = self._since(url, "")
+        self.assertEqual([i["item_id"] for i in page["items"]], ["sku-1"])
+
+        self._finish(row_a, t1)
+        late = self._since(url, page["next"])
+        self.assertEqual([i["item_id"] for i in late["items"]], ["sku-0"])
+        self.assertTrue(late["progress"]["complete"])
+
+    def test_run_claimed_job_numbers_completions(self):
+        url, rows = self._submit(2)
+        for row in reversed(rows):
+            GenerationJob.objects.filter(id=row.id).update(status=GenerationJob.STATUS_RUNNING)
+            with mock.patch("catalog.views._run_generation", return_value=[]):
+                self.assertEqual(jobs.run_claimed_job(row.id), GenerationJob.STATUS_DONE)
+        self.assertEqual(list(GenerationJob.objects.order_by("seq").values_list("finish_seq", flat=True)), [2, 1])
+        self.assertEqual(GenerationBatch.objects.get().completed, 2)
+        full = self.client.get(url, secure=True).json()
+        self.assertEqual(full["next"], "2")
+
+    def test_bad_cursor(self):
+        batch = GenerationBatch.objects.create(manifest={}, total=0)
+        resp = self.client.get(f"/api/batch/{batch.id}/", {"since": "ayer"}, secure=True)
+        self.assertEqual(resp.status_code, 400)
+
+
+class _DictCache(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+class ResultCacheTests(TestCase):
+    def test_disk_cache_not_under_media_root(self):
+        with mock.patch.dict("os.environ", {}) as env, override_settings(PHOMAGIC_RESULT_CACHE=None):
+            env.pop("PHOMAGIC_RESULT_CACHE", None)
+            env.pop("PHOMAGIC_RESULT_CACHE_DIR", None)
+            root = result_cache._build_from_settings().backend.root
+        self.assertEqual(root, Path(settings.BASE_DIR) / "var" / "result_cache")
+        self.assertFalse(root.resolve().is_relative_to(Path(settings.MEDIA_ROOT).resolve()))
+
+    def _job(self, **options):
+        ok, err, job = get_validator().validate(_payload(
+            image_url="https://example.com/a.jpg", views=["estirada", "plegada"],
+            options={"size": {"width": 720, "height": 800}, **options}))
+        self.assertTrue(ok, err)
+        return job
+
+    def test_cache_must_be_boolean(self):
+        ok, err, _ = get_validator().validate(_payload(image_url="https://example.com/a.jpg",
+                                                       options={"cache": "false"}))
+        self.assertFalse(ok)
+        self.assertIn("cache debe ser booleano", err)
+
+    def test_hits_are_not_queued_behind_provider_calls(self):
+        job = self._job()
+        cache = _DictCache()
+        calls = []
+
+        def edit(image_bytes, prompt, size, **kwargs):
+            calls.append(prompt)
+            return "b64-generado"
+
+        with mock.patch.object(generate_service, "OPENAI_API_KEY", "x"), \
+                mock.patch.object(generate_service, "_resolve_image_bytes", return_value=b"imagen"), \
+                mock.patch.object(generate_service, "_prepare_model_input",
+                                  return_value=(b"imagen", "input.png", "image/png")), \
+                mock.patch.object(generate_service, "_openai_edit", side_effect=edit), \
+                mock.patch.object(generate_service, "get_result_cache", return_value=cache):
+            first = generate_service.generate_views_from_job(job)
+            self.assertEqual([r["cached"] for r in first], [False, False])
+            self.assertEqual(len(cache), 2)
+
+            with mock.patch.object(generate_service._view_executor, "submit") as submit:
+                second = generate_service.generate_views_from_job(job)
+            submit.assert_not_called()
+            self.assertEqual([r["cached"] for r in second], [True, True])
+            self.assertEqual([r["view_id"] for r in second], ["estirada", "plegada"])
+        self.assertEqual(len(calls), 2)
+
+
+class RetryRulesTests(TestCase):
+    def test_server_error_not_retried_for_post_even_with_key(self):
+        self.assertFalse(retry.RetryPolicy.retryable(retry.SERVER, idempotent=False, keyed=True))
+        self.assertTrue(retry.RetryPolicy.retryable(retry.SERVER, idempotent=True, keyed=False))
+        for err_class in (retry.THROTTLED, retry.UNAVAILABLE, retry.CONNECT):
+            self.assertTrue(retry.RetryPolicy.retryable(err_class, idempotent=False, keyed=True))
+
+    def test_gateway_errors_only_retried_if_idempotent(self):
+        self.assertEqual(retry.classify_status(503), retry.UNAVAILABLE)
+        for status in (502, 504):
+            self.assertEqual(retry.classify_status(status), retry.SERVER)
+
+        class GatewayTimeout(Exception):
+            status_code = 504
+
+        calls = []
+
+        def post():
+            calls.append(1)
+            raise GatewayTimeout()
+
+        policy = retry.RetryPolicy("test", max_attempts=4, base=0.0, cap=0.0)
+        with self.assertRaises(GatewayTimeout):
+            policy.call(post, idempotent=False, idempotency_key="k")
+        self.assertEqual(len(calls), 1)
+        with self.assertRaises(GatewayTimeout):
+            policy.call(post, idempotent=True)
+        self.assertEqual(len(calls), 5)
+
+    def test_view_deadline_starts_when_the_view_runs(self):
+        seen = {}
+
+        def edit(image_bytes, prompt, size, deadline=None, **kwargs):
+            seen["deadline"] = deadline
+            return "b64"
+
+        task = {"view_id": "estirada", "prompt": "p"}
+        with mock.patch.object(generate_service, "_openai_edit", side_effect=edit):
+            t0 = time.monotonic()
+            result = generate_service._generate_one_view(task, (b"x", "input.png", "image/png"), "1024x1024",
+                                                         budget=5.0)
+        self.assertEqual(result["image_b64"], "b64")
+        self.assertGreaterEqual(seen["deadline"].expires, t0 + 5.0)
+
+
+class LimiterDeadlineTests(TestCase):
+    def test_bucket_wait_respects_deadline(self):
+        bucket = ratelimit.TokenBucket(rate=0.5, burst=1)
+        bucket.acquire()
+        t0 = time.monotonic()
+        with self.assertRaises(retry.DeadlineExceeded):
+            bucket.acquire(retry.Deadline(0.2))
+        self.assertLess(time.monotonic() - t0, 0.5)
+
+    def test_concurrency_wait_respects_deadline(self):
+        limiter = ratelimit.ProviderLimiter(1, rpm=0)
+        epoch = limiter.concurrency.acquire()
+        with self.assertRaises(retry.DeadlineExceeded):
+            with limiter.slot(retry.Deadline(0.1)):
+                pass
+        limiter.concurrency.release(epoch, overloaded=False)
+        self.assertEqual(limiter.concurrency.inflight, 0)
+
+    def test_pause_wait_respects_deadline(self):
+        limiter = ratelimit.ProviderLimiter(2, rpm=0)
+        limiter.pause(30)
+        t0 = time.monotonic()
+        with self.assertRaises(retry.DeadlineExceeded):
+            with limiter.slot(retry.Deadline(1.0)):
+                pass
+        self.assertLess(time.monotonic() - t0, 0.5)
+        self.assertEqual(limiter.concurrency.inflight, 0)
+
+    def test_db_pause_is_read_once_per_ttl(self):
+        bucket = ratelimit.DBTokenBucket(1.0, 1.0, pause_ttl=60)
+        with self.assertNumQueries(1):
+            bucket.paused_for()
+            bucket.paused_for()
+
+    @skipIf(connection.features.has_select_for_update, "la BD de test admite SELECT ... FOR UPDATE")
+    def test_db_mode_refused_without_select_for_update(self):
+        self.addCleanup(setattr, ratelimit, "_limiter", None)
+        ratelimit._limiter = None
+        with self.settings(PHOMAGIC_PROVIDER_LIMITER=ratelimit.LIMITER_DB):
+            limiter = ratelimit.get_provider_limiter(2)
+        self.assertEqual(limiter.mode, ratelimit.LIMITER_PROCESS)
+
+
+class MetricsTests(TestCase):
+    def test_single_metrics_route(self):
+        self.assertEqual(reverse("metrics"), "/metrics")
+
+    def test_server_error_counted_by_status(self):
+        def boom(request):
+            raise RuntimeError("boom")
+
+        # Como en la pila de Django: la excepción llega al middleware ya convertida en un 500
+        key = ("unmatched", "GET", "500")
+        before = metrics.HTTP_REQUESTS._values.get(key, 0.0)
+        middleware = metrics.MetricsMiddleware(convert_exception_to_response(boom))
+        with self.assertLogs("django.request", "ERROR"):
+            response = middleware(RequestFactory().get("/x"))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(metrics.HTTP_REQUESTS._values.get(key, 0.0), before + 1)
+
+    def test_metrics_view_denied_by_default(self):
+        request = RequestFactory().get("/metrics", HTTP_AUTHORIZATION="Bearer x")
+        with mock.patch.dict("os.environ", {}, clear=False) as env:
+            env.pop("PHOMAGIC_METRICS_TOKEN", None)
+            self.assertEqual(metrics.metrics_view(request).status_code, 404)
+        with mock.patch.dict("os.environ", {"PHOMAGIC_METRICS_TOKEN": "secreto"}):
+            self.assertEqual(metrics.metrics_view(request).status_code, 401)
+            ok = metrics.metrics_view(RequestFactory().get("/metrics", HTTP_AUTHORIZATION="Bearer secreto"))
+            self.assertEqual(ok.status_code, 200)
+
+
+def _png_upload(size=(64, 48), name="foto.png"):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 10, 10)).save(buf, format="PNG")
+    return SimpleUploadedFile(name, buf.getvalue(), content_type="image/png")
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_decompression_bomb_is_a_size_error(self):
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 100):
+            ok, err, meta = ingest_upload(_png_upload())
+        self.assertFalse(ok)
+        self.assertIn("demasiado grande", err)
+        self.assertIsNone(meta)
+
+    def test_api_job_gets_ingest_meta(self):
+        ok, err, meta = ingest_upload(_png_upload())
+        self.assertTrue(ok, err)
+        image = {"image_url": None, "upload_id": meta["upload_id"]}
+        data = generate_service._resolve_image_bytes(image)
+        self.assertEqual(len(data), meta["bytes"])
+        self.assertEqual(image["meta"]["sha256"], meta["sha256"])
+        self.assertEqual((image["meta"]["width"], image["meta"]["height"]), (64, 48))
+
+
+class ModelInputTests(TestCase):
+    def test_fallback_keeps_real_mime(self):
+        # Cabecera PNG que Pillow no puede decodificar: se envía tal cual, pero como PNG
+        data = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+        self.assertEqual(generate_service._prepare_model_input(data, "1024x1024", "png-roto"),
+                         (data, "input.png", "image/png"))
+        data = b"RIFF\x00\x00\x00\x00WEBP" + b"\x00" * 32
+        self.assertEqual(generate_service._prepare_model_input(data, "1024x1024", "webp-roto")[1:],
+                         ("input.webp", "image/webp"))
+        data = b"GIF89a" + b"\x00" * 32
+        self.assertEqual(generate_service._prepare_model_input(data, "1024x1024", "gif-roto")[2],
+                         "application/octet-stream")
+
+
+class ColorTransferTests(TestCase):
+    """Regresión visual contra benchmarks/fixtures/color_transfer (máx. 1 nivel de diferencia por canal)."""
+
+    def test_modes_match_fixtures(self):
+        from benchmarks.bench_color_transfer import FIXTURES, synthetic_pair
+        src, dst = synthetic_pair(96, 64)
+        self.assertEqual(set(COLOR_MODES), {"gain", "reinhard", "histogram"})
+        for mode in COLOR_MODES:
+            with self.subTest(mode=mode):
+                out = np.asarray(match_color(src, dst, mode), dtype=np.int16)
+                ref = np.asarray(Image.open(FIXTURES / f"expected_{mode}.png").convert("RGB"), dtype=np.int16)
+                self.assertEqual(out.shape, ref.shape)
+                self.assertLessEqual(int(np.abs(out - ref).max()), 1)
+
+    def test_gain_matches_original_implementation(self):
+        from benchmarks.bench_color_transfer import _old_gain, synthetic_pair
+        src, dst = synthetic_pair(120, 60)
+        self.assertEqual(match_color(src, dst, "gain").tobytes(), _old_gain(src, dst).tobytes())
+
+
+class ValidateManyTests(TestCase):
+    """validate_many: la parte category/subcategory/views/options se valida una vez por objetos compartidos."""
+
+    def test_shared_spec_checked_once(self):
+        validator = get_validator()
+        views, options = ["estirada"], {"size": {"width": 1280, "height": 1920}}
+        payloads = [{"category": "Moda", "subcategory": "Camisetas y Polos", "views": views,
+                     "options": options, "image_url": f"https://example.com/{i}.jpg"} for i in range(5)]
+        with mock.patch.object(validator, "_check_spec", wraps=validator._check_spec) as check:
+            results = validator.validate_many(payloads)
+        self.assertEqual(check.call_count, 1)
+        self.assertTrue(all(ok for ok, _, _ in results))
+        self.assertEqual([job["image"]["image_url"] for _, _, job in results],
+                         [p["image_url"] for p in payloads])
+        # Cada job tiene su propia copia de las opciones
+        results[0][2]["client_options"]["size_px"]["width"] = 1
+        self.assertEqual(results[1][2]["client_options"]["size_px"]["width"], 1280)
+
+    def test_equal_but_distinct_objects_checked_each(self):
+        validator = get_validator()
+        payloads = [_payload(image_url="https://example.com/a.jpg"), _payload(image_url="https://example.com/b.jpg")]
+        with mock.patch.object(validator, "_check_spec", wraps=validator._check_spec) as check:
+            validator.validate_many(payloads)
+        self.assertEqual(check.call_count, 2)
+
+    def test_all_errors_reported(self):
+        validator = get_validator()
+        bad = _payload(views=["no-existe"], options={"size": {"width": 1, "height": 1}, "background_hex": "rojo",
+                                                     "cache": "si"})
+        [(ok, err, job)] = validator.validate_many([bad])
+        self.assertFalse(ok)
+        self.assertIsNone(job)
+        parts = err.split("; ")
+        self.assertTrue(any(p.startswith("Vistas no válidas") for p in parts), err)
+        self.assertTrue(any(p.startswith("Tamaño no válido") for p in parts), err)
+        self.assertIn("background_hex debe ser tipo #FFFFFF", parts)
+        self.assertIn("cache debe ser booleano", parts)
+        self.assertIn("Falta image_url o upload_id", parts)
+
+    def test_shared_errors_not_accumulated(self):
+        # El error de imagen de un item no se cuela en el siguiente que comparte spec
+        views, options = ["estirada"], {"size": {"width": 1280, "height": 1920}}
+        base = {"category": "Moda", "subcategory": "Camisetas y Polos", "views": views, "options": options}
+        results = get_validator().validate_many([dict(base), dict(base, image_url="https://example.com/a.jpg")])
+        self.assertEqual(results[0][:2], (False, "Falta image_url o upload_id"))
+        self.assertTrue(results[1][0], results[1][1])
+
+
+class RenditionTests(TestCase):
+    """Geometría de renditions.render: stretch, fill (recorte centrado) y fit (letterbox)."""
+
+    def _canvas(self):
+        # 200x100: mitad izquierda roja, derecha azul, franja verde de 20 px en el centro
+        canvas = Image.new("RGB", (200, 100), (255, 0, 0))
+        canvas.paste((0, 0, 255), (100, 0, 200, 100))
+        canvas.paste((0, 255, 0), (90, 0, 110, 100))
+        return canvas
+
+    def test_same_size_untouched(self):
+        canvas = self._canvas()
+        self.assertIs(renditions.render(canvas, (200, 100), renditions.FIT_FILL, (0, 0, 0)), canvas)
+
+    def test_fill_box_is_centered(self):
+        self.assertEqual(renditions.fill_box((200, 100), (100, 100)), (50.0, 0.0, 150.0, 100.0))
+        self.assertEqual(renditions.fill_box((100, 200), (100, 100)), (0.0, 50.0, 100.0, 150.0))
+
+    def test_fill_crops_center(self):
+        out = renditions.render(self._canvas(), (50, 50), renditions.FIT_FILL, (0, 0, 0))
+        self.assertEqual(out.size, (50, 50))
+        # Del origen solo queda x∈[50, 150): rojo, verde y azul sin bandas de fondo
+        self.assertEqual(out.getpixel((25, 25)), (0, 255, 0))
+        self.assertEqual(out.getpixel((2, 25)), (255, 0, 0))
+        self.assertEqual(out.getpixel((47, 25)), (0, 0, 255))
+
+    def test_fit_letterboxes_with_background(self):
+        bg = (255, 255, 255)
+        self.assertEqual(renditions.fit_size((200, 100), (100, 100)), (100, 50))
+        out = renditions.render(self._canvas(), (100, 100), renditions.FIT_FIT, bg)
+        self.assertEqual(out.size, (100, 100))
+        # Bandas de fondo arriba y abajo (25 px), imagen entera en el centro
+        self.assertEqual(out.getpixel((50, 5)), bg)
+        self.assertEqual(out.getpixel((50, 95)), bg)
+        self.assertEqual(out.getpixel((2, 50)), (255, 0, 0))
+        self.assertEqual(out.getpixel((97, 50)), (0, 0, 255))
+        self.assertEqual(out.getpixel((50, 50)), (0, 255, 0))
+
+    def test_fit_size_never_exceeds_target(self):
+        for src, target in (((1024, 1536), (1280, 1920)), ((1536, 1024), (7, 3)), ((3, 1000), (10, 10))):
+            w, h = renditions.fit_size(src, target)
+            self.assertTrue(1 <= w <= target[0] and 1 <= h <= target[1], (src, target, (w, h)))
+
+    def test_stretch_ignores_aspect(self):
+        out = renditions.render(self._canvas(), (60, 90), renditions.FIT_STRETCH, (0, 0, 0))
+        self.assertEqual(out.size, (60, 90))
+        self.assertEqual(out.getpixel((2, 2)), (255, 0, 0))
+        self.assertEqual(out.getpixel((57, 87)), (0, 0, 255))
+
+    def test_render_all_keeps_order(self):
+        outs = renditions.render_all(self._canvas(), [
+            {"width": 50, "height": 50, "fit": renditions.FIT_FILL},
+            {"width": 100, "height": 20},
+        ], (0, 0, 0))
+        self.assertEqual([o.size for o in outs], [(50, 50), (100, 20)])
+
+
+class PrecomputedResponseTests(TestCase):
+    """ETag/304 y negociación de Accept-Encoding de las respuestas precalculadas."""
+
+    body = b'{"categories": [' + b", ".join(b'"Moda"' for _ in range(200)) + b"]}"
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.pre = PrecomputedResponse(self.body, "application/json", max_age=60)
+
+    def _get(self, **headers):
+        return self.pre.respond(self.factory.get("/api/catalog/", **headers))
+
+    def test_identity_with_etag(self):
+        resp = self._get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, self.body)
+        self.assertEqual(resp["ETag"], self.pre.etag)
+        self.assertFalse(resp.has_header("Content-Encoding"))
+        self.assertEqual(resp["Cache-Control"], "public, max-age=60, must-revalidate")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+
+    def test_gzip_variant(self):
+        resp = self._get(HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(resp.content), self.body)
+        self.assertEqual(resp["ETag"], self.pre.etag[:-1] + '-gzip"')
+        self.assertEqual(resp["Content-Length"], str(len(resp.content)))
+
+    def test_q_zero_refuses_encoding(self):
+        for header in ("gzip;q=0", "gzip; q=0, identity", "*;q=0", "br;q=0, gzip;q=0.0"):
+            with self.subTest(header=header):
+                resp = self._get(HTTP_ACCEPT_ENCODING=header)
+                self.assertFalse(resp.has_header("Content-Encoding"))
+                self.assertEqual(resp.content, self.body)
+        self.assertEqual(self.pre.choose_encoding("*;q=0, gzip;q=0.5"), "gzip")
+        self.assertEqual(self.pre.choose_encoding("*"), "br" if "br" in self.pre.variants else "gzip")
+
+    def test_not_modified(self):
+        gzip_etag = self.pre.variants["gzip"][1]
+        for inm in (self.pre.etag, gzip_etag, f'"otro", W/{self.pre.etag}', "*"):
+            with self.subTest(if_none_match=inm):
+                resp = self._get(HTTP_IF_NONE_MATCH=inm, HTTP_ACCEPT_ENCODING="gzip")
+                self.assertEqual(resp.status_code, 304)
+                self.assertEqual(resp.content, b"")
+                self.assertEqual(resp["ETag"], gzip_etag)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH='"otro"').status_code, 200)
+
+    def test_etag_follows_body(self):
+        other = PrecomputedResponse(self.body + b" ", "application/json")
+        self.assertNotEqual(other.etag, self.pre.etag)
+        self.assertEqual(PrecomputedResponse(self.body, "application/json").etag, self.pre.etag)
+
+    def test_small_body_not_compressed(self):
+        small = PrecomputedResponse(b'{"ok": true}', "application/json")
+        self.assertEqual(list(small.variants), ["identity"])
+        resp = small.respond(self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertFalse(resp.has_header("Content-Encoding"))
+        self.assertFalse(resp.has_header("Vary"))
+
+    def test_head_has_no_body(self):
+        resp = self.pre.respond(self.factory.head("/api/catalog/", HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp["Content-Length"], str(len(self.pre.variants["gzip"][0])))
+
+
+class FeatherMaskTests(TestCase):
+    """Máscara de pegado: rampa lineal de `feather` px desde cada borde, simétrica, sin blur."""
+
+    def test_edge_ramp_values(self):
+        feather = 4
+        mask = np.asarray(_feather_mask(20, 12, feather))
+        self.assertEqual(mask.shape, (12, 20))
+        # Profundidad k desde el borde (0 = borde) → 255·(k+1)/(feather+1); dentro, 255
+        expected = [round(255 * (k + 1) / (feather + 1)) for k in range(feather)] + [255]
+        self.assertEqual(mask[6, :feather + 1].tolist(), expected)
+        self.assertEqual(mask[:feather + 1, 10].tolist(), expected)
+        self.assertEqual(mask[6, -feather - 1:].tolist(), expected[::-1])
+        self.assertEqual(mask[-feather - 1:, 10].tolist(), expected[::-1])
+        # Esquinas: el mínimo de las dos rampas, no más oscuras que el borde
+        for y, x in ((0, 0), (0, -1), (-1, 0), (-1, -1)):
+            self.assertEqual(mask[y, x], expected[0])
+        self.assertEqual(mask[1, 3], expected[1])
+        self.assertTrue((mask[feather:-feather, feather:-feather] == 255).all())
+
+    def test_symmetry(self):
+        mask = np.asarray(_feather_mask(15, 15, 3))
+        np.testing.assert_array_equal(mask, mask[::-1, :])
+        np.testing.assert_array_equal(mask, mask[:, ::-1])
+        np.testing.assert_array_equal(mask, mask.T)
+
+    def test_memoized(self):
+        self.assertIs(_feather_mask(30, 20, 4), _feather_mask(30, 20, 4))
+        self.assertIsNot(_feather_mask(30, 20, 4), _feather_mask(30, 20, 5))
+
+    def test_paste_blends_edges_only(self):
+        base = Image.new("RGB", (20, 20), (0, 0, 0))
+        _paste_with_feather(base, Image.new("RGB", (10, 10), (255, 255, 255)), (5, 5), feather=4)
+        self.assertEqual(base.getpixel((10, 10)), (255, 255, 255))
+        self.assertEqual(base.getpixel((5, 10))[0], round(255 / 5))
+        self.assertEqual(base.getpixel((4, 10)), (0, 0, 0))
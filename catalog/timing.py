@@ -0,0 +1,108 @@
+# catalog/timing.py
+"""
+Tiempos por etapa del pipeline de generación.
+
+Un Timings recoge los spans de UN job. No hay estado global ni thread-locals:
+el colector se pasa como argumento a cada función (también a los hilos del
+pool de vistas), y todas aceptan timings=None para no medir nada.
+
+    t = Timings("generate")
+    with span(t, "download"):
+        ...
+    t.summary()          → {"download": {"count": 1, "total_ms": 812.4, "max_ms": 812.4}, ...}
+    t.server_timing()    → 'download;dur=812.4, model_call;dur=...'
+    t.finish("ok", job_id=...) → una línea "timings {...json...}" por el LOGGING del proyecto
+
+Cada span alimenta además phomagic_stage_duration_seconds y finish() el
+histograma de duración total del job (catalog.metrics).
+
+Etapas: download, prompt_build, input_prepare, cache_lookup, model_call,
+views (espera de todas las vistas, reloj de pared), decode, composite,
+region_paste, render (renditions), encode, storage_save.
+
+Con varias vistas en paralelo, total_ms de una etapa es la SUMA de sus spans
+(tiempo de trabajo), que puede superar el tiempo total de la petición.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cabecera Server-Timing en las respuestas (settings.PHOMAGIC_SERVER_TIMING o env)
+SERVER_TIMING_ENV = "PHOMAGIC_SERVER_TIMING"
+
+
+def server_timing_enabled() -> bool:
+    from django.conf import settings
+    value = getattr(settings, "PHOMAGIC_SERVER_TIMING", None)
+    if value is None:
+        value = os.environ.get(SERVER_TIMING_ENV, "0").lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+class Timings:
+    def __init__(self, name: str = "job"):
+        self.name = name
+        self.started = time.perf_counter()
+        self._spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0, **attrs)
+
+    def add(self, stage: str, seconds: float, **attrs):
+        entry = {"stage": stage, "ms": round(seconds * 1000.0, 1), **attrs}
+        with self._lock:
+            self._spans.append(entry)
+        metrics.STAGE_DURATION.observe(seconds, stage=stage)
+        logger.debug("span %s %s", self.name, json.dumps(entry, ensure_ascii=False))
+
+    def spans(self) -> List[Dict]:
+        with self._lock:
+            return list(self._spans)
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000.0, 1)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Agregado por etapa, en el orden en que apareció cada una."""
+        out: Dict[str, Dict] = {}
+        for s in self.spans():
+            agg = out.setdefault(s["stage"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            agg["count"] += 1
+            agg["total_ms"] = round(agg["total_ms"] + s["ms"], 1)
+            agg["max_ms"] = max(agg["max_ms"], s["ms"])
+        return out
+
+    def as_dict(self) -> Dict:
+        return {"total_ms": self.elapsed_ms(), "stages": self.summary()}
+
+    def server_timing(self) -> str:
+        parts = [f"{stage};dur={agg['total_ms']}" for stage, agg in self.summary().items()]
+        parts.append(f"total;dur={self.elapsed_ms()}")
+        return ", ".join(parts)
+
+    def finish(self, outcome: str, **context):
+        """Cierra el job: línea estructurada (JSON) por el LOGGING de settings + métrica de duración."""
+        record = {"name": self.name, "outcome": outcome, **context, **self.as_dict()}
+        logger.info("timings %s", json.dumps(record, ensure_ascii=False))
+        metrics.JOB_DURATION.observe(time.perf_counter() - self.started, source=self.name, outcome=outcome)
+
+
+def span(timings: Optional[Timings], stage: str, **attrs):
+    """timings.span(...) o un contexto vacío si no se está midiendo."""
+    if timings is None:
+        return nullcontext()
+    return timings.span(stage, **attrs)
@@ -4,6 +4,11 @@ from .views import (
     build_job,
     prepare_job,
     generate_job,
+    generate_job_async,
+    job_status,
+    batch_submit,
+    batch_status,
+    batch_resume,
     upload_image,
     ui_upload_page,      # <- NUEVO
     ui_generate_action,  # <- NUEVO
@@ -15,6 +20,11 @@ urlpatterns = [
     path("job/validate/", build_job, name="build_job"),
     path("job/prepare/", prepare_job, name="prepare_job"),
     path("job/generate/", generate_job, name="generate_job"),
+    path("job/submit/", generate_job_async, name="generate_job_async"),
+    path("job/status/<str:job_id>/", job_status, name="job_status"),
+    path("batch/submit/", batch_submit, name="batch_submit"),
+    path("batch/<str:batch_id>/", batch_status, name="batch_status"),
+    path("batch/<str:batch_id>/resume/", batch_resume, name="batch_resume"),
     path("upload/", upload_image, name="upload_image"),
 
     # UI sencilla
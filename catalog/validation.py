@@ -0,0 +1,245 @@
+# catalog/validation.py
+"""
+Validación de peticiones de generación contra el catálogo.
+
+CompiledValidator se construye una vez por snapshot del catálogo
+(catalog_service): por subcategoría guarda las vistas y los tamaños en
+frozensets, y los mensajes de error ya formateados. Validar es entonces
+pertenencia a conjuntos, sin recorrer CATALOG.
+
+- validate(payload) → (ok, err, job), la firma de _validate_and_build_job.
+  Si hay varios problemas, err los lista todos separados por "; ".
+- validate_many(payloads) → [(ok, err, job), ...] para lotes: la parte que
+  depende solo de category/subcategory/views/options se valida una vez por
+  cada combinación de esos mismos objetos (en un lote, los items que no
+  cambian views ni options la comparten).
+"""
+import copy
+import re
+import threading
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from .catalog_service import CatalogSnapshot, get_snapshot
+from .color_transfer import MODES as COLOR_MODES, MODE_GAIN as DEFAULT_COLOR_MODE
+from .encoders import DEFAULT_OUTPUT_FORMAT, validate_output
+from .ingest import upload_rel_path
+from .renditions import FIT_MODES, FIT_STRETCH
+
+HEX_RE = re.compile(r"^#([0-9a-fA-F]{6}|[0-9a-fA-F]{3})$")
+
+# Cajas de post-proceso (reponer logo/etiqueta del original) que pasan tal cual al job.
+# El original (orig_rel_path) no lo elige el cliente: sale de upload_id (uploads/<id>).
+PASSTHROUGH_KEYS = ("logo_box_json", "neck_box_json")
+
+# Lo que valida _check_spec (todo salvo la imagen de entrada)
+SPEC_KEYS = ("category", "subcategory", "views", "options")
+
+ValidationResult = Tuple[bool, Optional[str], Optional[Dict]]
+
+
+def _member(value, allowed) -> bool:
+    """value in allowed, sin romper con valores no hashables (listas/objetos del JSON)."""
+    try:
+        return value in allowed
+    except TypeError:
+        return False
+
+
+class _Entry(NamedTuple):
+    view_ids: FrozenSet[str]
+    sizes: FrozenSet[Tuple[int, int]]
+    views_msg: str
+    sizes_msg: str
+
+
+class CompiledValidator:
+    def __init__(self, snap: CatalogSnapshot):
+        self.snapshot = snap
+        self.version = snap.version
+        self.defaults = snap.defaults()
+        self.entries: Dict[Tuple[str, str], _Entry] = {}
+        for cat in snap.categories():
+            for sub in snap.subcategories(cat):
+                view_ids = snap.view_ids(cat, sub)
+                self.entries[(cat, sub)] = _Entry(
+                    view_ids=view_ids,
+                    sizes=frozenset(snap.sizes(cat, sub)),
+                    views_msg=f"Vistas no válidas. Permitidas: {sorted(view_ids)}",
+                    sizes_msg=f"Tamaño no válido. Usa uno de: {snap.sizes_px(cat, sub)}",
+                )
+        self.fit_modes = frozenset(FIT_MODES)
+        self.color_modes = frozenset(COLOR_MODES)
+        self.fit_msg = f"fit no válido. Usa uno de: {list(FIT_MODES)}"
+        self.color_msg = f"color_match no válido. Usa uno de: {list(COLOR_MODES)}"
+
+    # ---------- API ----------
+
+    def validate(self, payload: dict) -> ValidationResult:
+        errors, spec = self._check_spec(payload)
+        return self._finish(payload, errors, spec)
+
+    def validate_many(self, payloads: List[dict]) -> List[ValidationResult]:
+        # Memo por identidad: los payloads siguen vivos en la lista, así que id() no se reutiliza.
+        # Quien construye el lote comparte los mismos objetos views/options entre items sin cambios.
+        memo: Dict[Tuple[int, ...], Tuple[List[str], Optional[Dict]]] = {}
+        out = []
+        for payload in payloads:
+            key = tuple(id(payload.get(k)) for k in SPEC_KEYS)
+            if key not in memo:
+                memo[key] = self._check_spec(payload)
+            errors, spec = memo[key]
+            out.append(self._finish(payload, list(errors), spec))
+        return out
+
+    # ---------- Partes ----------
+
+    def _check_spec(self, payload: dict) -> Tuple[List[str], Optional[Dict]]:
+        """Errores y, si no hay, {client_options, views_requested} del job."""
+        errors: List[str] = []
+        category = payload.get("category")
+        subcategory = payload.get("subcategory")
+        views_sel = payload.get("views", [])
+        options = payload.get("options", {})
+        if options is None:
+            options = {}
+        if not isinstance(options, dict):
+            return ["options debe ser un objeto"], None
+
+        entry = None
+        if not category or not subcategory:
+            errors.append("Falta category/subcategory")
+        else:
+            key = (category, subcategory)
+            entry = self.entries[key] if _member(key, self.entries) else None
+            if entry is None:
+                errors.append("Category/Subcategory no válidas")
+
+        if entry is not None:
+            if (not views_sel or not isinstance(views_sel, list)
+                    or not all(_member(v, entry.view_ids) for v in views_sel)):
+                errors.append(entry.views_msg)
+
+        fit = options.get("fit") or FIT_STRETCH
+        if not _member(fit, self.fit_modes):
+            errors.append(self.fit_msg)
+
+        # options.sizes (varias renditions de una sola llamada al modelo) o options.size
+        renditions = []
+        requested = options.get("sizes")
+        if requested is None:
+            requested = [options.get("size") or {}]
+        if not isinstance(requested, list) or not requested or not all(isinstance(s, dict) for s in requested):
+            errors.append("sizes debe ser una lista de {width, height}")
+        elif entry is not None:
+            bad_size = bad_fit = False
+            for s in requested:
+                rw, rh = s.get("width"), s.get("height")
+                r_fit = s.get("fit") or fit
+                bad_size = bad_size or not _member((rw, rh), entry.sizes)
+                bad_fit = bad_fit or not _member(r_fit, self.fit_modes)
+                rendition = {"width": rw, "height": rh, "fit": r_fit}
+                if rendition not in renditions:
+                    renditions.append(rendition)
+            if bad_size:
+                errors.append(entry.sizes_msg)
+            if bad_fit and self.fit_msg not in errors:
+                errors.append(self.fit_msg)
+
+        bg_hex = options.get("background_hex") or self.defaults["background_hex"]
+        bg_hex = bg_hex.strip().upper() if isinstance(bg_hex, str) else ""
+        if not HEX_RE.match(bg_hex):
+            errors.append("background_hex debe ser tipo #FFFFFF")
+
+        shadow = options.get("shadow", self.defaults["shadow"])
+        if not isinstance(shadow, dict):
+            errors.append("shadow debe ser un objeto")
+        elif not isinstance(shadow.get("enabled", True), bool):
+            errors.append("shadow.enabled debe ser booleano")
+
+        if not isinstance(options.get("cache", True), bool):
+            errors.append("cache debe ser booleano")
+
+        color_mode = options.get("color_match") or DEFAULT_COLOR_MODE
+        if not _member(color_mode, self.color_modes):
+            errors.append(self.color_msg)
+
+        output_format = options.get("output_format") or DEFAULT_OUTPUT_FORMAT
+        output_quality = options.get("output_quality")
+        try:
+            err = validate_output(output_format, output_quality)
+        except TypeError:
+            err = validate_output(None, None)
+        if err:
+            errors.append(err)
+
+        if errors:
+            return errors, None
+
+        # El tamaño principal (prompt y tamaño del modelo) es el mayor de los pedidos
+        primary = max(renditions, key=lambda r: r["width"] * r["height"])
+        spec = {
+            "client_options": {
+                "size_px": {"width": primary["width"], "height": primary["height"]},
+                "renditions": renditions,
+                "background": {"hex": bg_hex},
+                "shadow": shadow,
+                "logo": bool(options.get("logo", self.defaults["logo"])),
+                "neck_label": bool(options.get("neck_label", self.defaults["neck_label"])),
+                "cache": options.get("cache", True),
+                "color_match": color_mode,
+                "output_format": output_format,
+                "output_quality": output_quality,
+            },
+            "views_requested": [{"id": vid} for vid in views_sel],
+        }
+        return [], spec
+
+    def _finish(self, payload: dict, errors: List[str], spec: Optional[Dict]) -> ValidationResult:
+        image_url = payload.get("image_url", None)
+        upload_id = payload.get("upload_id", None)
+        if not image_url and not upload_id:
+            errors.append("Falta image_url o upload_id")
+        orig_rel_path = upload_rel_path(upload_id) if upload_id else None
+        if upload_id and orig_rel_path is None:
+            errors.append("upload_id no válido")
+        if errors:
+            return False, "; ".join(errors), None
+
+        # Copia propia por job (en lotes el spec se comparte); sin deepcopy, que aquí es lo más caro
+        opts = spec["client_options"]
+        job = {
+            "category": payload["category"],
+            "subcategory": payload["subcategory"],
+            "image": {"image_url": image_url, "upload_id": upload_id},
+            "client_options": {
+                **opts,
+                "size_px": dict(opts["size_px"]),
+                "renditions": [dict(r) for r in opts["renditions"]],
+                "background": dict(opts["background"]),
+                "shadow": copy.deepcopy(opts["shadow"]),
+            },
+            "views_requested": [dict(v) for v in spec["views_requested"]],
+        }
+        for key in PASSTHROUGH_KEYS:
+            if isinstance(payload.get(key), str) and payload[key]:
+                job[key] = payload[key]
+        if orig_rel_path:
+            job["orig_rel_path"] = orig_rel_path
+        return True, None, job
+
+
+_lock = threading.Lock()
+_compiled: Optional[CompiledValidator] = None
+
+
+def get_validator() -> CompiledValidator:
+    """Validador del snapshot vigente; se recompila solo cuando cambia el catálogo."""
+    global _compiled
+    snap = get_snapshot()
+    compiled = _compiled
+    if compiled is not None and compiled.snapshot is snap:
+        return compiled
+    with _lock:
+        if _compiled is None or _compiled.snapshot is not snap:
+            _compiled = CompiledValidator(snap)
+        return _compiled
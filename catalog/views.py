@@ -1,84 +1,72 @@
 # catalog/views.py
-import json, re, os, uuid, io, base64
+import json, os, uuid, io, base64, threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
 from typing import Tuple, Optional, Dict, List
 
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.urls import reverse
 from django.conf import settings
+from django.utils.html import escape
+from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
 
-from PIL import Image, ImageFilter, ImageStat
+import numpy as np
+from PIL import Image, ImageOps
 
-from .catalog_config import CATALOG, DEFAULTS
+from .catalog_service import get_snapshot
+from .models import GenerationBatch, GenerationJob
 from .prompt_builder import build_prompts
 from .generate_service import generate_views_from_job
-
-HEX_RE = re.compile(r"^#([0-9a-fA-F]{6}|[0-9a-fA-F]{3})$")
+from .timing import Timings, server_timing_enabled, span
+from .encoders import DEFAULT_OUTPUT_FORMAT, encode as encode_image
+from .renditions import FIT_STRETCH, render_all
+from .validation import get_validator
+from .ingest import ingest_upload, is_upload_path, EXIF_ORIENTATION
+from .color_transfer import match_color, MODE_GAIN as DEFAULT_COLOR_MODE
+from . import jobs
+from . import batch as batch_service
+from .precomputed import PrecomputedResponse
+
+# /api/catalog/: Cache-Control max-age (0 = revalidar siempre con If-None-Match → 304)
+CATALOG_MAX_AGE = int(os.environ.get("PHOMAGIC_CATALOG_MAX_AGE", "0"))
+
+_catalog_cache: Tuple = (None, None)  # (snapshot, PrecomputedResponse)
+_catalog_cache_lock = threading.Lock()
+
+
+def _catalog_response() -> PrecomputedResponse:
+    """Cuerpo JSON (y gzip/br) serializado una vez por versión del catálogo."""
+    global _catalog_cache
+    snap = get_snapshot()
+    cached_snap, cached = _catalog_cache
+    if cached_snap is snap:
+        return cached
+    with _catalog_cache_lock:
+        if _catalog_cache[0] is not snap:
+            data = {
+                **snap.to_dict(),
+                "version": snap.version,
+                "notes": {
+                    "color_input": "Acepta códigos HEX (#ffffff) estilo Photoshop.",
+                    "shadow": "Preset tipo Photoshop (Multiplicar, 43%, 90°, 18px, 0%, 21px).",
+                }
+            }
+            body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode("utf-8")
+            _catalog_cache = (snap, PrecomputedResponse(body, "application/json", max_age=CATALOG_MAX_AGE))
+        return _catalog_cache[1]
 
 
 def get_catalog(request):
-    data = {
-        "catalog": CATALOG,
-        "defaults": DEFAULTS,
-        "notes": {
-            "color_input": "Acepta códigos HEX (#ffffff) estilo Photoshop.",
-            "shadow": "Preset tipo Photoshop (Multiplicar, 43%, 90°, 18px, 0%, 21px).",
-        }
-    }
-    return JsonResponse(data, json_dumps_params={"ensure_ascii": False})
+    return _catalog_response().respond(request)
 
 
 def _validate_and_build_job(payload: dict):
-    category    = payload.get("category")
-    subcategory = payload.get("subcategory")
-    views_sel   = payload.get("views", [])
-    options     = payload.get("options", {})
-    image_url   = payload.get("image_url", None)
-    upload_id   = payload.get("upload_id", None)
-
-    if not category or not subcategory:
-        return False, "Falta category/subcategory", None
-    if category not in CATALOG or subcategory not in CATALOG[category]:
-        return False, "Category/Subcategory no válidas", None
-
-    valid_views = {v["id"] for v in CATALOG[category][subcategory]["views"]}
-    if not views_sel or not set(views_sel).issubset(valid_views):
-        return False, f"Vistas no válidas. Permitidas: {sorted(valid_views)}", None
-
-    sizes = CATALOG[category][subcategory]["sizes_px"]
-    size = options.get("size") or {}
-    w, h = size.get("width"), size.get("height")
-    if not any((s["width"] == w and s["height"] == h) for s in sizes):
-        return False, f"Tamaño no válido. Usa uno de: {sizes}", None
-
-    bg_hex = (options.get("background_hex") or DEFAULTS["background_hex"]).strip().upper()
-    if not HEX_RE.match(bg_hex):
-        return False, "background_hex debe ser tipo #FFFFFF", None
-
-    shadow = options.get("shadow", DEFAULTS["shadow"])
-    if not isinstance(shadow.get("enabled", True), bool):
-        return False, "shadow.enabled debe ser booleano", None
-
-    logo = bool(options.get("logo", DEFAULTS["logo"]))
-    neck_label = bool(options.get("neck_label", DEFAULTS["neck_label"]))
-
-    if not image_url and not upload_id:
-        return False, "Falta image_url o upload_id", None
-
-    job = {
-        "category": category,
-        "subcategory": subcategory,
-        "image": {"image_url": image_url, "upload_id": upload_id},
-        "client_options": {
-            "size_px": {"width": w, "height": h},
-            "background": {"hex": bg_hex},
-            "shadow": shadow,
-            "logo": logo,
-            "neck_label": neck_label
-        },
-        "views_requested": [{"id": vid} for vid in views_sel]
-    }
-    return True, None, job
+    """(ok, err, job) con el validador compilado del catálogo vigente (ver catalog.validation)."""
+    return get_validator().validate(payload)
 
 
 # ---------- Utilidades de guardado/post-proceso ----------
@@ -111,60 +99,76 @@ def _parse_box(s: Optional[str]) -> Optional[Dict]:
 def _save_b64_as_png_with_bg_and_resize(
     b64_str: str,
     bg_hex: str,
-    target_w: int,
-    target_h: int,
+    target_w: Optional[int],
+    target_h: Optional[int],
     prefix: str,
+    timings: Optional[Timings] = None,
 ) -> Image.Image:
     """
     Decodifica base64 -> PIL.Image, compone sobre fondo HEX exacto,
     redimensiona a (target_w, target_h) y devuelve la PIL.Image resultante.
-    """
-    raw = base64.b64decode(b64_str)
-    img = Image.open(io.BytesIO(raw))
+    Con target_w/target_h None se queda al tamaño del modelo (lienzo para renditions).
 
-    # Fondo exacto
-    bg_rgb = _hex_to_rgb(bg_hex)
-    canvas = Image.new("RGB", (img.width, img.height), bg_rgb)
-
-    # Componer sobre fondo (respetando alfa)
-    if img.mode in ("RGBA", "LA"):
-        canvas.paste(img.convert("RGBA"), (0, 0), img.convert("RGBA"))
-    else:
-        canvas.paste(img.convert("RGB"), (0, 0))
-
-    # Redimensionar al tamaño solicitado por el cliente
-    if (canvas.width, canvas.height) != (target_w, target_h):
-        canvas = canvas.resize((target_w, target_h), Image.LANCZOS)
-
-    return canvas
-
-
-def _match_color_to_region(src_rgb: Image.Image, dst_region_rgb: Image.Image) -> Image.Image:
+    Un solo decode y una sola conversión a RGBA; si hay que reducir, se
+    redimensiona ANTES de componer (menos píxeles que mezclar y ninguna copia
+    extra a resolución completa). Pillow reescala RGBA con alfa premultiplicado,
+    así que los bordes no se ensucian con el color de los píxeles transparentes.
+    """
+    with span(timings, "decode", view=prefix):
+        img = Image.open(io.BytesIO(base64.b64decode(b64_str)))
+        img.load()
+    with span(timings, "composite", view=prefix):
+        if not (target_w and target_h):
+            target_w, target_h = img.size
+        target = (target_w, target_h)
+        downscale = target_w * target_h < img.width * img.height
+
+        # Sin alfa: el fondo no se ve, basta con pasar a RGB y redimensionar
+        if img.mode not in ("RGBA", "LA"):
+            rgb = img if img.mode == "RGB" else img.convert("RGB")
+            return rgb.resize(target, Image.LANCZOS) if rgb.size != target else rgb
+
+        rgba = img if img.mode == "RGBA" else img.convert("RGBA")
+        if downscale:
+            rgba = rgba.resize(target, Image.LANCZOS)
+
+        # Fondo exacto + composición respetando alfa (la propia imagen hace de máscara)
+        canvas = Image.new("RGB", rgba.size, _hex_to_rgb(bg_hex))
+        canvas.paste(rgba, (0, 0), rgba)
+
+        if canvas.size != target:
+            canvas = canvas.resize(target, Image.LANCZOS)
+        return canvas
+
+
+def _match_color_to_region(src_rgb: Image.Image, dst_region_rgb: Image.Image, mode: str = "gain") -> Image.Image:
     """
-    Igualado simple de color por canal:
+    Igualado de color del recorte a la región destino (ver catalog.color_transfer).
+    Por defecto, ganancia simple por canal:
       gain_c = mean_dst_c / mean_src_c
       out_c = clamp(src_c * gain_c)
     """
-    src = src_rgb.convert("RGB")
-    dst = dst_region_rgb.convert("RGB")
+    return match_color(src_rgb, dst_region_rgb, mode=mode)
+
 
-    src_stat = ImageStat.Stat(src)
-    dst_stat = ImageStat.Stat(dst)
-    s_means = src_stat.mean  # [R,G,B]
-    d_means = dst_stat.mean
+FEATHER_MASK_CACHE_SIZE = 64
 
-    bands = src.split()
-    adj_bands: List[Image.Image] = []
-    for i, band in enumerate(bands):
-        sm = max(1.0, s_means[i])
-        dm = max(1.0, d_means[i])
-        gain = dm / sm
 
-        # tabla rápida de 0..255
-        lut = [min(255, max(0, int(round(v * gain)))) for v in range(256)]
-        adj_bands.append(band.point(lut))
+@lru_cache(maxsize=FEATHER_MASK_CACHE_SIZE)
+def _feather_mask(w: int, h: int, feather: int) -> Image.Image:
+    """
+    Máscara "L" de w×h que sube de 0 a 255 en los `feather` px de cada borde.
+    Distancia al borde con dos rampas separables (fila y columna) combinadas
+    con min(), sin blur 2D. Memoizada por (w, h, feather): el mismo recorte
+    pegado en varias vistas reutiliza la misma máscara (solo lectura).
+    """
+    def ramp(n: int) -> np.ndarray:
+        i = np.arange(n, dtype=np.float32)
+        dist = np.minimum(i + 1, n - i)  # 1 en el borde
+        return np.clip(dist / (feather + 1), 0.0, 1.0)
 
-    return Image.merge("RGB", tuple(adj_bands))
+    mask = np.minimum.outer(ramp(h), ramp(w))
+    return Image.fromarray(np.rint(mask * 255).astype(np.uint8), "L")
 
 
 def _paste_with_feather(
@@ -176,11 +180,68 @@ def _paste_with_feather(
     """
     Pega con máscara de borde suavizado (feather).
     """
+    if feather <= 0:
+        base_img.paste(crop_rgb, xy)
+        return
     cw, ch = crop_rgb.size
-    mask = Image.new("L", (cw, ch), 255)
-    if feather > 0:
-        mask = mask.filter(ImageFilter.GaussianBlur(radius=feather))
-    base_img.paste(crop_rgb, xy, mask)
+    base_img.paste(crop_rgb, xy, _feather_mask(cw, ch, feather))
+
+
+# Originales ya decodificados: {orig_rel_path: {"size": (w, h), "crops": {(x, y, w, h): Image RGB}}}
+# Solo se guardan los recortes (a resolución de origen), no la imagen completa,
+# así que cada entrada ocupa pocos KB aunque el original sea de 12 MP.
+ORIGINALS_CACHE_SIZE = 8
+_originals: "OrderedDict[str, Dict]" = OrderedDict()
+_originals_lock = threading.Lock()
+
+
+def _box_key(b: Dict) -> Tuple[int, int, int, int, int, int]:
+    return (int(b["x"]), int(b["y"]), int(b["w"]), int(b["h"]),
+            int(b.get("img_w") or 0), int(b.get("img_h") or 0))
+
+
+def _get_original_regions(orig_rel_path: str, boxes: List[Dict]) -> Dict:
+    """
+    Tamaño del original y recortes de `boxes`, decodificando el original una sola
+    vez para todas las vistas del job (LRU pequeña por ruta; las subidas tienen
+    nombre único, así que la ruta identifica el contenido). Solo lee de uploads/.
+    """
+    if not is_upload_path(orig_rel_path):
+        raise ValueError("El original debe ser una subida (uploads/<upload_id>)")
+    keys = [_box_key(b) for b in boxes]
+    with _originals_lock:
+        entry = _originals.get(orig_rel_path)
+        if entry is not None:
+            _originals.move_to_end(orig_rel_path)
+            if all(k in entry["crops"] for k in keys):
+                return entry
+
+    with default_storage.open(orig_rel_path, "rb") as fh:
+        orig = Image.open(fh)
+        orig.load()
+    # Las cajas se dibujan sobre el preview del navegador, que ya aplica la orientación EXIF
+    if orig.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        orig = ImageOps.exif_transpose(orig)
+
+    crops = dict(entry["crops"]) if entry else {}
+    for k in keys:
+        if k not in crops:
+            x, y, w, h, img_w, img_h = k
+            # Caja en coordenadas de la imagen que vio el cliente (img_w × img_h);
+            # si el original se redujo al subirlo, se reescala al tamaño guardado
+            kx = orig.width / img_w if img_w else 1.0
+            ky = orig.height / img_h if img_h else 1.0
+            crops[k] = orig.crop((round(x * kx), round(y * ky),
+                                  round((x + w) * kx), round((y + h) * ky))).convert("RGB")
+    entry = {"size": orig.size, "crops": crops}
+    del orig
+
+    with _originals_lock:
+        _originals[orig_rel_path] = entry
+        _originals.move_to_end(orig_rel_path)
+        while len(_originals) > ORIGINALS_CACHE_SIZE:
+            _originals.popitem(last=False)
+    return entry
 
 
 def _paste_original_regions(
@@ -190,64 +251,167 @@ def _paste_original_regions(
     neck_box: Optional[Dict],
     feather: int = 4,
     do_color_match: bool = True,
+    color_mode: str = "gain",
+    timings: Optional[Timings] = None,
 ):
     """
     Pega los recortes EXACTOS del original (logo/etiqueta) sobre la imagen final,
     mapeando coordenadas de la imagen original -> tamaño final con:
-    - igualado de color a la región destino
+    - igualado de color a la región destino (color_mode: gain | reinhard | histogram)
     - máscara feather para que no se note la junta
     """
     if not (logo_box or neck_box):
         return
+    with span(timings, "region_paste"):
+        # Original decodificado una vez por job; aquí solo llegan los recortes
+        regions = _get_original_regions(orig_rel_path, [b for b in (logo_box, neck_box) if b])
+        orig_w, orig_h = regions["size"]
+
+        def paste_box(b: Dict):
+            x, y, w, h = b["x"], b["y"], b["w"], b["h"]
+            crop = regions["crops"][_box_key(b)]  # recorte original
+
+            # Escala del espacio de coordenadas de la caja → imagen final
+            sx = final_img.width / max(1, b.get("img_w") or orig_w)
+            sy = final_img.height / max(1, b.get("img_h") or orig_h)
+
+            # Escalamos recorte al tamaño final correspondiente
+            tw, th = max(1, int(round(w * sx))), max(1, int(round(h * sy)))
+            crop_resized = crop.resize((tw, th), Image.LANCZOS)
+
+            # Coordenadas destino en la imagen final
+            xf, yf = int(round(x * sx)), int(round(y * sy))
+
+            # Igualado de color al entorno destino (misma región del final)
+            if do_color_match:
+                # Recorta zona destino (limitando a los bordes)
+                x2, y2 = min(final_img.width, xf + tw), min(final_img.height, yf + th)
+                x1, y1 = max(0, xf), max(0, yf)
+                if x2 > x1 and y2 > y1:
+                    dst_region = final_img.crop((x1, y1, x2, y2)).convert("RGB")
+                    # si el recorte sale de imagen, ajustamos también el source
+                    if (x1, y1) != (xf, yf) or (x2 - x1, y2 - y1) != (tw, th):
+                        nx = 0 if x1 == xf else (xf - x1)
+                        ny = 0 if y1 == yf else (yf - y1)
+                        crop_resized = crop_resized.crop((nx, ny, nx + dst_region.width, ny + dst_region.height))
+                    crop_resized = _match_color_to_region(crop_resized, dst_region, mode=color_mode)
+
+            # Pegar con feather
+            _paste_with_feather(final_img, crop_resized, (xf, yf), feather=feather)
+
+        if logo_box:
+            paste_box(logo_box)
+        if neck_box:
+            paste_box(neck_box)
+
+
+def _save_final_image(
+    img: Image.Image,
+    prefix: str,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    quality: Optional[int] = None,
+    timings: Optional[Timings] = None,
+) -> str:
+    """Codifica según output_format (ver catalog.encoders) y guarda en outputs/. Devuelve la ruta relativa."""
+    with span(timings, "encode", view=prefix, format=output_format):
+        data, ext = encode_image(img, output_format, quality)
+    rel_path = f"outputs/{prefix}.{ext}"
+    with span(timings, "storage_save", view=prefix):
+        return default_storage.save(rel_path, ContentFile(data))
+
+
+def _run_generation(job: Dict, timings: Optional[Timings] = None) -> List[Dict]:
+    """
+    Genera las vistas del job y las post-procesa (fondo, tamaño, recortes originales).
+    Devuelve por vista: { view_id, model_size, image_path, cached } o { view_id, model_size, error }.
+    image_path es relativo a MEDIA_ROOT; la URL absoluta la construye quien tenga la request.
+    Con varias renditions (o fit distinto de "stretch") la vista se compone una sola vez
+    a resolución del modelo y se añade "renditions": [{width, height, fit, image_path}];
+    image_path es entonces la del tamaño principal (size_px).
+    Lanza excepción si fallan todas las vistas (ver generate_views_from_job).
+    """
+    results = generate_views_from_job(job, timings)
+
+    w = job["client_options"]["size_px"]["width"]
+    h = job["client_options"]["size_px"]["height"]
+    bg_hex = job["client_options"]["background"]["hex"]
+
+    logo_box = _parse_box(job.get("logo_box_json"))
+    neck_box = _parse_box(job.get("neck_box_json"))
+    orig_rel = job.get("orig_rel_path")
+    color_mode = job["client_options"].get("color_match", DEFAULT_COLOR_MODE)
+    output_format = job["client_options"].get("output_format", DEFAULT_OUTPUT_FORMAT)
+    output_quality = job["client_options"].get("output_quality")
+    renditions = job["client_options"].get("renditions") or [{"width": w, "height": h, "fit": FIT_STRETCH}]
+    single = len(renditions) == 1 and renditions[0]["fit"] == FIT_STRETCH
+
+    saved_results = []
+    batch_id = uuid.uuid4().hex[:8]
+    for r in results:
+        if r.get("error"):
+            saved_results.append({
+                "view_id": r["view_id"],
+                "model_size": r["model_size"],
+                "error": r["error"],
+            })
+            continue
+
+        prefix = f"{batch_id}_{r['view_id']}"
+        if single:
+            composed = _save_b64_as_png_with_bg_and_resize(r["image_b64"], bg_hex, w, h, prefix, timings)
+        else:
+            # Lienzo a resolución del modelo: decode, fondo y recortes una sola vez para todos los tamaños
+            composed = _save_b64_as_png_with_bg_and_resize(r["image_b64"], bg_hex, None, None, prefix, timings)
+
+        if orig_rel and (logo_box or neck_box):
+            _paste_original_regions(composed, orig_rel, logo_box, neck_box, feather=5, do_color_match=True,
+                                    color_mode=color_mode, timings=timings)
+
+        if single:
+            rel_out = _save_final_image(composed, prefix, output_format, output_quality, timings)
+            saved_results.append({
+                "view_id": r["view_id"],
+                "model_size": r["model_size"],
+                "image_path": rel_out,
+                "cached": r.get("cached", False),
+            })
+            continue
+
+        with span(timings, "render", view=prefix, count=len(renditions)):
+            images = render_all(composed, renditions, _hex_to_rgb(bg_hex))
+        saved = []
+        for rend, img in zip(renditions, images):
+            rel = _save_final_image(img, f"{prefix}_{rend['width']}x{rend['height']}_{rend['fit']}",
+                                    output_format, output_quality, timings)
+            saved.append({**rend, "image_path": rel})
+        primary = next((s for s in saved if s["width"] == w and s["height"] == h), saved[0])
+        saved_results.append({
+            "view_id": r["view_id"],
+            "model_size": r["model_size"],
+            "image_path": primary["image_path"],
+            "renditions": saved,
+            "cached": r.get("cached", False),
+        })
+    return saved_results
 
-    with default_storage.open(orig_rel_path, "rb") as fh:
-        orig = Image.open(io.BytesIO(fh.read())).convert("RGB")
-    orig_w, orig_h = orig.size
-
-    sx = final_img.width / max(1, orig_w)
-    sy = final_img.height / max(1, orig_h)
-
-    def paste_box(b: Dict):
-        x, y, w, h = b["x"], b["y"], b["w"], b["h"]
-        crop = orig.crop((x, y, x + w, y + h))  # recorte original
-
-        # Escalamos recorte al tamaño final correspondiente
-        tw, th = max(1, int(round(w * sx))), max(1, int(round(h * sy)))
-        crop_resized = crop.resize((tw, th), Image.LANCZOS)
-
-        # Coordenadas destino en la imagen final
-        xf, yf = int(round(x * sx)), int(round(y * sy))
-
-        # Igualado de color al entorno destino (misma región del final)
-        if do_color_match:
-            # Recorta zona destino (limitando a los bordes)
-            x2, y2 = min(final_img.width, xf + tw), min(final_img.height, yf + th)
-            x1, y1 = max(0, xf), max(0, yf)
-            if x2 > x1 and y2 > y1:
-                dst_region = final_img.crop((x1, y1, x2, y2)).convert("RGB")
-                # si el recorte sale de imagen, ajustamos también el source
-                if (x1, y1) != (xf, yf) or (x2 - x1, y2 - y1) != (tw, th):
-                    nx = 0 if x1 == xf else (xf - x1)
-                    ny = 0 if y1 == yf else (yf - y1)
-                    crop_resized = crop_resized.crop((nx, ny, nx + dst_region.width, ny + dst_region.height))
-                crop_resized = _match_color_to_region(crop_resized, dst_region)
-
-        # Pegar con feather
-        _paste_with_feather(final_img, crop_resized, (xf, yf), feather=feather)
-
-    if logo_box:
-        paste_box(logo_box)
-    if neck_box:
-        paste_box(neck_box)
-
-
-def _save_final_png(img: Image.Image, prefix: str) -> str:
-    rel_path = os.path.join("outputs", f"{prefix}.png").replace("\\", "/")
-    with io.BytesIO() as buf:
-        img.save(buf, format="PNG")
-        buf.seek(0)
-        default_storage.save(rel_path, buf)
-    return rel_path
+
+def _with_server_timing(resp: HttpResponse, timings: Timings) -> HttpResponse:
+    if server_timing_enabled():
+        resp["Server-Timing"] = timings.server_timing()
+    return resp
+
+
+def _with_urls(request, saved_results: List[Dict]) -> List[Dict]:
+    out = []
+    for r in saved_results:
+        r = dict(r)
+        rel = r.pop("image_path", None)
+        if rel:
+            r["image_url"] = request.build_absolute_uri(settings.MEDIA_URL + rel)
+        if r.get("renditions"):
+            r["renditions"] = _with_urls(request, r["renditions"])
+        out.append(r)
+    return out
 
 
 @csrf_exempt
@@ -291,8 +455,8 @@ def prepare_job(request):
 def generate_job(request):
     """
     Genera imagen(es) por cada vista y guarda PNGs ya con fondo HEX exacto.
-    Si se proporcionan logo_box_json / neck_box_json y orig_rel_path,
-    repone esas zonas con el recorte original (con color match + feather).
+    Si se proporcionan logo_box_json / neck_box_json y la imagen llega por
+    upload_id, repone esas zonas con el recorte original (con color match + feather).
     """
     if request.method != "POST":
         return HttpResponseBadRequest("POST only")
@@ -305,42 +469,181 @@ def generate_job(request):
     if not ok:
         return HttpResponseBadRequest(err)
 
+    timings = Timings("generate_job")
     try:
-        results = generate_views_from_job(job)
+        saved_results = _run_generation(job, timings)
     except Exception as e:
-        return HttpResponseBadRequest(f"Fallo al generar imágenes: {e}")
+        timings.finish("failed")
+        return _with_server_timing(HttpResponseBadRequest(f"Fallo al generar imágenes: {e}"), timings)
+    timings.finish("ok", views=len(saved_results))
 
-    w = job["client_options"]["size_px"]["width"]
-    h = job["client_options"]["size_px"]["height"]
-    bg_hex = job["client_options"]["background"]["hex"]
+    return _with_server_timing(JsonResponse(
+        {"ok": True, "job": job, "results": _with_urls(request, saved_results), "timings": timings.as_dict()},
+        json_dumps_params={"ensure_ascii": False, "indent": 2}
+    ), timings)
 
-    logo_box = _parse_box(job.get("logo_box_json"))
-    neck_box = _parse_box(job.get("neck_box_json"))
-    orig_rel = job.get("orig_rel_path")
 
-    saved_results = []
-    batch_id = uuid.uuid4().hex[:8]
-    for r in results:
-        prefix = f"{batch_id}_{r['view_id']}"
-        composed = _save_b64_as_png_with_bg_and_resize(r["image_b64"], bg_hex, w, h, prefix)
+@csrf_exempt
+def generate_job_async(request):
+    """
+    Igual que generate_job pero sin esperar: persiste el job, responde 202 con
+    su id y la URL de estado. El trabajo lo hace catalog.jobs (hilo o worker BD).
+    """
+    if request.method != "POST":
+        return HttpResponseBadRequest("POST only")
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return HttpResponseBadRequest("JSON inválido")
 
-        if orig_rel and (logo_box or neck_box):
-            _paste_original_regions(composed, orig_rel, logo_box, neck_box, feather=5, do_color_match=True)
+    ok, err, job = _validate_and_build_job(payload)
+    if not ok:
+        return HttpResponseBadRequest(err)
 
-        rel_out = _save_final_png(composed, prefix)
-        url = request.build_absolute_uri(settings.MEDIA_URL + rel_out)
-        saved_results.append({
-            "view_id": r["view_id"],
-            "model_size": r["model_size"],
-            "image_url": url,
-        })
+    row = jobs.submit_job(job)
+    return JsonResponse(
+        {
+            "ok": True,
+            "job_id": row.id,
+            "status": row.status,
+            "status_url": request.build_absolute_uri(reverse("job_status", args=[row.id])),
+        },
+        status=202,
+        json_dumps_params={"ensure_ascii": False, "indent": 2}
+    )
+
+
+def job_status(request, job_id):
+    """
+    Estado/resultado de un job asíncrono: pending | running | done | failed.
+    """
+    row = GenerationJob.objects.filter(id=job_id).first()
+    if row is None:
+        return JsonResponse({"ok": False, "error": "Job no encontrado"}, status=404)
+
+    data = {
+        "ok": row.status != GenerationJob.STATUS_FAILED,
+        "job_id": row.id,
+        "status": row.status,
+        "created_at": row.created_at.isoformat(),
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+    }
+    if row.status == GenerationJob.STATUS_DONE:
+        data["results"] = _with_urls(request, row.results or [])
+    elif row.status == GenerationJob.STATUS_FAILED:
+        data["error"] = row.error
+    return JsonResponse(data, json_dumps_params={"ensure_ascii": False, "indent": 2})
+
+
+# ---------- Lotes (manifiesto de N imágenes con opciones comunes) ----------
+
+def _batch_item(request, row: GenerationJob) -> Dict:
+    data = batch_service.item_event(row)
+    if "results" in data:
+        data["results"] = _with_urls(request, data["results"])
+    return data
 
+
+@csrf_exempt
+def batch_submit(request):
+    """
+    Crea un lote (ver catalog.batch) y responde 202 al momento.
+    Si algún item no es válido no se crea nada y el 400 los lista todos.
+    """
+    if request.method != "POST":
+        return HttpResponseBadRequest("POST only")
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return HttpResponseBadRequest("JSON inválido")
+
+    ok, err, built = batch_service.build_batch_jobs(payload)
+    if not ok:
+        return HttpResponseBadRequest(err)
+
+    batch = batch_service.submit_batch(payload, built)
     return JsonResponse(
-        {"ok": True, "job": job, "results": saved_results},
+        {
+            "ok": True,
+            "batch_id": batch.id,
+            "total": batch.total,
+            "status_url": request.build_absolute_uri(reverse("batch_status", args=[batch.id])),
+        },
+        status=202,
         json_dumps_params={"ensure_ascii": False, "indent": 2}
     )
 
 
+def batch_status(request, batch_id):
+    """
+    Contadores del lote y estado de cada item en orden de manifiesto.
+    Con ?since=<cursor> responde al momento solo con los items terminados
+    después del cursor (vacío = desde el principio), en orden de finalización:
+    el cliente repite con "next" hasta progress.complete y more=false.
+    """
+    batch = GenerationBatch.objects.filter(id=batch_id).first()
+    if batch is None:
+        return JsonResponse({"ok": False, "error": "Lote no encontrado"}, status=404)
+
+    # Contadores antes que items: si ya estaba completo, los items lo reflejan todo
+    progress = batch_service.batch_counts(batch)
+    data = {
+        "ok": True,
+        "batch_id": batch.id,
+        "created_at": batch.created_at.isoformat(),
+        "progress": progress,
+    }
+
+    if "since" in request.GET:
+        since = request.GET["since"]
+        try:
+            cursor = batch_service.parse_cursor(since) if since else None
+        except ValueError:
+            return HttpResponseBadRequest("since no válido (usa el valor de \"next\")")
+        rows = batch_service.finished_since(batch, cursor)
+        data["items"] = [_batch_item(request, row) for row in rows]
+        data["next"] = batch_service.make_cursor(rows[-1]) if rows else since
+        data["more"] = len(rows) >= batch_service.PAGE_SIZE
+    else:
+        rows = list(GenerationJob.objects.filter(batch=batch).order_by("seq"))
+        data["items"] = [_batch_item(request, row) for row in rows]
+        finished = [r for r in rows if r.status in batch_service.TERMINAL and r.finish_seq is not None]
+        last = max(finished, key=lambda r: r.finish_seq, default=None)
+        data["next"] = batch_service.make_cursor(last) if last else ""
+    return JsonResponse(data, json_dumps_params={"ensure_ascii": False, "indent": 2})
+
+
+@csrf_exempt
+def batch_resume(request, batch_id):
+    """
+    Re-encola los items fallidos del lote y relanza los pendientes.
+    Body opcional: { "partial": true, "stale_minutes": 30 }
+    """
+    if request.method != "POST":
+        return HttpResponseBadRequest("POST only")
+    batch = GenerationBatch.objects.filter(id=batch_id).first()
+    if batch is None:
+        return JsonResponse({"ok": False, "error": "Lote no encontrado"}, status=404)
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return HttpResponseBadRequest("JSON inválido")
+
+    stale = payload.get("stale_minutes")
+    if stale is not None and (not isinstance(stale, int) or stale < 0):
+        return HttpResponseBadRequest("stale_minutes debe ser un entero >= 0")
+
+    info = batch_service.resume_batch(
+        batch,
+        partial=bool(payload.get("partial", False)),
+        stale_after=timedelta(minutes=stale) if stale is not None else None,
+    )
+    return JsonResponse({"ok": True, "batch_id": batch.id, **info,
+                         "progress": batch_service.batch_counts(batch)},
+                        json_dumps_params={"ensure_ascii": False, "indent": 2})
+
+
 @csrf_exempt
 def upload_image(request):
     if request.method != "POST":
@@ -350,17 +653,12 @@ def upload_image(request):
     if not f:
         return HttpResponseBadRequest("Falta el campo 'image' en el formulario")
 
-    ext = os.path.splitext(f.name)[1].lower()
-    if ext not in (".jpg", ".jpeg", ".png", ".webp"):
-        ext = ".jpg"
-
-    fname = f"{uuid.uuid4().hex}{ext}"
-    rel_path = os.path.join("uploads", fname).replace("\\", "/")
-
-    saved_path = default_storage.save(rel_path, f)
-    file_url = request.build_absolute_uri(settings.MEDIA_URL + saved_path)
+    ok, err, meta = ingest_upload(f)
+    if not ok:
+        return HttpResponseBadRequest(err)
+    file_url = request.build_absolute_uri(settings.MEDIA_URL + meta["rel_path"])
 
-    return JsonResponse({"ok": True, "url": file_url},
+    return JsonResponse({"ok": True, "url": file_url, "upload_id": meta["upload_id"], "meta": meta},
                         json_dumps_params={"ensure_ascii": False, "indent": 2})
 
 
@@ -591,6 +889,57 @@ a.dl{display:inline-block;margin-top:6px;font-size:12px}
     if(boxLogo){ logoBoxInput.value = JSON.stringify(relToNatural(boxLogo)); }
     if(boxNeck){ neckBoxInput.value = JSON.stringify(relToNatural(boxNeck)); }
   });
+
+  // Resultado del job: se consulta job_status hasta que termina (done | failed)
+  const jobBox = document.getElementById('jobResults');
+  if (jobBox){
+    const POLL_MS = 2000;
+    const statusUrl = jobBox.dataset.statusUrl;
+    const sizeLabel = jobBox.dataset.size;
+    const msg = jobBox.querySelector('.small');
+
+    function tile(r){
+      const fig = document.createElement('figure');
+      const cap = document.createElement('figcaption');
+      cap.className = 'small';
+      if (r.error){
+        cap.textContent = 'Vista: ' + r.view_id + ' · Fallo: ' + r.error;
+      } else {
+        const im = document.createElement('img');
+        im.src = r.image_url;
+        im.alt = 'Vista: ' + r.view_id + ' · ' + sizeLabel;
+        fig.appendChild(im);
+        cap.textContent = im.alt + ' · ';
+        const a = document.createElement('a');
+        a.className = 'dl'; a.href = r.image_url; a.download = ''; a.textContent = 'Descargar';
+        cap.appendChild(a);
+      }
+      fig.appendChild(cap);
+      return fig;
+    }
+
+    function poll(){
+      fetch(statusUrl, {headers: {'Accept': 'application/json'}})
+        .then(resp => resp.json())
+        .then(data => {
+          if (data.status === 'done'){
+            const grid = document.createElement('div');
+            grid.className = 'imgbox';
+            (data.results || []).forEach(r => grid.appendChild(tile(r)));
+            msg.textContent = '';
+            jobBox.appendChild(grid);
+          } else if (data.status === 'failed'){
+            msg.textContent = 'Fallo al generar: ' + (data.error || '');
+          } else if (!data.status){
+            msg.textContent = 'Error: ' + (data.error || 'job no encontrado');
+          } else {
+            setTimeout(poll, POLL_MS);
+          }
+        })
+        .catch(() => setTimeout(poll, POLL_MS * 2));
+    }
+    poll();
+  }
 })();
 </script>
 </body>
@@ -614,14 +963,12 @@ def ui_generate_action(request):
     if not f:
         return _render_html("<p class='small'>Falta la imagen.</p>")
 
-    # Guardar imagen subida
-    ext = os.path.splitext(f.name)[1].lower()
-    if ext not in (".jpg", ".jpeg", ".png", ".webp"):
-        ext = ".jpg"
-    fname = f"{uuid.uuid4().hex}{ext}"
-    rel_path = os.path.join("uploads", fname).replace("\\", "/")
-    saved_path = default_storage.save(rel_path, f)
-    image_url = request.build_absolute_uri(settings.MEDIA_URL + saved_path)
+    # Guardar imagen subida (formato real, tamaño acotado)
+    ok, err, meta = ingest_upload(f)
+    if not ok:
+        return _render_html(f"<p class='small'>Error: {err}</p>")
+    rel_path = meta["rel_path"]
+    image_url = request.build_absolute_uri(settings.MEDIA_URL + rel_path)
 
     # Leer opciones
     category = request.POST.get("category", "Moda")
@@ -659,7 +1006,7 @@ def ui_generate_action(request):
             "neck_label": neck_label
         },
         "image_url": image_url,
-        "orig_rel_path": rel_path,
+        "upload_id": meta["upload_id"],
         "logo_box_json": json.dumps(logo_box) if logo_box else None,
         "neck_box_json": json.dumps(neck_box) if neck_box else None,
     }
@@ -667,29 +1014,13 @@ def ui_generate_action(request):
     ok, err, job = _validate_and_build_job(payload)
     if not ok:
         return _render_html(f"<p class='small'>Error: {err}</p>")
+    job["image"]["meta"] = meta
+    job["orig_rel_path"] = rel_path
 
-    try:
-        results = generate_views_from_job(job)
-    except Exception as e:
-        return _render_html(f"<p class='small'>Fallo al generar: {e}</p>")
-
-    batch_id = uuid.uuid4().hex[:8]
-    tiles = []
-    for r in results:
-        prefix = f"{batch_id}_{r['view_id']}"
-        composed = _save_b64_as_png_with_bg_and_resize(r["image_b64"], background_hex, w, h, prefix)
-
-        if (logo_box or neck_box):
-            _paste_original_regions(composed, rel_path, logo_box, neck_box, feather=5, do_color_match=True)
-
-        rel_out = _save_final_png(composed, prefix)
-        url_out = request.build_absolute_uri(settings.MEDIA_URL + rel_out)
-        cap = f"Vista: {r['view_id']} · {w}x{h}"
-        tiles.append(
-            f"<figure><img src='{url_out}' alt='{cap}'><figcaption class='small'>{cap} · "
-            f"<a class='dl' href='{url_out}' download>Descargar</a></figcaption></figure>"
-        )
-
-    grid = "<div class='imgbox'>" + "".join(tiles) + "</div>"
+    # Igual que /api/job/submit/: la página consulta job_status hasta que termina
+    row = jobs.submit_job(job)
+    status_url = reverse("job_status", args=[row.id])
     msg = f"<p class='small'>Imagen subida: <a href='{image_url}' target='_blank'>{image_url}</a></p>"
-    return _render_html(msg + grid)
+    box = (f"<div id='jobResults' data-status-url='{escape(status_url)}' data-size='{w}x{h}'>"
+           f"<p class='small'>Generando… (job {row.id})</p></div>")
+    return _render_html(msg + box)
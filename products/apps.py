@@ -3,3 +3,10 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from . import catalog_index, prompt_store
+        if catalog_index.WARM_ON_START:
+            catalog_index.warm_in_background()
+        if prompt_store.WARM_ON_START:
+            prompt_store.warm_in_background()
@@ -0,0 +1,158 @@
+# products/catalog_index.py
+"""
+Índice en memoria del árbol MEDIA_ROOT/lineas/<categoría>/<subcategoría>/<vista>.png
+
+get_categories / get_subcategories / get_views (products/views.py) lo
+comparten (haya o no catálogo en BD: las páginas solo enlazan .png que
+existen): cada consulta es un acceso a diccionario. El índice se construye
+una vez al arrancar (ProductsConfig.ready → warm() en segundo plano) y se
+refresca por directorio:
+
+- Cada directorio guarda su st_mtime_ns. Crear, borrar o renombrar una
+  entrada cambia el mtime de SU directorio, así que solo se vuelve a listar
+  ese directorio; el resto del árbol no se toca.
+- Un directorio se comprueba (un stat) como mucho una vez cada TTL segundos
+  (PHOMAGIC_CATALOG_INDEX_TTL, 2 por defecto; 0 = comprobar siempre).
+- Un mtime muy reciente no es fiable (resolución de 1-2 s en NFS/SMB): ese
+  directorio se vuelve a listar en la siguiente comprobación.
+
+benchmarks/bench_catalog_index.py compara con el recorrido directo en un árbol de 10k vistas.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+INDEX_TTL = float(os.environ.get("PHOMAGIC_CATALOG_INDEX_TTL", "2"))
+# Construir el índice al arrancar (PHOMAGIC_CATALOG_INDEX_WARM=0 lo deja para la primera consulta)
+WARM_ON_START = os.environ.get("PHOMAGIC_CATALOG_INDEX_WARM", "1").lower() in ("1", "true", "yes")
+# Margen para mtimes "recientes" en sistemas de ficheros de resolución gruesa
+RACY_WINDOW = 2.0
+
+Key = Tuple[str, ...]  # () raíz, (categoría,), (categoría, subcategoría)
+
+
+class _Dir:
+    __slots__ = ("mtime_ns", "checked", "names")
+
+    def __init__(self, mtime_ns: Optional[int], checked: float, names: Tuple[str, ...]):
+        self.mtime_ns = mtime_ns  # None → volver a listar en la próxima comprobación
+        self.checked = checked
+        self.names = names        # subdirectorios (raíz, categoría) o nombres .png (subcategoría)
+
+
+class CatalogIndex:
+    def __init__(self, root, ttl: float = INDEX_TTL):
+        self.root = Path(root)
+        self.ttl = ttl
+        self._dirs: Dict[Key, _Dir] = {}
+        self._lock = threading.RLock()
+        self.scans = 0  # listados hechos (para el benchmark / diagnóstico)
+
+    # ---------- Consultas ----------
+
+    def categories(self) -> List[str]:
+        entry = self._get(())
+        return list(entry.names) if entry else []
+
+    def subcategories(self, category: str) -> List[str]:
+        entry = self._get((category,))
+        return list(entry.names) if entry else []
+
+    def views(self, category: str, subcategory: str) -> List[Dict]:
+        entry = self._get((category, subcategory))
+        if not entry:
+            return []
+        return [{
+            "name": name[:-4],
+            "image": f"/media/lineas/{category}/{subcategory}/{name}",
+        } for name in entry.names]
+
+    # ---------- Construcción / refresco ----------
+
+    def warm(self) -> Dict[str, int]:
+        """Recorre el árbol entero (solo lista los directorios nuevos o cambiados)."""
+        counts = {"categories": 0, "subcategories": 0, "views": 0}
+        for category in self.categories():
+            counts["categories"] += 1
+            for subcategory in self.subcategories(category):
+                counts["subcategories"] += 1
+                entry = self._get((category, subcategory))
+                counts["views"] += len(entry.names) if entry else 0
+        return counts
+
+    def invalidate(self, key: Key = ()):
+        """Olvida un directorio y todo lo que cuelga de él (p. ej. tras subir un ZIP de líneas)."""
+        with self._lock:
+            self._drop(key)
+
+    def _get(self, key: Key) -> Optional[_Dir]:
+        if any(part in ("", ".", "..") or "/" in part or os.sep in part for part in key):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._dirs.get(key)
+            if entry is not None and entry.mtime_ns is not None and now - entry.checked < self.ttl:
+                return entry
+
+            path = self.root.joinpath(*key)
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._drop(key)
+                return None
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns:
+                entry.checked = now
+                return entry
+            return self._scan(key, path, st, now)
+
+    def _scan(self, key: Key, path: Path, st: os.stat_result, now: float) -> Optional[_Dir]:
+        self.scans += 1
+        leaf = len(key) == 2
+        try:
+            with os.scandir(path) as it:
+                if leaf:
+                    names = sorted(e.name for e in it if e.name.endswith(".png") and e.is_file())
+                else:
+                    names = sorted(e.name for e in it if e.is_dir())
+        except OSError:
+            self._drop(key)
+            return None
+
+        mtime_ns = st.st_mtime_ns
+        if time.time() - st.st_mtime < RACY_WINDOW:
+            mtime_ns = None
+        entry = _Dir(mtime_ns, now, tuple(names))
+        old = self._dirs.get(key)
+        self._dirs[key] = entry
+
+        # Hijos que ya no existen: fuera del índice (con sus descendientes)
+        if old is not None and not leaf:
+            for gone in set(old.names) - set(names):
+                self._drop(key + (gone,))
+        return entry
+
+    def _drop(self, key: Key):
+        for k in [k for k in self._dirs if k[:len(key)] == key]:
+            del self._dirs[k]
+
+
+_index: Optional[CatalogIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> CatalogIndex:
+    """Índice compartido del proceso para settings.MEDIA_ROOT/lineas."""
+    global _index
+    from django.conf import settings
+    root = Path(settings.MEDIA_ROOT) / "lineas"
+    with _index_lock:
+        if _index is None or _index.root != root:
+            _index = CatalogIndex(root)
+        return _index
+
+
+def warm_in_background():
+    """Construye el índice sin bloquear el arranque."""
+    threading.Thread(target=lambda: get_index().warm(), name="catalog-index-warm", daemon=True).start()
@@ -0,0 +1,41 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from products.prompt_store import get_store, lineas_root, persist_prompts
+
+
+class Command(BaseCommand):
+    help = ("Lee los prompts .docx de media/lineas y, con --persist, los guarda en ViewOption.prompt. "
+            "Un ViewOption.prompt guardado tiene prioridad sobre su .docx: tras editar un .docx "
+            "hay que repetir --persist o el cambio no se usa.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--root", default=None,
+                            help="Carpeta de líneas (por defecto MEDIA_ROOT/lineas)")
+        parser.add_argument("--persist", action="store_true",
+                            help="Guarda el texto extraído en ViewOption.prompt (las peticiones ya no abren el "
+                                 ".docx, así que los cambios posteriores del .docx no cuentan hasta repetirlo)")
+
+    def handle(self, *args, **options):
+        root = Path(options["root"]) if options["root"] else lineas_root()
+        if not root.is_dir():
+            self.stdout.write(self.style.ERROR(f"❌ No existe la carpeta {root}"))
+            return
+
+        store = get_store()
+        t0 = time.perf_counter()
+        n = store.warm(root)
+        self.stdout.write(self.style.SUCCESS(
+            f"🧠 {n} prompt(s) leídos en {time.perf_counter() - t0:.2f}s desde {root}"))
+
+        if options["persist"]:
+            counts = persist_prompts(root, store)
+            self.stdout.write(self.style.SUCCESS(
+                f"💾 ViewOption.prompt: {counts['updated']} actualizados, {counts['unchanged']} sin cambios"))
+            if counts["missing"]:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️  {counts['missing']} prompt(s) sin ViewOption (importa antes las líneas)"))
+            if counts["unreadable"]:
+                self.stdout.write(self.style.WARNING(f"⚠️  {counts['unreadable']} .docx ilegibles"))
@@ -0,0 +1,164 @@
+# products/prompt_store.py
+"""
+Texto de los prompts .docx de MEDIA_ROOT/lineas/<categoría>/<subcategoría>/<vista>.docx
+
+get_prompt (products/views.py) y build_prompts (catalog.catalog_service.view_prompt)
+buscan en este orden:
+  1) ViewOption.prompt, si no está vacío: viene en el snapshot del catálogo
+     (catalog.catalog_service), ni BD ni .docx en la petición
+  2) este almacén: texto ya extraído, en un LRU por ruta validado con (mtime_ns, tamaño);
+     si el fichero cambió se vuelve a leer, si no se devuelve la copia en memoria
+  3) el prompt por defecto
+
+Precedencia: un ViewOption.prompt guardado SIEMPRE gana a su .docx, aunque el
+.docx se edite después (el paso 2 ni se mira). Tras editar un .docx cuyo texto
+ya se persistió, hay que volver a ejecutar `warm_prompts --persist` (o vaciar
+ViewOption.prompt para volver a leer el .docx en cada petición).
+
+PHOMAGIC_PROMPT_CACHE_SIZE limita las entradas (512 por defecto).
+PHOMAGIC_PROMPT_WARM=1 recorre el árbol al arrancar (en segundo plano).
+
+    python manage.py warm_prompts            # calienta el LRU del proceso
+    python manage.py warm_prompts --persist  # guarda el texto en ViewOption.prompt (repetir tras editar .docx)
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT = "Genera una imagen profesional de producto."
+CACHE_SIZE = int(os.environ.get("PHOMAGIC_PROMPT_CACHE_SIZE", "512"))
+WARM_ON_START = os.environ.get("PHOMAGIC_PROMPT_WARM", "0").lower() in ("1", "true", "yes")
+
+
+def extract_docx_text(path) -> str:
+    """Párrafos no vacíos del .docx, uno por línea (python-docx)."""
+    from docx import Document
+    doc = Document(str(path))
+    return "\n".join(p.text for p in doc.paragraphs if p.text.strip())
+
+
+class PromptStore:
+    def __init__(self, max_entries: int = CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, path) -> Optional[str]:
+        """Texto del .docx (puede ser ""), o None si no existe o no se puede leer."""
+        path = str(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == sig:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        # Fuera del lock: parsear un .docx cuesta decenas de ms
+        try:
+            text = extract_docx_text(path)
+        except Exception as e:
+            logger.warning("No se pudo leer el prompt %s: %s", path, e)
+            return None
+
+        with self._lock:
+            self._entries[path] = (sig, text)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return text
+
+    def warm(self, root) -> int:
+        """Lee todos los .docx del árbol; devuelve cuántos hay en memoria."""
+        n = 0
+        for _, path in iter_prompt_files(root):
+            if self.get(path) is not None:
+                n += 1
+        return n
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def iter_prompt_files(root) -> Iterator[Tuple[Tuple[str, str, str], Path]]:
+    """((categoría, subcategoría, vista), ruta) de cada .docx del árbol de líneas."""
+    root = Path(root)
+    if not root.is_dir():
+        return
+    for cat in sorted(p for p in root.iterdir() if p.is_dir()):
+        for sub in sorted(p for p in cat.iterdir() if p.is_dir()):
+            for docx_path in sorted(sub.glob("*.docx")):
+                yield (cat.name, sub.name, docx_path.stem), docx_path
+
+
+def persist_prompts(root, store: Optional["PromptStore"] = None) -> Dict[str, int]:
+    """
+    Copia el texto de cada .docx en el ViewOption que le corresponde
+    (categoría por category_name, subcategoría y vista por name).
+    Solo actualiza los que cambian; no crea categorías ni vistas.
+    """
+    from .models import ViewOption
+
+    store = store or get_store()
+    counts = {"updated": 0, "unchanged": 0, "missing": 0, "unreadable": 0}
+    for (cat, sub, view), path in iter_prompt_files(root):
+        text = store.get(path)
+        if text is None:
+            counts["unreadable"] += 1
+            continue
+        qs = ViewOption.objects.filter(subcategory__category__category_name=cat,
+                                       subcategory__name=sub, name=view)
+        matched = qs.count()
+        if not matched:
+            counts["missing"] += 1
+            continue
+        updated = qs.exclude(prompt=text).update(prompt=text)
+        counts["updated"] += updated
+        counts["unchanged"] += matched - updated
+    if counts["updated"]:
+        # .update() no lanza post_save: nueva versión del catálogo a mano
+        from catalog.catalog_service import bump_version
+        bump_version()
+    return counts
+
+
+_store: Optional[PromptStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> PromptStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PromptStore()
+        return _store
+
+
+def lineas_root() -> Path:
+    from django.conf import settings
+    return Path(settings.MEDIA_ROOT) / "lineas"
+
+
+def warm_in_background():
+    threading.Thread(target=lambda: get_store().warm(lineas_root()), name="prompt-warm", daemon=True).start()
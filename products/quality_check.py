@@ -1,5 +1,5 @@
 # products/quality_check.py
-from PIL import Image, ImageStat
+from PIL import Image
 import numpy as np
 
 # Umbrales razonables para fotos de prendas
@@ -11,60 +11,120 @@ CONTRAST_MIN = 35     # contraste mínimo (desviación típica)
 SHARPNESS_MIN = 50    # nitidez mínima (varianza de Laplaciano)
 CLIP_RATIO_MAX = 0.10 # % máximo de píxeles quemados/oscuros
 
+# Modos de análisis
+MODE_FULL = "full"    # brillo/contraste/recorte con todos los píxeles a resolución original
+MODE_PROXY = "proxy"  # todo sobre el proxy de tamaño acotado (memoria/latencia ~constantes)
+DEFAULT_MODE = MODE_PROXY
+# Lado mayor de la imagen de análisis. La nitidez se mide a esta escala como
+# máximo (en los dos modos): las fotos grandes se reducen y así SHARPNESS_MIN
+# significa lo mismo para 12 MP que para 48 MP. Las pequeñas NO se amplían:
+# ampliar difumina y bajaría la nitidez medida.
+ANALYSIS_MAX_SIDE = 1024
+
 def _to_gray_np(img: Image.Image) -> np.ndarray:
     return np.asarray(img.convert("L"), dtype=np.float32)
 
 def _laplacian_var(gray: np.ndarray) -> float:
-    # Filtro Laplaciano 3x3
-    K = np.array([[0,  1, 0],
-                  [1, -4, 1],
-                  [0,  1, 0]], dtype=np.float32)
+    """
+    Varianza del Laplaciano 3x3 [[0,1,0],[1,-4,1],[0,1,0]] con padding "reflect".
+    Vectorizado: suma de vistas desplazadas del array con padding
+    (sin bucles Python ni copias por píxel).
+    """
+    gray = np.asarray(gray, dtype=np.float32)
     padded = np.pad(gray, 1, mode="reflect")
-    out = np.zeros_like(gray)
-    for i in range(gray.shape[0]):
-        for j in range(gray.shape[1]):
-            region = padded[i:i+3, j:j+3]
-            out[i, j] = (region * K).sum()
+    out = padded[:-2, 1:-1] + padded[2:, 1:-1]   # arriba + abajo
+    out += padded[1:-1, :-2]                     # izquierda
+    out += padded[1:-1, 2:]                      # derecha
+    out -= 4.0 * gray                            # centro
     return float(out.var())
 
 def _contrast_std(gray: np.ndarray) -> float:
     return float(gray.std())
 
-def _brightness_mean(img: Image.Image) -> float:
-    return float(ImageStat.Stat(img.convert("L")).mean[0])
-
 def _clip_ratio(gray: np.ndarray) -> float:
     total = gray.size
     zeros = (gray <= 2).sum()
     highs = (gray >= 253).sum()
     return float((zeros + highs) / total)
 
-def check_image_quality(abs_path: str):
+def _analysis_size(size) -> tuple:
+    w, h = size
+    scale = min(1.0, ANALYSIS_MAX_SIDE / max(w, h))
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+def _open(abs_path: str, mode: str):
     """
-    Devuelve (ok: bool, razones: [str]).
-    ok == True  → imagen apta
-    ok == False → razones explica los fallos
+    Abre la imagen (solo cabecera) y devuelve (img, modo_efectivo).
+    Si la imagen no pasa de ANALYSIS_MAX_SIDE el proxy no ahorra nada: se analiza en "full".
+    """
+    img = Image.open(abs_path)
+    if max(img.size) <= ANALYSIS_MAX_SIDE:
+        return img, MODE_FULL
+    return img, mode
+
+def _decode_gray(img: Image.Image, mode: str):
+    """
+    (gray_stats, gray_sharp): gris para brillo/contraste/recorte y gris de
+    tamaño _analysis_size para la nitidez (nunca mayor que la original).
+    - proxy: JPEG vía draft() (escala 1/2..1/8 en el dominio DCT, sin decodificar
+      la resolución completa); el resto reduce() entero + LANCZOS (reducing_gap).
+      Las dos métricas salen del proxy.
+    - full: se decodifica entera (una sola conversión a gris); la de nitidez
+      es la reducción de esa misma imagen.
     """
+    target = _analysis_size(img.size)
+    if mode == MODE_PROXY:
+        img.draft("L", target)
+        gray_img = img.convert("L")
+        if gray_img.size != target:
+            gray_img = gray_img.resize(target, Image.LANCZOS, reducing_gap=3.0)
+        gray = np.asarray(gray_img, dtype=np.float32)
+        return gray, gray
+
+    gray_img = img.convert("L")
+    sharp_img = gray_img if gray_img.size == target else gray_img.resize(target, Image.LANCZOS, reducing_gap=3.0)
+    gray = np.asarray(gray_img, dtype=np.float32)
+    return gray, (gray if sharp_img is gray_img else np.asarray(sharp_img, dtype=np.float32))
+
+def analyze_image_quality(abs_path: str, mode: str = DEFAULT_MODE) -> dict:
+    """
+    Igual que check_image_quality pero devuelve el informe completo:
+    { ok, reasons, mode, size, analysis_size, metrics{brightness, contrast, sharpness, clip_ratio} }
+    "mode" es el modo realmente usado (una imagen que no pasa de
+    ANALYSIS_MAX_SIDE se analiza en "full"; None si no se llegó a abrir).
+    "analysis_size" es el tamaño al que se midió la nitidez.
+    """
+    if mode not in (MODE_FULL, MODE_PROXY):
+        raise ValueError(f"Modo de análisis no válido: {mode}")
+
     reasons = []
+    used_mode = None
     try:
-        img = Image.open(abs_path).convert("RGB")
+        img, used_mode = _open(abs_path, mode)
+        w, h = img.size
+        gray, sharp_gray = _decode_gray(img, used_mode)
     except Exception:
-        return False, ["No se pudo abrir la imagen. Sube un archivo JPG o PNG válido."]
+        return {
+            "ok": False,
+            "reasons": ["No se pudo abrir la imagen. Sube un archivo JPG o PNG válido."],
+            "mode": used_mode,
+            "size": None,
+            "analysis_size": None,
+            "metrics": {},
+        }
 
-    w, h = img.size
     if w < MIN_WIDTH or h < MIN_HEIGHT:
         reasons.append(f"Resolución insuficiente (mínimo {MIN_WIDTH}×{MIN_HEIGHT}px). Actual: {w}×{h}px.")
 
-    bright = _brightness_mean(img)
+    bright = float(gray.mean())
     if not (BRIGHT_MIN <= bright <= BRIGHT_MAX):
         reasons.append(f"Iluminación deficiente (promedio {bright:.1f}/255). Usa luz natural o foco suave.")
 
-    gray = _to_gray_np(img)
     contrast = _contrast_std(gray)
     if contrast < CONTRAST_MIN:
         reasons.append(f"Contraste muy bajo (σ={contrast:.1f}). La prenda se ve plana.")
 
-    sharp = _laplacian_var(gray)
+    sharp = _laplacian_var(sharp_gray)
     if sharp < SHARPNESS_MIN:
         reasons.append(f"Imagen borrosa (nítidez {sharp:.1f}). Enfoca mejor la prenda.")
 
@@ -72,4 +132,26 @@ def check_image_quality(abs_path: str):
     if clip > CLIP_RATIO_MAX:
         reasons.append("Sobre/subexposición: demasiados píxeles quemados u oscuros.")
 
-    return (len(reasons) == 0), reasons
+    return {
+        "ok": len(reasons) == 0,
+        "reasons": reasons,
+        "mode": used_mode,
+        "size": (w, h),
+        "analysis_size": (sharp_gray.shape[1], sharp_gray.shape[0]),
+        "metrics": {
+            "brightness": bright,
+            "contrast": contrast,
+            "sharpness": sharp,
+            "clip_ratio": clip,
+        },
+    }
+
+def check_image_quality(abs_path: str, mode: str = DEFAULT_MODE):
+    """
+    Devuelve (ok: bool, razones: [str]).
+    ok == True  → imagen apta
+    ok == False → razones explica los fallos
+    mode: MODE_PROXY (por defecto) o MODE_FULL. Ver analyze_image_quality.
+    """
+    report = analyze_image_quality(abs_path, mode=mode)
+    return report["ok"], report["reasons"]
@@ -1,3 +1,248 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from catalog import catalog_service
+from catalog.catalog_service import get_snapshot
+from catalog.prompt_builder import build_prompts
+
+from . import quality_check as qc
+from .catalog_index import CatalogIndex
+from .prompt_store import lineas_root, persist_prompts
+from .views import get_categories, get_prompt, get_subcategories, get_views
+from .models import Category, SubCategory, ViewOption
+
+_tables_ready = False
+
+
+def _sync_tables():
+    """Las migraciones de products van por detrás de los modelos: en la BD de test se crean desde los modelos."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    with connection.schema_editor() as editor:
+        for model in (ViewOption, SubCategory, Category):
+            editor.delete_model(model)
+        for model in (Category, SubCategory, ViewOption):
+            editor.create_model(model)
+    _tables_ready = True
+
+
+class ProductsTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        _sync_tables()
+        super().setUpClass()
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        # El snapshot del proceso no debe sobrevivir al rollback del test
+        self.addCleanup(setattr, catalog_service, "_snapshot", None)
+
+    def _docx(self, cat, sub, view, text):
+        from docx import Document
+        path = Path(self.media) / "lineas" / cat / sub / f"{view}.docx"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        doc = Document()
+        doc.add_paragraph(text)
+        doc.save(str(path))
+
+
+class CatalogMergeTests(ProductsTestCase):
+    def test_db_rows_extend_static_catalog(self):
+        hogar = Category.objects.create(category_name="Hogar")
+        cojines = SubCategory.objects.create(category=hogar, name="Cojines")
+        ViewOption.objects.create(subcategory=cojines, name="frontal", prompt="Cojín de frente.")
+        ViewOption.objects.create(subcategory=cojines, name="sin_prompt")
+        self._docx("Hogar", "Cojines", "lateral", "Cojín de lado.")
+        ViewOption.objects.create(subcategory=cojines, name="lateral")
+
+        snap = get_snapshot()
+        self.assertTrue(snap.from_db)
+        # Las entradas de CATALOG siguen ahí
+        self.assertEqual(snap.view_ids("Moda", "Camisetas y Polos"),
+                         {"estirada", "plegada", "maniqui_invisible"})
+        # Solo las vistas de BD con prompt (ViewOption.prompt o .docx)
+        self.assertEqual(snap.view_ids("Hogar", "Cojines"), {"frontal", "lateral"})
+
+    def test_db_view_prompts_reach_build_prompts(self):
+        hogar = Category.objects.create(category_name="Hogar")
+        cojines = SubCategory.objects.create(category=hogar, name="Cojines")
+        ViewOption.objects.create(subcategory=cojines, name="frontal", prompt="Cojín de frente.")
+        self._docx("Hogar", "Cojines", "lateral", "Cojín de lado.")
+        ViewOption.objects.create(subcategory=cojines, name="lateral")
+
+        job = {
+            "category": "Hogar",
+            "subcategory": "Cojines",
+            "client_options": {"size_px": {"width": 720, "height": 800}, "background": {"hex": "#FFFFFF"}},
+            "views_requested": [{"id": "frontal"}, {"id": "lateral"}, {"id": "otra"}],
+        }
+        tasks = {t["view_id"]: t["prompt"] for t in build_prompts(job)}
+        self.assertEqual(set(tasks), {"frontal", "lateral"})
+        self.assertTrue(tasks["frontal"].endswith("Cojín de frente."))
+        self.assertTrue(tasks["lateral"].endswith("Cojín de lado."))
+
+
+class ProductPagesTests(ProductsTestCase):
+    def _png(self, cat, sub, view):
+        path = Path(self.media) / "lineas" / cat / sub / f"{view}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (4, 4)).save(path)
+
+    def test_pages_list_files_on_disk_even_with_db_catalog(self):
+        self._png("moda", "Polos", "frontal")
+        self._png("moda", "Camisetas", "plegada")
+        self._png("moda", "Camisetas", "estirada")
+        self._png("hogar", "Cojines", "frontal")
+        # Vista de BD sin .png: válida para la API, pero no sale en las páginas
+        jardin = Category.objects.create(category_name="Jardín")
+        macetas = SubCategory.objects.create(category=jardin, name="Macetas")
+        ViewOption.objects.create(subcategory=macetas, name="frontal", prompt="Maceta.")
+        self.assertTrue(get_snapshot().from_db)
+
+        self.assertEqual(get_categories(), ["hogar", "moda"])
+        self.assertEqual(get_subcategories("moda"), ["Camisetas", "Polos"])
+        self.assertEqual(get_subcategories("Moda"), [])
+        self.assertEqual(get_views("moda", "Camisetas"), [
+            {"name": "estirada", "image": "/media/lineas/moda/Camisetas/estirada.png"},
+            {"name": "plegada", "image": "/media/lineas/moda/Camisetas/plegada.png"},
+        ])
+        self.assertEqual(get_views("Jardín", "Macetas"), [])
+
+
+class CatalogIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        for sub in ("Camisetas", "Polos"):
+            (self.root / "moda" / sub).mkdir(parents=True)
+        self._touch("moda/Camisetas/estirada.png")
+        self._age()
+        self.index = CatalogIndex(self.root, ttl=0)  # ttl=0: cada consulta comprueba el mtime
+
+    def _touch(self, rel):
+        (self.root / rel).write_bytes(b"png")
+
+    def _age(self, rel=None):
+        # mtimes fuera de la ventana "reciente" (RACY_WINDOW), como en un árbol ya estable
+        past = time.time() - 60
+        dirs = [self.root / rel] if rel else [d for d, _, _ in os.walk(self.root)]
+        for d in dirs:
+            os.utime(d, (past, past))
+
+    def _names(self):
+        return [v["name"] for v in self.index.views("moda", "Camisetas")]
+
+    def test_unchanged_tree_not_rescanned(self):
+        self.assertEqual(self.index.warm(), {"categories": 1, "subcategories": 2, "views": 1})
+        scans = self.index.scans
+        for _ in range(3):
+            self.index.warm()
+            self.assertEqual(self._names(), ["estirada"])
+        self.assertEqual(self.index.scans, scans)
+
+    def test_added_and_removed_views_picked_up(self):
+        self.assertEqual(self._names(), ["estirada"])
+        self._touch("moda/Camisetas/plegada.png")
+        self.assertEqual(self._names(), ["estirada", "plegada"])
+
+        (self.root / "moda/Camisetas/estirada.png").unlink()
+        self._age("moda/Camisetas")
+        self.assertEqual(self._names(), ["plegada"])
+
+    def test_only_changed_directory_rescanned(self):
+        self.index.warm()
+        scans = self.index.scans
+        self._touch("moda/Polos/frontal.png")
+        self._age("moda/Polos")
+        self.assertEqual([v["name"] for v in self.index.views("moda", "Polos")], ["frontal"])
+        self.index.warm()
+        self.assertEqual(self.index.scans, scans + 1)
+
+    def test_removed_subcategory_dropped(self):
+        self.index.warm()
+        shutil.rmtree(self.root / "moda" / "Polos")
+        self._age("moda")
+        self.assertEqual(self.index.subcategories("moda"), ["Camisetas"])
+        self.assertEqual(self.index.views("moda", "Polos"), [])
+
+
+class PromptPrecedenceTests(ProductsTestCase):
+    def test_persisted_prompt_wins_until_persisted_again(self):
+        hogar = Category.objects.create(category_name="Hogar")
+        cojines = SubCategory.objects.create(category=hogar, name="Cojines")
+        ViewOption.objects.create(subcategory=cojines, name="frontal")
+        self._docx("Hogar", "Cojines", "frontal", "Versión 1.")
+        self.assertEqual(get_prompt("Hogar", "Cojines", "frontal"), "Versión 1.")
+
+        persist_prompts(lineas_root())
+        self._docx("Hogar", "Cojines", "frontal", "Versión 2, editada.")
+        # El .docx editado no cuenta: manda ViewOption.prompt
+        self.assertEqual(get_prompt("Hogar", "Cojines", "frontal"), "Versión 1.")
+
+        persist_prompts(lineas_root())
+        self.assertEqual(get_prompt("Hogar", "Cojines", "frontal"), "Versión 2, editada.")
+
+
+class QualityCheckTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def _image(self, name, size, fmt="PNG"):
+        # Rayas de 16 px: bordes nítidos a cualquier escala
+        w, h = size
+        img = Image.new("L", size, 40)
+        for x in range(0, w, 32):
+            img.paste(220, (x, 0, min(w, x + 16), h))
+        path = Path(self.tmp) / name
+        img.convert("RGB").save(path, format=fmt)
+        return path
+
+    def test_proxy_is_default(self):
+        self.assertEqual(qc.DEFAULT_MODE, qc.MODE_PROXY)
+        report = qc.analyze_image_quality(self._image("a.png", (2048, 1536)))
+        self.assertEqual(report["mode"], qc.MODE_PROXY)
+
+    def test_sharpness_at_analysis_size(self):
+        path = self._image("b.png", (2048, 1536))
+        full = qc.analyze_image_quality(path, mode=qc.MODE_FULL)
+        proxy = qc.analyze_image_quality(path, mode=qc.MODE_PROXY)
+        self.assertEqual(full["analysis_size"], (qc.ANALYSIS_MAX_SIDE, 768))
+        self.assertEqual(proxy["analysis_size"], (qc.ANALYSIS_MAX_SIDE, 768))
+        self.assertAlmostEqual(full["metrics"]["sharpness"], proxy["metrics"]["sharpness"],
+                               delta=0.05 * full["metrics"]["sharpness"])
+
+    def test_small_image_not_upscaled(self):
+        # Ampliar difumina: una imagen pequeña se mide a su tamaño, con la misma nitidez que sin reescalar
+        path = self._image("c.png", (600, 400))
+        report = qc.analyze_image_quality(path)
+        self.assertEqual(report["mode"], qc.MODE_FULL)
+        self.assertEqual(report["analysis_size"], (600, 400))
+        native = qc._laplacian_var(qc._to_gray_np(Image.open(path)))
+        self.assertAlmostEqual(report["metrics"]["sharpness"], native, places=3)
+        self.assertGreater(report["metrics"]["sharpness"], qc.SHARPNESS_MIN)
+
+    def test_failed_open_reports_mode_used(self):
+        garbage = Path(self.tmp) / "x.png"
+        garbage.write_bytes(b"no es una imagen")
+        self.assertIsNone(qc.analyze_image_quality(garbage, mode=qc.MODE_PROXY)["mode"])
+
+        # Cabecera válida y datos cortados: falla al decodificar, ya en modo proxy
+        path = self._image("d.png", (2048, 1536))
+        data = path.read_bytes()
+        path.write_bytes(data[:len(data) // 2])
+        report = qc.analyze_image_quality(path, mode=qc.MODE_PROXY)
+        self.assertFalse(report["ok"])
+        self.assertEqual(report["mode"], qc.MODE_PROXY)
@@ -3,48 +3,25 @@ from django.shortcuts import render
 from django.conf import settings
 from pathlib import Path
 
+from catalog.catalog_service import view_prompt
+
+from .catalog_index import get_index
+from .prompt_store import DEFAULT_PROMPT
+
+# Las páginas de producto enseñan lo que hay en disco (MEDIA_ROOT/lineas), con su .png:
+# el catálogo de BD (catalog.catalog_service) valida la API, pero puede tener vistas sin imagen
 def get_categories():
-    lineas_path = Path(settings.MEDIA_ROOT) / 'lineas'
-    if not lineas_path.exists():
-        return []
-    return sorted([d.name for d in lineas_path.iterdir() if d.is_dir()])
+    return get_index().categories()
 
 def get_subcategories(category):
-    category_path = Path(settings.MEDIA_ROOT) / 'lineas' / category
-    if not category_path.exists():
-        return []
-    return sorted([d.name for d in category_path.iterdir() if d.is_dir()])
+    return get_index().subcategories(category)
 
 def get_views(category, subcategory):
-    subcategory_path = Path(settings.MEDIA_ROOT) / 'lineas' / category / subcategory
-    if not subcategory_path.exists():
-        return []
-    
-    views = []
-    png_files = list(subcategory_path.glob('*.png'))
-    
-    for png_file in png_files:
-        view_name = png_file.stem
-        views.append({
-            'name': view_name,
-            'image': f'/media/lineas/{category}/{subcategory}/{png_file.name}',
-        })
-    
-    return sorted(views, key=lambda x: x['name'])
+    return get_index().views(category, subcategory)
 
 def get_prompt(category, subcategory, view_name):
-    try:
-        from docx import Document
-        docx_path = Path(settings.MEDIA_ROOT) / 'lineas' / category / subcategory / f'{view_name}.docx'
-        
-        if not docx_path.exists():
-            return "Genera una imagen profesional de producto."
-        
-        doc = Document(str(docx_path))
-        prompt = '\n'.join([p.text for p in doc.paragraphs if p.text.strip()])
-        return prompt if prompt else "Genera una imagen profesional de producto."
-    except:
-        return "Genera una imagen profesional de producto."
+    # ViewOption.prompt (en el snapshot del catálogo) → .docx en caché → por defecto
+    return view_prompt(category, subcategory, view_name) or DEFAULT_PROMPT
 
 def select_category(request):
     categories = get_categories()
@@ -78,7 +55,8 @@ def upload_photo(request, category, subcategory, view_name):
             })
         
         try:
-            from openai import OpenAI
+            from catalog.openai_client import get_client
+            from catalog.retry import PROVIDER_POLICY, JOB_DEADLINE, Deadline, new_idempotency_key
             
             # Intentar múltiples formas de obtener la API key
             api_key = None
@@ -112,18 +90,26 @@ def upload_photo(request, category, subcategory, view_name):
                     "view_name": view_name
                 })
             
-            client = OpenAI(api_key=api_key)
+            client = get_client(api_key)
             prompt = get_prompt(category, subcategory, view_name)
             
             photo.seek(0)
             image_bytes = photo.read()
             
-            response = client.images.edit(
-                model="dall-e-2",
-                image=image_bytes,
-                prompt=prompt,
-                n=1,
-                size="1024x1024"
+            idem_key = new_idempotency_key()
+            response = PROVIDER_POLICY.call(
+                lambda: client.images.edit(
+                    model="dall-e-2",
+                    image=image_bytes,
+                    prompt=prompt,
+                    n=1,
+                    size="1024x1024",
+                    extra_headers={"Idempotency-Key": idem_key},
+                ),
+                idempotent=False,
+                deadline=Deadline(JOB_DEADLINE),
+                idempotency_key=idem_key,
+                what="OpenAI edit (upload_photo)",
             )
             
             result_url = response.data[0].url